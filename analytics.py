@@ -0,0 +1,371 @@
+"""Vectorized attendance analytics.
+
+A class (or the whole institution) is loaded once into an ``int8`` array of
+students x lecture dates x subjects holding 1 (present), 0 (absent) or -1
+(no mark). Rates, defaulters, absence streaks and turnout are then computed
+with whole-array NumPy operations instead of per-student loops.
+
+Percentages follow the report pages: a student's total for a subject is the
+number of dates that subject was held in their class, so a date with no mark
+counts as an absence, and the 75% defaulter cut-off is the "Good" threshold
+of ``reports.attendance_status``.
+
+Loading is bound by fetching every mark from the database, about 5 us a
+mark, so a whole institution of two million marks takes seconds while the
+computations take milliseconds. Loaded cubes are kept in ``cube_cache`` under
+the same ``cache_version`` counters as the report cache (see
+report_cache.py); any new mark or roster change in a class invalidates the
+cubes that include it. A miss is loaded on a background thread
+(``ANALYTICS_WORKERS``); ``cached_cube`` waits ``ANALYTICS_WAIT_SECONDS`` for
+it and otherwise raises ``CubeLoading``, so a cold institution-wide request
+answers at once and the next one finds the cube ready.
+"""
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from datetime import date
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import type_coerce
+
+from models import db, Student, Subject, Attendance, CacheVersion
+from cache import VersionedCache
+from report_cache import StudentRef, REPORT_CACHE_TTL_SECONDS
+from archive import archived_slices
+
+PRESENT, ABSENT, UNMARKED = 1, 0, -1
+DEFAULTER_THRESHOLD = 75
+ROLLING_WINDOW = 10
+LOAD_CHUNK_SIZE = 100000
+CUBE_CACHE_MAX_ENTRIES = 64
+CUBE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+ANALYTICS_WORKERS = 1
+ANALYTICS_WAIT_SECONDS = 0.5
+
+SubjectColumn = namedtuple('SubjectColumn', 'id name class_id')
+
+_executor = None
+_executor_lock = threading.Lock()
+_loading = {}
+TOO_LARGE = object()
+
+
+class CubeLoading(Exception):
+    """The cube is still loading in the background; ask again shortly."""
+
+
+class CubeTooLarge(Exception):
+    """The cube is bigger than ``CUBE_CACHE_MAX_BYTES``; ask for a class or a shorter range."""
+
+
+class AttendanceCube:
+    """Marks of a set of students as a dense ``students x dates x subjects`` int8 array.
+
+    The subject axis holds each class's own subjects (``subjects_of(i)[k]``
+    is subject ``k`` of student ``i``), so an institution-wide cube is as wide
+    as the class with the most subjects rather than the whole catalogue.
+    Students are grouped by class.
+    """
+
+    def __init__(self, data, students, dates, class_subjects):
+        self.data = data
+        self.students = students
+        self.dates = dates
+        self.class_subjects = class_subjects
+        # students x dates x subjects: lectures that took place in the
+        # student's class, i.e. anyone in the class was marked
+        marked = data != UNMARKED
+        if students:
+            class_ids = np.array([student.class_id for student in students], dtype=np.int64)
+            first = np.r_[True, class_ids[1:] != class_ids[:-1]]
+            self.held = np.logical_or.reduceat(marked, np.flatnonzero(first), axis=0)[np.cumsum(first) - 1]
+        else:
+            self.held = marked
+
+    def subjects_of(self, student_index):
+        return self.class_subjects[self.students[student_index].class_id]
+
+    @property
+    def marks(self):
+        return int(np.count_nonzero(self.data != UNMARKED))
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.held.nbytes
+
+
+def _positions(keys, values):
+    """Index of each of ``values`` in ``keys``, or -1 where it is missing."""
+    if not len(keys):
+        return np.full(len(values), -1, dtype=np.int64)
+    sorter = np.argsort(keys)
+    found = sorter[np.minimum(np.searchsorted(keys, values, sorter=sorter), len(keys) - 1)]
+    return np.where(keys[found] == values, found, -1)
+
+
+def load_cube(class_id=None, start_date=None, end_date=None, chunk_size=LOAD_CHUNK_SIZE):
+    """Load one class, or every class when ``class_id`` is None, into an ``AttendanceCube``."""
+    students_query = db.session.query(Student.id, Student.name, Student.roll_number, Student.class_id)
+    subjects_query = db.session.query(Subject.id, Subject.name, Subject.class_id)
+    filters = []
+    if class_id:
+        students_query = students_query.filter(Student.class_id == class_id)
+        subjects_query = subjects_query.filter(Subject.class_id == class_id)
+        filters.append(Attendance.class_id == class_id)
+    if start_date:
+        filters.append(Attendance.date >= start_date)
+    if end_date:
+        filters.append(Attendance.date <= end_date)
+
+    students = [StudentRef(*row) for row in students_query.order_by(Student.class_id, Student.roll_number,
+                                                                     Student.id)]
+    class_subjects = {student.class_id: [] for student in students}
+    for row in subjects_query.order_by(Subject.class_id, Subject.id):
+        if row.class_id in class_subjects:
+            class_subjects[row.class_id].append(SubjectColumn(*row))
+    width = max((len(subjects) for subjects in class_subjects.values()), default=0)
+
+    # Dates come back as their stored text: parsing a date object per mark
+    # would cost more than the rest of the load.
+    raw_date = type_coerce(Attendance.date, db.String)
+    archived = list(archived_slices(class_id, None, start_date, end_date))
+    raw_dates = sorted(
+        {row[0] for row in db.session.query(raw_date).filter(*filters).distinct()}
+        | {day.isoformat() for _, _, _, days, _, _ in archived for day in days}
+    )
+
+    data = np.full((len(students), len(raw_dates), width), UNMARKED, dtype=np.int8)
+    if data.size:
+        student_ids = np.array([student.id for student in students], dtype=np.int64)
+        subject_ids = np.array([subject.id for subjects in class_subjects.values() for subject in subjects],
+                               dtype=np.int64)
+        subject_slots = np.array([slot for subjects in class_subjects.values() for slot in range(len(subjects))],
+                                 dtype=np.int64)
+        date_pos = {raw: index for index, raw in enumerate(raw_dates)}
+
+        # A Core result on the session's connection skips ORM row processing.
+        result = db.session.connection().execution_options(yield_per=chunk_size).execute(
+            db.select(Attendance.student_id, Attendance.subject_id, raw_date, Attendance.status == 'Present')
+            .where(*filters)
+        )
+        for partition in result.partitions():
+            student_col, subject_col, date_col, present_col = zip(*partition)
+            rows = _positions(student_ids, np.array(student_col, dtype=np.int64))
+            subjects = _positions(subject_ids, np.array(subject_col, dtype=np.int64))
+            days = np.array([date_pos[raw] for raw in date_col], dtype=np.int64)
+            keep = (rows >= 0) & (subjects >= 0)
+            data[rows[keep], days[keep], subject_slots[subjects[keep]]] = np.array(present_col, dtype=np.int8)[keep]
+
+        # Archived terms never share dates with live marks, so their blocks
+        # are copied in whole.
+        for _, subject_id, archived_students, days, marked, present in archived:
+            subject = _positions(subject_ids, np.array([subject_id], dtype=np.int64))[0]
+            rows = _positions(student_ids, np.array(archived_students, dtype=np.int64))
+            keep = rows >= 0
+            if subject < 0 or not keep.any():
+                continue
+            columns = np.array([date_pos[day.isoformat()] for day in days], dtype=np.int64)
+            block = np.where(marked, present, UNMARKED).astype(np.int8)[keep]
+            data[rows[keep][:, None], columns[None, :], subject_slots[subject]] = block
+
+    dates = [date.fromisoformat(str(raw)[:10]) for raw in raw_dates]
+    return AttendanceCube(data, students, dates, class_subjects)
+
+
+cube_cache = VersionedCache(max_entries=CUBE_CACHE_MAX_ENTRIES, ttl=REPORT_CACHE_TTL_SECONDS,
+                            max_bytes=CUBE_CACHE_MAX_BYTES)
+
+
+def _cube_version(class_id):
+    if class_id:
+        scope = db.or_(CacheVersion.name.like(f'report:{class_id}:%'), CacheVersion.name == f'roster:{class_id}')
+    else:
+        scope = db.or_(CacheVersion.name.like('report:%'), CacheVersion.name.like('roster:%'))
+    rows = db.session.query(CacheVersion.name, CacheVersion.version).filter(
+        db.or_(scope, CacheVersion.name.in_(('classes', 'subjects')))
+    )
+    return tuple(sorted(rows))
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=current_app.config.get('ANALYTICS_WORKERS', ANALYTICS_WORKERS),
+                thread_name_prefix='analytics')
+        return _executor
+
+
+def _load(app, key, version):
+    try:
+        with app.app_context():
+            cube = load_cube(*key)
+            # The cache would drop a cube this size, and every request would
+            # then load it again; a marker makes the next ones fail at once.
+            if cube.nbytes > cube_cache.max_bytes:
+                cube_cache.store(key, version, TOO_LARGE)
+            else:
+                cube_cache.store(key, version, cube, cube.nbytes)
+            return cube
+    finally:
+        with _executor_lock:
+            _loading.pop((key, version), None)
+
+
+def cached_cube(class_id=None, start_date=None, end_date=None, wait=None):
+    """``load_cube`` through ``cube_cache``.
+
+    A miss is loaded on the analytics pool, once however many requests ask
+    for it. Waits up to ``wait`` seconds for it (``None`` waits until it is
+    loaded) and then raises ``CubeLoading``; the load carries on and stores
+    the cube for the next request. A cube too big for ``cube_cache`` is
+    still returned to the requests waiting for it, and later ones raise
+    ``CubeTooLarge``.
+    """
+    key = (class_id, start_date, end_date)
+    version = _cube_version(class_id)
+    cube = cube_cache.lookup(key, version)
+    if cube is TOO_LARGE:
+        raise CubeTooLarge(f'These analytics need more than {cube_cache.max_bytes // (1024 * 1024)} MiB; '
+                           'pass class_id or a shorter date range.')
+    if cube is not None:
+        return cube
+    executor = _pool()
+    with _executor_lock:
+        future = _loading.get((key, version))
+        if future is None:
+            future = executor.submit(_load, current_app._get_current_object(), key, version)
+            _loading[(key, version)] = future
+    try:
+        return future.result(timeout=wait)
+    except TimeoutError:
+        raise CubeLoading('Analytics are still loading; try again in a few seconds.') from None
+
+
+def _ratio(numerator, denominator):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / np.maximum(denominator, 1) * 100, np.nan)
+
+
+def subject_rates(cube):
+    """``(present, total, percentage)``, each students x subjects."""
+    present = np.count_nonzero(cube.data == PRESENT, axis=1)
+    total = np.count_nonzero(cube.held, axis=1)
+    return present, total, _ratio(present, total)
+
+
+def overall_rates(cube):
+    """Percentage per student across all their subjects."""
+    present, total, _ = subject_rates(cube)
+    return _ratio(present.sum(axis=1), total.sum(axis=1))
+
+
+def rolling_rates(cube, window=ROLLING_WINDOW):
+    """Attendance percentage over the last ``window`` lecture dates, students x dates.
+
+    NaN where a student had no lectures in the window.
+    """
+    present = np.count_nonzero(cube.data == PRESENT, axis=2)
+    held = np.count_nonzero(cube.held, axis=2)
+    return _ratio(_window_sums(present, window), _window_sums(held, window))
+
+
+def _window_sums(values, window):
+    sums = np.cumsum(values, axis=-1)
+    sums[..., window:] = sums[..., window:] - sums[..., :-window]
+    return sums
+
+
+def defaulters(cube, threshold=DEFAULTER_THRESHOLD):
+    """Students below ``threshold`` percent in at least one subject, lowest overall first.
+
+    Returns ``[(student, overall, [(subject, percentage), ...]), ...]``.
+    """
+    _, total, rates = subject_rates(cube)
+    below = (total > 0) & (rates < threshold)
+    overall = overall_rates(cube)
+    rows = []
+    for index in np.flatnonzero(below.any(axis=1)):
+        subjects = [(cube.subjects_of(index)[k], float(rates[index, k])) for k in np.flatnonzero(below[index])]
+        rows.append((cube.students[index], float(overall[index]), subjects))
+    rows.sort(key=lambda row: (row[1], row[0].roll_number))
+    return rows
+
+
+def absence_streaks(cube):
+    """``(longest, current)`` runs of consecutive absences, each students x subjects.
+
+    Runs count held lectures only: a date on which a subject was not taught
+    neither extends nor breaks a streak, and a held lecture without a mark
+    counts as an absence.
+    """
+    held = cube.held
+    absent = held & (cube.data != PRESENT)
+    counts = np.cumsum(absent, axis=1, dtype=np.int32)
+    # Each attended lecture resets the run to zero from that point on.
+    resets = np.maximum.accumulate(np.where(held & ~absent, counts, 0), axis=1)
+    runs = counts - resets
+    if not runs.shape[1]:
+        empty = np.zeros(runs.shape[::2], dtype=np.int32)
+        return empty, empty
+    return runs.max(axis=1), runs[:, -1, :]
+
+
+def daily_turnout(cube):
+    """``(present, marked, percentage)`` per lecture date over all students and subjects."""
+    present = np.count_nonzero(cube.data == PRESENT, axis=(0, 2))
+    marked = np.count_nonzero(cube.data != UNMARKED, axis=(0, 2))
+    return present, marked, _ratio(present, marked)
+
+
+def _number(value):
+    return None if np.isnan(value) else round(float(value), 2)
+
+
+def analytics_json(cube, threshold=DEFAULTER_THRESHOLD, window=ROLLING_WINDOW, streak_minimum=3):
+    """Summary for the ``/analytics`` endpoint."""
+    recent = rolling_rates(cube, window)[:, -1] if cube.dates else np.full(len(cube.students), np.nan)
+    position = {student.id: index for index, student in enumerate(cube.students)}
+
+    longest, current = absence_streaks(cube)
+    streaks = []
+    for i, j in zip(*np.nonzero(current >= streak_minimum)):
+        student = cube.students[i]
+        streaks.append({
+            'student_id': student.id,
+            'roll_number': student.roll_number,
+            'name': student.name,
+            'subject': cube.subjects_of(i)[j].name,
+            'current': int(current[i, j]),
+            'longest': int(longest[i, j]),
+        })
+    streaks.sort(key=lambda row: (-row['current'], row['roll_number']))
+
+    present, marked, rates = daily_turnout(cube)
+    return {
+        'students': len(cube.students),
+        'dates': len(cube.dates),
+        'subjects': sum(len(subjects) for subjects in cube.class_subjects.values()),
+        'marks': cube.marks,
+        'threshold': threshold,
+        'window': window,
+        'defaulters': [
+            {
+                'student_id': student.id,
+                'roll_number': student.roll_number,
+                'name': student.name,
+                'class_id': student.class_id,
+                'overall': _number(overall),
+                'recent': _number(recent[position[student.id]]),
+                'subjects': [{'subject': subject.name, 'percentage': round(rate, 2)} for subject, rate in subjects],
+            }
+            for student, overall, subjects in defaulters(cube, threshold)
+        ],
+        'streaks': streaks,
+        'turnout': [
+            {'date': day.isoformat(), 'present': int(p), 'marked': int(m), 'percentage': _number(rate)}
+            for day, p, m, rate in zip(cube.dates, present, marked, rates)
+        ],
+    }
@@ -0,0 +1,288 @@
+"""JSON API for mobile and offline attendance clients (routes under ``/api`` in app.py).
+
+A client logs in once (``POST /api/login``), downloads the reference data
+and the rosters it needs, and later sends whatever its offline queue holds in
+one ``POST /api/attendance/batch``:
+
+    {"sessions": [{"key": "a1b2...", "class_id": 1, "subject_id": 3,
+                   "date": "2026-10-01", "marks": [[12, 1], [13, 0]]}]}
+
+``marks`` pairs a student id with 1/0 (or "Present"/"Absent"). Each
+session gets a result with a ``status`` of ``created``, ``already_marked``,
+``term_closed`` or ``invalid``. The ``key`` is the idempotency key: the
+result is stored with the marks, and a resent key returns the stored result
+with ``"replayed": true`` instead of writing again, so a queue can retry a
+batch whose response was lost. The whole batch is validated with a handful
+of set-based queries and inserted with one executemany.
+
+``GET /api/sync?since=N`` returns the rosters and lectures changed after
+sync version ``N`` (see sync.py) with their current contents.
+
+Requests may be JSON or msgpack (``Content-Type: application/x-msgpack``)
+and gzip-compressed (``Content-Encoding: gzip``). Responses are msgpack when
+the client accepts it (or asks with ``?format=msgpack``) and msgpack is
+installed, and gzip-compressed when the client accepts gzip and the body is
+larger than ``GZIP_MIN_BYTES``.
+"""
+import gzip
+import json
+import zlib
+from collections import Counter
+from datetime import date, datetime, timedelta
+from functools import wraps
+
+from flask import Response, request
+from flask_login import current_user
+from sqlalchemy.exc import IntegrityError
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from models import db, Student, Subject, Attendance, IdempotencyKey
+from attendance import STATUSES, bulk_insert_attendance
+from archive import archived_terms
+from cache import all_classes, subjects_with_class, versions
+from mark_index import lecture_recorded
+from sync import changes_since, current_version
+
+MSGPACK_MIMETYPE = 'application/x-msgpack'
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+MAX_PAYLOAD_BYTES = 8 * 1024 * 1024
+MAX_BATCH_SESSIONS = 200
+IDEMPOTENCY_KEY_LENGTH = IdempotencyKey.__table__.c.key.type.length
+IDEMPOTENCY_KEY_DAYS = 7
+
+_MARK_STATUSES = {1: 'Present', 0: 'Absent', 'Present': 'Present', 'Absent': 'Absent'}
+
+
+class ApiError(Exception):
+    """A request the API rejects as a whole; answered with ``{"error": ...}`` and ``status``."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _wants_msgpack():
+    if msgpack is None:
+        return False
+    if request.args.get('format') == 'msgpack':
+        return True
+    return request.accept_mimetypes.best_match(('application/json', MSGPACK_MIMETYPE)) == MSGPACK_MIMETYPE
+
+
+def respond(payload, status=200):
+    """Encode ``payload`` as msgpack or compact JSON, gzip it if worthwhile and accepted."""
+    if _wants_msgpack():
+        body, mimetype = msgpack.packb(payload), MSGPACK_MIMETYPE
+    else:
+        body, mimetype = json.dumps(payload, separators=(',', ':')).encode(), 'application/json'
+    response = Response(body, status, mimetype=mimetype)
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    if len(body) >= GZIP_MIN_BYTES and request.accept_encodings['gzip']:
+        response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def read_payload():
+    """The request body as a dict, decoded from (gzipped) JSON or msgpack."""
+    body = request.get_data(cache=False)
+    if request.content_encoding == 'gzip':
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = decompressor.decompress(body, MAX_PAYLOAD_BYTES)
+        except zlib.error:
+            raise ApiError('The body is not valid gzip.') from None
+        if decompressor.unconsumed_tail:
+            raise ApiError('The uncompressed body is too large.', 413)
+    try:
+        if request.mimetype == MSGPACK_MIMETYPE:
+            if msgpack is None:
+                raise ApiError('msgpack is not available on this server; send JSON.', 415)
+            payload = msgpack.unpackb(body, strict_map_key=False)
+        else:
+            payload = json.loads(body)
+    except ValueError:
+        raise ApiError('The body could not be decoded.') from None
+    if not isinstance(payload, dict):
+        raise ApiError('The body must be an object.')
+    return payload
+
+
+def api_login_required(view):
+    """Like ``login_required``, but answers 401 instead of redirecting to the login page."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return respond({'error': 'Log in with POST /api/login first.'}, 401)
+        return view(*args, **kwargs)
+    return wrapped
+
+
+def reference_version():
+    current = versions()
+    return {'classes': current.get('classes', 0), 'subjects': current.get('subjects', 0)}
+
+
+def reference_data():
+    """Classes and subjects as compact arrays, with the versions a client compares on sync."""
+    return {
+        'version': current_version(),
+        'reference': reference_version(),
+        'classes': [[class_ref.id, class_ref.name] for class_ref in all_classes()],
+        'subjects': [[subject.id, subject.name, subject.class_id] for subject in subjects_with_class()],
+    }
+
+
+def _rosters(class_ids):
+    rosters = {class_id: [] for class_id in class_ids}
+    if class_ids:
+        for student_id, class_id, roll_number, name in (
+            db.session.query(Student.id, Student.class_id, Student.roll_number, Student.name)
+            .filter(Student.class_id.in_(class_ids))
+            .order_by(Student.class_id, Student.roll_number)
+        ):
+            rosters[class_id].append([student_id, roll_number, name])
+    return rosters
+
+
+def class_roster(class_id):
+    """``{class_id, students: [[id, roll_number, name], ...], version}``; raises ``ApiError`` 404."""
+    # Read the version first: a change racing this read is then sent again on the next sync
+    version = current_version()
+    students = _rosters([class_id])[class_id]
+    if not students and not any(class_ref.id == class_id for class_ref in all_classes()):
+        raise ApiError('Unknown class.', 404)
+    return {'class_id': class_id, 'students': students, 'version': version}
+
+
+def sync(since, class_ids=None):
+    """Rosters and lectures changed after sync version ``since``.
+
+    A lecture whose ``marks`` list is empty was deleted. While ``has_more``
+    is true the client should ask again from the returned ``version``.
+    """
+    rosters, lectures, version, has_more = changes_since(since, class_ids)
+    marks = {lecture: [] for lecture in lectures}
+    if lectures:
+        for class_id, subject_id, day, student_id, status in db.session.query(
+            Attendance.class_id, Attendance.subject_id, Attendance.date, Attendance.student_id, Attendance.status
+        ).filter(db.tuple_(Attendance.class_id, Attendance.subject_id, Attendance.date).in_(list(lectures))):
+            marks[(class_id, subject_id, day)].append([student_id, int(status == 'Present')])
+    return {
+        'version': version,
+        'has_more': has_more,
+        'reference': reference_version(),
+        'rosters': [{'class_id': class_id, 'students': students}
+                    for class_id, students in sorted(_rosters(rosters).items())],
+        'attendance': [{'class_id': class_id, 'subject_id': subject_id, 'date': day.isoformat(), 'marks': pairs}
+                       for (class_id, subject_id, day), pairs in sorted(marks.items())],
+    }
+
+
+def _parse_session(session):
+    """``(key, (class_id, subject_id, date), {student_id: status}, error)`` for one submitted session."""
+    if not isinstance(session, dict):
+        return None, None, None, 'A session must be an object.'
+    key = session.get('key')
+    if key is not None and (not isinstance(key, str) or not 0 < len(key) <= IDEMPOTENCY_KEY_LENGTH):
+        return None, None, None, f'"key" must be a string of 1 to {IDEMPOTENCY_KEY_LENGTH} characters.'
+    try:
+        lecture = (int(session['class_id']), int(session['subject_id']), date.fromisoformat(session['date']))
+        statuses = {int(student_id): _MARK_STATUSES[value] for student_id, value in session['marks']}
+    except (KeyError, TypeError, ValueError):
+        return key, None, None, ('A session needs "class_id", "subject_id", a "date" as YYYY-MM-DD and '
+                                 f'"marks" as [student_id, 1/0 or {"/".join(STATUSES)}] pairs.')
+    if not statuses:
+        return key, lecture, None, 'No marks given.'
+    return key, lecture, statuses, None
+
+
+def submit_batch(teacher_id, sessions):
+    """Record a batch of sessions and commit once; returns ``{created, results}``.
+
+    Raises ``ApiError`` for a malformed batch, and 409 if a concurrent request
+    recorded one of the lectures or keys first, in which case nothing was
+    written and the batch can simply be sent again.
+    """
+    if not isinstance(sessions, list) or not sessions:
+        raise ApiError('"sessions" must be a non-empty list.')
+    if len(sessions) > MAX_BATCH_SESSIONS:
+        raise ApiError(f'At most {MAX_BATCH_SESSIONS} sessions per batch.', 413)
+    parsed = [_parse_session(session) for session in sessions]
+
+    keys = {key for key, _, _, _ in parsed if key}
+    lectures = {lecture for _, lecture, statuses, _ in parsed if statuses}
+    stored = {}
+    if keys:
+        stored = {
+            key: json.loads(result) for key, result in db.session.query(IdempotencyKey.key, IdempotencyKey.result)
+            .filter(IdempotencyKey.teacher_id == teacher_id, IdempotencyKey.key.in_(keys))
+        }
+    subject_classes, student_classes, marked = {}, {}, set()
+    if lectures:
+        subject_classes = dict(db.session.query(Subject.id, Subject.class_id).filter(
+            Subject.id.in_({subject_id for _, subject_id, _ in lectures})))
+        student_classes = dict(db.session.query(Student.id, Student.class_id).filter(
+            Student.class_id.in_({class_id for class_id, _, _ in lectures})))
+        marked = set(db.session.query(Attendance.class_id, Attendance.subject_id, Attendance.date).filter(
+            db.tuple_(Attendance.class_id, Attendance.subject_id, Attendance.date).in_(list(lectures))
+        ).distinct())
+    terms = [(term.start_date, term.end_date) for term in archived_terms()]
+
+    results, rows, created, new_keys = [], [], [], []
+    for key, lecture, statuses, error in parsed:
+        if key in stored:
+            results.append(dict(stored[key], replayed=True))
+            continue
+        result = {'key': key} if key else {}
+        if error is None:
+            class_id, subject_id, day = lecture
+            strangers = [student_id for student_id in statuses if student_classes.get(student_id) != class_id]
+            if subject_classes.get(subject_id) != class_id:
+                error = f'Subject {subject_id} does not belong to class {class_id}.'
+            elif strangers:
+                error = f'Students {strangers[:10]} are not in class {class_id}.'
+        if error is not None:
+            result.update(status='invalid', error=error)
+        elif lecture in marked:
+            result['status'] = 'already_marked'
+        elif any(start <= day <= end for start, end in terms):
+            result['status'] = 'term_closed'
+        else:
+            result.update(status='created', marked=len(statuses))
+            marked.add(lecture)
+            created.append((lecture, statuses))
+            rows.extend({'student_id': student_id, 'class_id': class_id, 'subject_id': subject_id,
+                         'date': day, 'status': status} for student_id, status in statuses.items())
+        if key:
+            # A key repeated inside the batch replays the first occurrence
+            stored[key] = result
+            new_keys.append({'teacher_id': teacher_id, 'key': key, 'result': json.dumps(result),
+                             'created_at': datetime.utcnow()})
+        results.append(result)
+
+    if rows or new_keys:
+        try:
+            bulk_insert_attendance(rows)
+            if new_keys:
+                db.session.execute(IdempotencyKey.__table__.insert(), new_keys)
+                IdempotencyKey.query.filter(
+                    IdempotencyKey.created_at < datetime.utcnow() - timedelta(days=IDEMPOTENCY_KEY_DAYS)
+                ).delete(synchronize_session=False)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            raise ApiError('Another request recorded some of these sessions first; send the batch again.',
+                           409) from None
+    # The commit bumped each pair's report version once, which lecture_recorded
+    # can only account for when the pair got a single lecture; others reload.
+    pairs = Counter((class_id, subject_id) for (class_id, subject_id, _), _ in created)
+    for (class_id, subject_id, day), statuses in created:
+        if pairs[(class_id, subject_id)] == 1:
+            lecture_recorded(class_id, subject_id, day, statuses)
+    return {'created': len(created), 'results': results}
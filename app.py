@@ -1,16 +1,75 @@
-from flask import Flask, render_template, redirect, url_for, flash, request
+from flask import Flask, render_template, redirect, url_for, flash, request, jsonify, session, make_response, abort, \
+    send_file, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
-from models import db, Teacher, Class, Subject, Student, Attendance
+from models import db, Teacher, Class, Subject, Student, Attendance, ExportJob
+from reports import build_class_report, student_summary, class_report_windows, report_row, REPORT_WINDOW_DATES
+from migrations import upgrade as upgrade_schema
+from exports import XLSX_MIMETYPE, ATTENDANCE_HEADERS, attendance_export_rows, xlsx_response, csv_response, write_xlsx
+from attendance import AlreadyMarked, TermClosed, mark_session, import_attendance_csv
+from database import REPLICA_BIND, engine_options, use_replica, sync_replica
+from queries import paginate_students, page_size, student_json
+from cache import all_classes, subjects_with_class, load_teacher, bump_version, reference_cache
+from search import search_students
+from report_cache import (report_cache, report_version, report_etag, class_report_snapshot,
+                          remember_report, roster_changed)
+from jobs import JOB_KINDS, JobRejected, submit as submit_export, job_json, export_path, cleanup_expired
+from term_reports import generate as generate_term_reports
+from archive import (is_archived, archived_row_count, archived_terms, archive_term, restore_term,
+                     attendance_table_bytes)
+from rosters import ROSTER_HEADERS, read_roster, import_roster, roster_export_rows
+from passwords import HashingBusy, verify as verify_password, hash_password, verify_cache
+import profiling
+import api
+from mark_index import mark_index, index_enabled, indexed_report, student_counts
+from analytics import cached_cube, analytics_json, CubeLoading, CubeTooLarge, DEFAULTER_THRESHOLD, ROLLING_WINDOW
+from counters import lecture_totals, refresh_lecture_counts, rebuild as rebuild_counters, verify as verify_counters
 import os
+import csv
+import click
 from datetime import datetime
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your_secret_key_here'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///attendance.db'
+# Database (see database.py): primary URL, optional read replica for the report pages, pool and timeouts
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///attendance.db')
+app.config['DATABASE_REPLICA_URL'] = os.environ.get('DATABASE_REPLICA_URL')
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 10))
+app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+app.config['DB_POOL_PRE_PING'] = os.environ.get('DB_POOL_PRE_PING', '0') == '1'
+app.config['DB_STATEMENT_TIMEOUT_MS'] = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 0))
+_pool_settings = dict(pool_size=app.config['DB_POOL_SIZE'], max_overflow=app.config['DB_MAX_OVERFLOW'],
+                      pre_ping=app.config['DB_POOL_PRE_PING'],
+                      statement_timeout_ms=app.config['DB_STATEMENT_TIMEOUT_MS'])
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], **_pool_settings)
+if app.config['DATABASE_REPLICA_URL']:
+    app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: dict(
+        engine_options(app.config['DATABASE_REPLICA_URL'], **_pool_settings), url=app.config['DATABASE_REPLICA_URL'])}
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Keep rendered /reports pages in the report cache, not just their data
+app.config['REPORT_CACHE_HTML'] = os.environ.get('REPORT_CACHE_HTML', '1') == '1'
+# Background exports: finished workbooks and the number of worker threads per process
+app.config['EXPORT_DIR'] = os.environ.get('EXPORT_DIR', os.path.join(app.instance_path, 'exports'))
+app.config['EXPORT_WORKERS'] = int(os.environ.get('EXPORT_WORKERS', 2))
+# Serve /reports and /student_report counts from the in-memory bit matrices in mark_index.py
+app.config['ATTENDANCE_INDEX'] = os.environ.get('ATTENDANCE_INDEX', '0') == '1'
+# Request profiling (see profiling.py): Server-Timing headers, /profiling and sampled cProfile dumps
+app.config['PROFILING'] = os.environ.get('PROFILING', '0') == '1'
+app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+app.config['PROFILE_SLOW_MS'] = float(os.environ.get('PROFILE_SLOW_MS', 500))
+# Reports expected to have more date columns than this are streamed a window at a time; 0 never streams
+app.config['REPORT_STREAM_MIN_DATES'] = int(os.environ.get('REPORT_STREAM_MIN_DATES', 180))
+# Password hashing (see passwords.py): method for new hashes, hashing threads and how many logins may wait
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 32))
+# Analytics (see analytics.py): loading threads per process, and how long a request waits before answering 202
+app.config['ANALYTICS_WORKERS'] = int(os.environ.get('ANALYTICS_WORKERS', 1))
+app.config['ANALYTICS_WAIT_SECONDS'] = float(os.environ.get('ANALYTICS_WAIT_SECONDS', 0.5))
+# Packed marks of archived terms (see archive.py)
+app.config['ARCHIVE_DIR'] = os.environ.get('ARCHIVE_DIR', os.path.join(app.instance_path, 'archive'))
 
 db.init_app(app)
+profiling.init_app(app)
 
 login_manager = LoginManager()
 login_manager.login_view = 'login'
@@ -18,7 +77,7 @@ login_manager.init_app(app)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return Teacher.query.get(int(user_id))
+    return load_teacher(int(user_id))
 
 @app.route('/')
 def index():
@@ -31,15 +90,32 @@ def login():
     if request.method == 'POST':
         email = request.form.get('email')
         password = request.form.get('password')
-        teacher = Teacher.query.filter_by(email=email).first()
+        try:
+            teacher = _authenticate(email, password)
+        except HashingBusy as exc:
+            flash(str(exc), 'warning')
+            return render_template('login.html'), 503, {'Retry-After': '5'}
         
-        if teacher and check_password_hash(teacher.password_hash, password):
+        if teacher:
             login_user(teacher)
             return redirect(url_for('dashboard'))
         else:
             flash('Invalid email or password', 'danger')
     return render_template('login.html')
 
+def _authenticate(email, password):
+    """The teacher with these credentials, or None; upgrades an outdated password hash on the way."""
+    teacher = Teacher.query.filter_by(email=email).first()
+    if teacher is None:
+        return None
+    ok, new_hash = verify_password(teacher.password_hash, password)
+    if not ok:
+        return None
+    if new_hash:
+        teacher.password_hash = new_hash
+        db.session.commit()
+    return teacher
+
 @app.route('/logout')
 @login_required
 def logout():
@@ -64,13 +140,14 @@ def manage_classes():
             else:
                 new_class = Class(name=class_name)
                 db.session.add(new_class)
+                bump_version('classes')
                 db.session.commit()
                 flash('Class added successfully!', 'success')
         else:
             flash('Class name cannot be empty.', 'danger')
         return redirect(url_for('manage_classes'))
     
-    classes = Class.query.all()
+    classes = all_classes()
     return render_template('classes.html', classes=classes)
 
 @app.route('/delete_class/<int:class_id>')
@@ -78,6 +155,7 @@ def manage_classes():
 def delete_class(class_id):
     class_to_delete = Class.query.get_or_404(class_id)
     db.session.delete(class_to_delete)
+    bump_version('classes', 'subjects')
     db.session.commit()
     flash('Class deleted successfully!', 'success')
     return redirect(url_for('manage_classes'))
@@ -92,14 +170,15 @@ def manage_subjects():
         if subject_name and class_id:
             new_subject = Subject(name=subject_name, class_id=class_id)
             db.session.add(new_subject)
+            bump_version('subjects')
             db.session.commit()
             flash('Subject added successfully!', 'success')
         else:
             flash('All fields are required.', 'danger')
         return redirect(url_for('manage_subjects'))
 
-    subjects = Subject.query.join(Class).all()
-    classes = Class.query.all()
+    subjects = subjects_with_class()
+    classes = all_classes()
     return render_template('subjects.html', subjects=subjects, classes=classes)
 
 @app.route('/delete_subject/<int:subject_id>')
@@ -107,6 +186,7 @@ def manage_subjects():
 def delete_subject(subject_id):
     subject_to_delete = Subject.query.get_or_404(subject_id)
     db.session.delete(subject_to_delete)
+    bump_version('subjects')
     db.session.commit()
     flash('Subject deleted successfully!', 'success')
     return redirect(url_for('manage_subjects'))
@@ -127,6 +207,7 @@ def manage_students():
             else:
                 new_student = Student(name=name, roll_number=roll_number, class_id=class_id)
                 db.session.add(new_student)
+                roster_changed(class_id)
                 db.session.commit()
                 flash('Student added successfully!', 'success')
         else:
@@ -135,13 +216,45 @@ def manage_students():
 
 
     class_filter = request.args.get('class_id')
-    if class_filter:
-        students = Student.query.filter_by(class_id=class_filter).join(Class).order_by(Student.roll_number).all()
-    else:
-        students = Student.query.join(Class).order_by(Student.roll_number).all()
+    cursor = request.args.get('cursor')
+    students, next_cursor = paginate_students(class_id=class_filter, cursor=cursor,
+                                              limit=page_size(request.args.get('limit', type=int)))
+    
+    if request.args.get('format') == 'json':
+        return jsonify(students=[student_json(student) for student in students], next_cursor=next_cursor)
         
-    classes = Class.query.all()
-    return render_template('students.html', students=students, classes=classes, selected_class=class_filter)
+    classes = all_classes()
+    return render_template('students.html', students=students, classes=classes, selected_class=class_filter,
+                         cursor=cursor, next_cursor=next_cursor)
+
+@app.route('/students/import', methods=['POST'])
+@login_required
+def import_students():
+    class_id = request.form.get('class_id', type=int)
+    upload = request.files.get('roster')
+    if not upload or not upload.filename:
+        flash('Choose a CSV or XLSX file to import.', 'warning')
+        return redirect(url_for('manage_students', class_id=class_id))
+
+    try:
+        result = import_roster(read_roster(upload.stream, upload.filename), default_class_id=class_id,
+                               dry_run=bool(request.form.get('dry_run')))
+    except ValueError as exc:
+        flash(str(exc), 'danger')
+        return redirect(url_for('manage_students', class_id=class_id))
+
+    if request.args.get('format') == 'json':
+        return jsonify(result)
+    return render_template('roster_import.html', result=result, filename=upload.filename, selected_class=class_id)
+
+@app.route('/students/export')
+@login_required
+def export_students():
+    class_id = request.args.get('class_id', type=int)
+    rows = roster_export_rows(class_id)
+    if request.args.get('format') == 'xlsx':
+        return xlsx_response('Roster', ROSTER_HEADERS, rows, 'roster.xlsx')
+    return csv_response(ROSTER_HEADERS, rows, 'roster.csv')
 
 @app.route('/edit_student/<int:student_id>', methods=['POST'])
 @login_required
@@ -159,6 +272,7 @@ def edit_student(student_id):
         else:
             student.name = name
             student.roll_number = roll_number
+            roster_changed(student.class_id)
             db.session.commit()
             flash('Student updated successfully!', 'success')
     else:
@@ -168,34 +282,10 @@ def edit_student(student_id):
 
 @app.route('/student_report/<int:student_id>')
 @login_required
+@use_replica
 def student_report(student_id):
     student = Student.query.get_or_404(student_id)
-    class_id = student.class_id
-    
-    subjects = Subject.query.filter_by(class_id=class_id).all()
-    
-    report_data = []
-    
-    for subject in subjects:
-        total_lectures = Attendance.query.filter_by(
-            class_id=class_id, subject_id=subject.id
-        ).with_entities(Attendance.date).distinct().count()
-        
-        present_count = Attendance.query.filter_by(
-            student_id=student.id,
-            class_id=class_id,
-            subject_id=subject.id,
-            status='Present'
-        ).count()
-        
-        percentage = (present_count / total_lectures * 100) if total_lectures > 0 else 0
-        
-        report_data.append({
-            'subject': subject,
-            'total': total_lectures,
-            'present': present_count,
-            'percentage': round(percentage, 2)
-        })
+    report_data = student_summary(student, student_counts(student) if index_enabled() else None)
         
     return render_template('student_report.html', student=student, report_data=report_data)
 
@@ -203,9 +293,7 @@ def student_report(student_id):
 @login_required
 def export_student_report(student_id):
     student = Student.query.get_or_404(student_id)
-    class_id = student.class_id
-    
-    subjects = Subject.query.filter_by(class_id=class_id).all()
+    report_data = student_summary(student, student_counts(student) if index_enabled() else None)
     
     import openpyxl
     from io import BytesIO
@@ -218,32 +306,13 @@ def export_student_report(student_id):
     headers = ['Subject', 'Total Lectures', 'Present', 'Percentage', 'Status']
     ws.append(headers)
     
-    for subject in subjects:
-        total_lectures = Attendance.query.filter_by(
-            class_id=class_id, subject_id=subject.id
-        ).with_entities(Attendance.date).distinct().count()
-        
-        present_count = Attendance.query.filter_by(
-            student_id=student.id,
-            class_id=class_id,
-            subject_id=subject.id,
-            status='Present'
-        ).count()
-        
-        percentage = (present_count / total_lectures * 100) if total_lectures > 0 else 0
-        
-        status = 'Low'
-        if percentage >= 75:
-            status = 'Good'
-        elif percentage >= 50:
-            status = 'Average'
-            
+    for row in report_data:
         ws.append([
-            subject.name,
-            total_lectures,
-            present_count,
-            f"{round(percentage, 2)}%",
-            status
+            row['subject'].name,
+            row['total'],
+            row['present'],
+            f"{row['percentage']}%",
+            row['status']
         ])
         
     output = BytesIO()
@@ -257,6 +326,9 @@ def export_student_report(student_id):
 def delete_student(student_id):
     student_to_delete = Student.query.get_or_404(student_id)
     db.session.delete(student_to_delete)
+    db.session.flush()
+    refresh_lecture_counts(student_to_delete.class_id)
+    roster_changed(student_to_delete.class_id)
     db.session.commit()
     flash('Student deleted successfully!', 'success')
     return redirect(url_for('manage_students'))
@@ -281,20 +353,17 @@ def mark_attendance():
             flash('Attendance already marked for this class, subject, and date.', 'warning')
             return redirect(url_for('mark_attendance'))
 
-        students = Student.query.filter_by(class_id=class_id).all()
-        for student in students:
-            status = request.form.get(f'status_{student.id}')
-            if status:
-                attendance = Attendance(
-                    student_id=student.id,
-                    class_id=class_id,
-                    subject_id=subject_id,
-                    date=date_obj,
-                    status=status
-                )
-                db.session.add(attendance)
+        student_ids = [row[0] for row in db.session.query(Student.id).filter_by(class_id=class_id)]
+        statuses = {student_id: request.form.get(f'status_{student_id}') for student_id in student_ids}
         
-        db.session.commit()
+        try:
+            mark_session(class_id, subject_id, date_obj, statuses)
+        except AlreadyMarked:
+            flash('Attendance already marked for this class, subject, and date.', 'warning')
+            return redirect(url_for('mark_attendance'))
+        except TermClosed:
+            flash('This date belongs to an archived term and can no longer be marked.', 'warning')
+            return redirect(url_for('mark_attendance'))
         flash('Attendance marked successfully!', 'success')
         return redirect(url_for('dashboard'))
 
@@ -313,13 +382,15 @@ def mark_attendance():
         if existing:
             already_marked = True
             flash('Attendance has already been marked for this selection.', 'info')
+        elif is_archived(date_obj):
+            flash('This date belongs to an archived term and can no longer be marked.', 'warning')
         else:
             students = Student.query.filter_by(class_id=class_id).all()
             if not students:
                 flash('No students found in this class.', 'warning')
 
-    classes = Class.query.all()
-    subjects = Subject.query.join(Class).all()
+    classes = all_classes()
+    subjects = subjects_with_class()
     
     return render_template('attendance.html', 
                          classes=classes, 
@@ -332,76 +403,113 @@ def mark_attendance():
 
 @app.route('/reports')
 @login_required
+@use_replica
 def view_reports():
-    class_id = request.args.get('class_id')
-    subject_id = request.args.get('subject_id')
+    class_id = request.args.get('class_id', type=int)
+    subject_id = request.args.get('subject_id', type=int)
     
     start_date_str = request.args.get('start_date')
     end_date_str = request.args.get('end_date')
     
-    report_data = []
-    total_days = 0
-    dates = []
-    students = []
-    
-    if class_id and subject_id:
-        
-        dates_query = db.session.query(Attendance.date).filter_by(
-            class_id=class_id, subject_id=subject_id
-        )
-        
-        if start_date_str:
-            dates_query = dates_query.filter(Attendance.date >= datetime.strptime(start_date_str, '%Y-%m-%d').date())
-        if end_date_str:
-            dates_query = dates_query.filter(Attendance.date <= datetime.strptime(end_date_str, '%Y-%m-%d').date())
-            
-        dates_query = dates_query.distinct().order_by(Attendance.date).all()
-        dates = [d[0] for d in dates_query]
-        total_days = len(dates)
-        
-
-        students = Student.query.filter_by(class_id=class_id).order_by(Student.roll_number).all()
-        
-        for student in students:
-            # Fetch all attendance records for this student in the date range
-            attendance_records = Attendance.query.filter(
-                Attendance.student_id == student.id,
-                Attendance.class_id == class_id,
-                Attendance.subject_id == subject_id,
-                Attendance.date.in_(dates)
-            ).all()
-            
-            status_map = {record.date: record.status for record in attendance_records}
-            
-            present_count = sum(1 for status in status_map.values() if status == 'Present')
-            
-            status_list = []
-            for date in dates:
-                status_list.append(status_map.get(date, '-'))
-            
-            percentage = (present_count / total_days * 100) if total_days > 0 else 0
-            
-            report_data.append({
-                'student': student,
-                'present': present_count,
-                'total': total_days,
-                'percentage': round(percentage, 2),
-                'status_list': status_list
-            })
-
-    classes = Class.query.all()
-    subjects = Subject.query.join(Class).all()
-    
-    return render_template('reports.html', 
-                         classes=classes, 
-                         subjects=subjects,
-                         report_data=report_data,
-                         dates=dates,
-                         students=students,
+    if not (class_id and subject_id):
+        return render_template('reports.html',
+                             classes=all_classes(),
+                             subjects=subjects_with_class(),
+                             report_data=[],
+                             dates=[],
+                             students=[],
+                             selected_class=class_id,
+                             selected_subject=subject_id,
+                             start_date=start_date_str,
+                             end_date=end_date_str)
+
+    start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date() if start_date_str else None
+    end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date() if end_date_str else None
+
+    key = (class_id, subject_id, start_date, end_date)
+    version = report_version(class_id, subject_id)
+    etag = report_etag(key, version)
+    # A page with pending flash messages is one-off; never serve it from or into the HTML cache
+    cacheable = '_flashes' not in session
+
+    not_modified = cacheable and request.if_none_match.contains(etag)
+    report = None if not_modified else report_cache.lookup(key, version)
+    if not_modified:
+        response = make_response('', 304)
+    elif report is None and _stream_report_wanted(*key):
+        # Streamed pages are not cached; the next request streams again
+        response = _streamed_report(*key, start_date_str, end_date_str)
+    else:
+        if report is not None and report.html is not None and cacheable:
+            html = report.html
+        else:
+            if report is None and index_enabled():
+                dates, report_data = indexed_report(*key, version=version[:2])
+            elif report is None:
+                dates, report_data = class_report_snapshot(*key)
+            else:
+                dates, report_data = report.dates, report.report_data
+            html = render_template('reports.html',
+                                 classes=all_classes(),
+                                 subjects=subjects_with_class(),
+                                 report_data=report_data,
+                                 dates=dates,
+                                 students=[row['student'] for row in report_data],
+                                 selected_class=class_id,
+                                 selected_subject=subject_id,
+                                 start_date=start_date_str,
+                                 end_date=end_date_str)
+            if report is None or cacheable:
+                remember_report(key, version, dates, report_data,
+                                html if cacheable and app.config['REPORT_CACHE_HTML'] else None)
+        response = make_response(html)
+
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+REPORT_STREAM_MARKER = '<!-- report windows -->'
+
+def _stream_report_wanted(class_id, subject_id, start_date, end_date):
+    # The lecture counter bounds the number of date columns without reading any marks
+    if request.args.get('stream') in ('0', '1'):
+        return request.args['stream'] == '1'
+    threshold = app.config['REPORT_STREAM_MIN_DATES']
+    if not threshold:
+        return False
+    expected = lecture_totals(class_id).get(subject_id, 0)
+    if start_date and end_date:
+        expected = min(expected, (end_date - start_date).days + 1)
+    return expected > threshold
+
+def _streamed_report(class_id, subject_id, start_date, end_date, start_date_str, end_date_str):
+    """The /reports page sent as it is built: the page shell first, then a table per window of dates."""
+    page = render_template('reports.html',
+                         classes=all_classes(),
+                         subjects=subjects_with_class(),
                          selected_class=class_id,
                          selected_subject=subject_id,
                          start_date=start_date_str,
-                         end_date=end_date_str)
+                         end_date=end_date_str,
+                         stream_marker=REPORT_STREAM_MARKER,
+                         window=REPORT_WINDOW_DATES)
+    head, tail = page.split(REPORT_STREAM_MARKER)
+
+    def generate():
+        yield head
+        students, present, total = [], {}, 0
+        for students, dates, status_lists in class_report_windows(class_id, subject_id, start_date, end_date):
+            total += len(dates)
+            for student, status_list in zip(students, status_lists):
+                present[student.id] = present.get(student.id, 0) + status_list.count('Present')
+            yield render_template('report_window.html', dates=dates, rows=zip(students, status_lists))
+        report_data = [report_row(student, present[student.id], total, None) for student in students]
+        yield render_template('report_summary.html', report_data=report_data, total=total,
+                              class_id=class_id, subject_id=subject_id)
+        yield tail
+
+    return app.response_class(stream_with_context(generate()))
 
 @app.route('/teachers', methods=['GET', 'POST'])
 @login_required
@@ -420,9 +528,14 @@ def manage_teachers():
             if existing_teacher:
                 flash('Email already registered!', 'warning')
             else:
-                hashed_pw = generate_password_hash(password, method='pbkdf2:sha256')
+                try:
+                    hashed_pw = hash_password(password)
+                except HashingBusy as exc:
+                    flash(str(exc), 'warning')
+                    return redirect(url_for('manage_teachers'))
                 new_teacher = Teacher(name=name, email=email, password_hash=hashed_pw, is_admin=False)
                 db.session.add(new_teacher)
+                bump_version('teachers')
                 db.session.commit()
                 flash('Teacher added successfully!', 'success')
         else:
@@ -455,8 +568,13 @@ def edit_teacher(teacher_id):
                 teacher.name = name
                 teacher.email = email
                 if password:
-                    teacher.password_hash = generate_password_hash(password, method='pbkdf2:sha256')
+                    try:
+                        teacher.password_hash = hash_password(password)
+                    except HashingBusy as exc:
+                        flash(str(exc), 'warning')
+                        return redirect(url_for('edit_teacher', teacher_id=teacher.id))
                 
+                bump_version('teachers')
                 db.session.commit()
                 flash('Teacher details updated successfully!', 'success')
                 return redirect(url_for('manage_teachers'))
@@ -478,12 +596,14 @@ def delete_teacher(teacher_id):
         
     teacher_to_delete = Teacher.query.get_or_404(teacher_id)
     db.session.delete(teacher_to_delete)
+    bump_version('teachers')
     db.session.commit()
     flash('Teacher deleted successfully!', 'success')
     return redirect(url_for('manage_teachers'))
 
 @app.route('/export')
 @login_required
+@use_replica
 def export_data():
     class_id = request.args.get('class_id')
     subject_id = request.args.get('subject_id')
@@ -493,68 +613,339 @@ def export_data():
         flash('Please select a class and subject to export.', 'warning')
         return redirect(url_for('view_reports'))
         
-    query = Attendance.query.filter_by(class_id=class_id, subject_id=subject_id).join(Student).join(Class).join(Subject)
+    query = db.session.query(Attendance.id).filter_by(class_id=class_id, subject_id=subject_id)
     
     if student_id:
         query = query.filter(Attendance.student_id == student_id)
-        
-    query = query.order_by(Attendance.date, Student.roll_number).all()
     
-    if not query:
+    if not query.first() and not archived_row_count([int(class_id)], subject_id):
         flash('No data found to export.', 'info')
         return redirect(url_for('view_reports', class_id=class_id, subject_id=subject_id))
 
+    rows = attendance_export_rows(class_id, subject_id, student_id)
+    return xlsx_response("Attendance Report", ATTENDANCE_HEADERS, rows, 'attendance_report.xlsx')
 
-    import openpyxl
-    from io import BytesIO
-    from flask import send_file
-    
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Attendance Report"
-    
+@app.route('/exports', methods=['GET', 'POST'])
+@login_required
+def export_jobs():
+    if request.method == 'POST':
+        kind = request.form.get('kind')
+        start_date = request.form.get('start_date') or None
+        end_date = request.form.get('end_date') or None
+        params = {'start_date': start_date, 'end_date': end_date}
+
+        if kind == 'class_subject':
+            class_id = request.form.get('class_id', type=int)
+            subject_id = request.form.get('subject_id', type=int)
+            if not (class_id and subject_id):
+                flash('Please select a class and subject to export.', 'warning')
+                return redirect(url_for('export_jobs'))
+            params.update(class_ids=[class_id], subject_id=subject_id)
+        elif kind == 'classes':
+            class_ids = [int(class_id) for class_id in request.form.getlist('class_ids') if class_id.isdigit()]
+            if not class_ids:
+                flash('Please select at least one class to export.', 'warning')
+                return redirect(url_for('export_jobs'))
+            params['class_ids'] = class_ids
+        elif kind == 'term':
+            if not (start_date and end_date):
+                flash('Please choose the first and last day of the term.', 'warning')
+                return redirect(url_for('export_jobs'))
+        else:
+            flash('Unknown export type.', 'danger')
+            return redirect(url_for('export_jobs'))
+
+        filename = f"attendance_{kind}_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
+        try:
+            submit_export(current_user.id, kind, params, filename)
+        except JobRejected as exc:
+            flash(str(exc), 'warning')
+        else:
+            flash('Export queued. It will be ready to download here shortly.', 'success')
+        return redirect(url_for('export_jobs'))
 
-    headers = ['Roll No', 'Student Name', 'Class', 'Subject', 'Date', 'Status']
-    ws.append(headers)
-    
-    for record in query:
-        row = [
-            record.student.roll_number,
-            record.student.name,
-            record.class_val.name,
-            record.subject.name,
-            record.date.strftime('%Y-%m-%d'),
-            record.status
-        ]
-        ws.append(row)
-        
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    return send_file(output, download_name='attendance_report.xlsx', as_attachment=True)
+    jobs = [job_json(job) for job in ExportJob.query.filter_by(teacher_id=current_user.id)
+            .order_by(ExportJob.created_at.desc()).limit(50)]
+    return render_template('exports.html', jobs=jobs, kinds=JOB_KINDS,
+                         classes=all_classes(), subjects=subjects_with_class())
+
+def _own_export_job(job_id):
+    job = db.session.get(ExportJob, job_id)
+    if job is None or (job.teacher_id != current_user.id and not current_user.is_admin):
+        abort(404)
+    return job
+
+@app.route('/exports/<job_id>')
+@login_required
+def export_job_status(job_id):
+    job = _own_export_job(job_id)
+    data = job_json(job)
+    if job.status == 'done':
+        data['download_url'] = url_for('download_export', job_id=job.id)
+    return jsonify(data)
+
+@app.route('/exports/<job_id>/download')
+@login_required
+def download_export(job_id):
+    job = _own_export_job(job_id)
+    path = export_path(job.id)
+    if job.status != 'done' or not os.path.exists(path):
+        flash('That export is not available.', 'warning')
+        return redirect(url_for('export_jobs'))
+    return send_file(path, mimetype=XLSX_MIMETYPE, download_name=job.filename, as_attachment=True)
 
 @app.route('/search_student')
 @login_required
+@use_replica
 def search_student():
     query = request.args.get('query')
+    cursor = request.args.get('cursor')
+    limit = page_size(request.args.get('limit', type=int))
     if query:
-        # Search by name or roll number (case-insensitive for name)
-        students = Student.query.filter(
-            (Student.name.ilike(f'%{query}%')) | 
-            (Student.roll_number.ilike(f'%{query}%'))
-        ).all()
+        # Ranked name / roll number search; the best matches fit on one page
+        students, next_cursor = search_students(query, limit), None
     else:
-        students = Student.query.join(Class).order_by(Student.roll_number).all()
+        students, next_cursor = paginate_students(cursor=cursor, limit=limit)
+    
+    if request.args.get('format') == 'json':
+        return jsonify(students=[student_json(student) for student in students], next_cursor=next_cursor)
         
-    return render_template('search_student.html', students=students, query=query)
+    return render_template('search_student.html', students=students, query=query,
+                         cursor=cursor, next_cursor=next_cursor)
+
+@app.route('/analytics')
+@login_required
+def attendance_analytics():
+    class_id = request.args.get('class_id', type=int)
+    if not class_id and not current_user.is_admin:
+        return jsonify(error='Institution-wide analytics require admin rights; pass class_id.'), 403
+    try:
+        start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() \
+            if request.args.get('start_date') else None
+        end_date = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() \
+            if request.args.get('end_date') else None
+    except ValueError:
+        return jsonify(error='Dates must be YYYY-MM-DD.'), 400
+    threshold = request.args.get('threshold', DEFAULTER_THRESHOLD, type=float)
+    window = max(1, request.args.get('window', ROLLING_WINDOW, type=int))
+
+    try:
+        cube = cached_cube(class_id, start_date, end_date, wait=app.config['ANALYTICS_WAIT_SECONDS'])
+    except CubeLoading as exc:
+        return jsonify(class_id=class_id, status='loading', message=str(exc)), 202, {'Retry-After': '5'}
+    except CubeTooLarge as exc:
+        return jsonify(error=str(exc)), 422
+    return jsonify(class_id=class_id, **analytics_json(cube, threshold, window))
+
+@app.route('/cache_stats')
+@login_required
+def cache_stats():
+    if not current_user.is_admin:
+        flash('Access denied.', 'danger')
+        return redirect(url_for('dashboard'))
+    return jsonify(reference=reference_cache.stats(), reports=report_cache.stats(), index=mark_index.stats(),
+                   passwords=verify_cache.stats())
+
+@app.route('/profiling', methods=['GET', 'POST'])
+@login_required
+def profiling_stats():
+    if not current_user.is_admin:
+        flash('Access denied.', 'danger')
+        return redirect(url_for('dashboard'))
+    if request.method == 'POST':
+        profiling.reset()
+        return redirect(url_for('profiling_stats'))
+    rows = profiling.summary()
+    if request.args.get('format') == 'json':
+        return jsonify(enabled=app.config['PROFILING'], buckets_ms=profiling.HISTOGRAM_BUCKETS_MS, endpoints=rows)
+    return render_template('profiling.html', enabled=app.config['PROFILING'], rows=rows,
+                           buckets=profiling.HISTOGRAM_BUCKETS_MS, window=profiling.PROFILE_WINDOW)
+
+# JSON API for mobile and offline clients (see api.py)
+
+@app.errorhandler(api.ApiError)
+def api_error(error):
+    return api.respond({'error': str(error)}, error.status)
+
+@app.route('/api/login', methods=['POST'])
+def api_login():
+    payload = api.read_payload()
+    try:
+        teacher = _authenticate(payload.get('email'), payload.get('password'))
+    except HashingBusy as exc:
+        response = api.respond({'error': str(exc)}, 503)
+        response.headers['Retry-After'] = '5'
+        return response
+    if teacher is None:
+        return api.respond({'error': 'Invalid email or password.'}, 401)
+    login_user(teacher, remember=True)
+    return api.respond({'teacher': {'id': teacher.id, 'name': teacher.name, 'is_admin': bool(teacher.is_admin)}})
+
+@app.route('/api/classes')
+@api.api_login_required
+def api_classes():
+    return api.respond(api.reference_data())
+
+@app.route('/api/classes/<int:class_id>/roster')
+@api.api_login_required
+def api_roster(class_id):
+    return api.respond(api.class_roster(class_id))
+
+@app.route('/api/attendance/batch', methods=['POST'])
+@api.api_login_required
+def api_attendance_batch():
+    payload = api.read_payload()
+    return api.respond(api.submit_batch(current_user.id, payload.get('sessions')))
+
+@app.route('/api/sync')
+@api.api_login_required
+def api_sync():
+    since = request.args.get('since', 0, type=int)
+    class_ids = [int(value) for value in request.args.get('class_id', '').split(',') if value.isdigit()]
+    return api.respond(api.sync(since, class_ids))
+
+@app.cli.command('upgrade-db')
+def upgrade_db():
+    """Create missing tables and apply index/constraint upgrades."""
+    db.create_all()
+    for step in upgrade_schema():
+        print(step)
+
+@app.cli.command('import-attendance')
+@click.argument('csv_file', type=click.File('r'))
+def import_attendance(csv_file):
+    """Import marks from a CSV (class_id, subject_id, date, roll_number, status)."""
+    try:
+        imported = import_attendance_csv(csv_file)
+    except ValueError as exc:
+        raise click.ClickException(str(exc))
+    print(f'Imported {imported} attendance rows.')
+
+@app.cli.command('import-roster')
+@click.argument('roster_file', type=click.File('rb'))
+@click.option('--class-id', type=int, help='Class for files without a Class column.')
+@click.option('--dry-run', is_flag=True, help='Validate the file without writing anything.')
+def import_roster_command(roster_file, class_id, dry_run):
+    """Import students from a CSV or XLSX roster (Roll No, Student Name, Class)."""
+    try:
+        result = import_roster(read_roster(roster_file, roster_file.name), default_class_id=class_id,
+                               dry_run=dry_run)
+    except ValueError as exc:
+        raise click.ClickException(str(exc))
+    for error in result['errors']:
+        print(f"Line {error['line']} ({error['roll_number']}): {error['error']}")
+    action = 'Would import' if dry_run else 'Imported'
+    print(f"{action} {result['imported']:,} of {result['rows']:,} students in {result['seconds']:.2f} s; "
+          f"{result['error_count']:,} row(s) rejected.")
+
+@app.cli.command('export-roster')
+@click.argument('out_file', type=click.Path(dir_okay=False))
+@click.option('--class-id', type=int, help='Export one class only.')
+def export_roster_command(out_file, class_id):
+    """Write the student roster to a CSV or XLSX file."""
+    rows = roster_export_rows(class_id)
+    if out_file.lower().endswith('.xlsx'):
+        write_xlsx(out_file, 'Roster', ROSTER_HEADERS, rows)
+    else:
+        with open(out_file, 'w', newline='') as fh:
+            writer = csv.writer(fh)
+            writer.writerow(ROSTER_HEADERS)
+            writer.writerows(rows)
+    print(f'Wrote {out_file}.')
+
+@app.cli.command('rebuild-counters')
+@click.option('--verify-only', is_flag=True, help='Report drift without rewriting the counters.')
+def rebuild_counters_command(verify_only):
+    """Recompute the attendance summary counters and report any drift."""
+    drift = verify_counters() if verify_only else rebuild_counters()
+    for line in drift:
+        print(line)
+    print(f'{len(drift)} counter(s) drifted.')
+
+@app.cli.command('term-reports')
+@click.argument('out_dir', type=click.Path(file_okay=False))
+@click.option('--workers', type=int, help='Worker processes (default: one per CPU core).')
+@click.option('--start-date', type=click.DateTime(['%Y-%m-%d']), help='First day of the term.')
+@click.option('--end-date', type=click.DateTime(['%Y-%m-%d']), help='Last day of the term.')
+@click.option('--zip', 'make_zip', is_flag=True, help='Also pack the workbooks into term_reports.zip.')
+def term_reports(out_dir, workers, start_date, end_date, make_zip):
+    """Write a term report workbook for every class; rerun to resume an interrupted run."""
+    try:
+        stats = generate_term_reports(out_dir, db.engine.url.render_as_string(hide_password=False),
+                                      workers=workers,
+                                      start_date=start_date.date() if start_date else None,
+                                      end_date=end_date.date() if end_date else None,
+                                      make_zip=make_zip)
+    except ValueError as exc:
+        raise click.ClickException(str(exc))
+    seconds = stats['seconds'] or 1e-9
+    print(f"{stats['classes']} classes ({stats['skipped']} skipped), {stats['students']} students "
+          f"in {stats['seconds']:.2f} s with {stats['workers']} workers: "
+          f"{stats['students'] / seconds:,.0f} students/s, {stats['classes'] / seconds:.1f} classes/s")
+
+@app.cli.command('cleanup-exports')
+def cleanup_exports():
+    """Delete expired background exports and their files."""
+    print(f'Removed {cleanup_expired()} expired export(s).')
+
+def _print_table_size(label, size):
+    if size is not None:
+        print(f'{label}: {size / 1024 / 1024:.1f} MiB')
+
+@app.cli.command('sync-replica')
+def sync_replica_command():
+    """Copy the SQLite primary database over the SQLite replica."""
+    if not app.config['DATABASE_REPLICA_URL']:
+        raise click.ClickException('DATABASE_REPLICA_URL is not set.')
+    try:
+        pages = sync_replica(db.engine.url, db.engines[REPLICA_BIND].url)
+    except ValueError as exc:
+        raise click.ClickException(str(exc))
+    print(f'Replica synced ({pages:,} pages).')
+
+@app.cli.command('archive-term')
+@click.argument('name')
+@click.argument('start_date', type=click.DateTime(['%Y-%m-%d']))
+@click.argument('end_date', type=click.DateTime(['%Y-%m-%d']))
+@click.option('--vacuum', is_flag=True, help='VACUUM afterwards so the database file shrinks.')
+def archive_term_command(name, start_date, end_date, vacuum):
+    """Move a closed term's marks into the compact archive."""
+    before = attendance_table_bytes()
+    try:
+        term = archive_term(name, start_date.date(), end_date.date())
+    except ValueError as exc:
+        raise click.ClickException(str(exc))
+    if vacuum:
+        with db.engine.connect() as connection:
+            connection.execution_options(isolation_level='AUTOCOMMIT').exec_driver_sql('VACUUM')
+    print(f'Archived {term.rows:,} marks into {term.bytes / 1024:.1f} KiB '
+          f'({term.bytes / max(term.rows, 1):.2f} bytes per mark).')
+    _print_table_size('Attendance table before', before)
+    _print_table_size('Attendance table after', attendance_table_bytes())
+
+@app.cli.command('restore-term')
+@click.argument('name')
+def restore_term_command(name):
+    """Move an archived term's marks back into the attendance table."""
+    try:
+        rows = restore_term(name)
+    except ValueError as exc:
+        raise click.ClickException(str(exc))
+    print(f'Restored {rows:,} marks.')
+
+@app.cli.command('archived-terms')
+def archived_terms_command():
+    """List archived terms."""
+    for term in archived_terms():
+        print(f'{term.name}: {term.start_date} to {term.end_date}, {term.rows:,} marks, {term.bytes / 1024:.1f} KiB')
 
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        upgrade_schema()
 
         if not Teacher.query.filter_by(email='teacher@example.com').first():
-            hashed_pw = generate_password_hash('password123', method='pbkdf2:sha256')
+            hashed_pw = hash_password('password123')
             teacher = Teacher(name='Test Teacher', email='teacher@example.com', password_hash=hashed_pw, is_admin=True)
             db.session.add(teacher)
             db.session.commit()
@@ -0,0 +1,349 @@
+"""Columnar archive of closed terms.
+
+``archive_term`` moves every mark between two dates out of the Attendance
+table into a directory under ``ARCHIVE_DIR``. For each (class, subject) the
+term becomes two bit matrices of students x lecture dates, one for "marked"
+and one for "present", packed eight dates to a byte and saved as a ``.npy``
+file that is memory-mapped when read. ``manifest.json`` lists the student
+ids and dates of every matrix. A mark costs two bits instead of a table row
+plus three index entries.
+
+The rest of the app reads archived terms through this module: the report
+matrix and range summaries in reports.py, the Excel exports and the
+counter rebuild all add the archived marks to the live ones, so a report
+looks the same before and after its term is archived. Dates inside an
+archived term can no longer be marked. ``restore_term`` moves a term back.
+"""
+import json
+import os
+import re
+import shutil
+from datetime import date
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import type_coerce
+
+from models import db, Class, Subject, Student, Attendance, ArchivedTerm
+
+MANIFEST = 'manifest.json'
+ARCHIVE_CHUNK_SIZE = 100000
+
+_manifests = {}
+
+
+def archive_dir():
+    return current_app.config.get('ARCHIVE_DIR') or os.path.join(current_app.instance_path, 'archive')
+
+
+def archived_terms(start_date=None, end_date=None):
+    """Archived terms overlapping ``start_date..end_date``, oldest first."""
+    query = ArchivedTerm.query
+    if start_date:
+        query = query.filter(ArchivedTerm.end_date >= start_date)
+    if end_date:
+        query = query.filter(ArchivedTerm.start_date <= end_date)
+    return query.order_by(ArchivedTerm.start_date).all()
+
+
+def is_archived(day):
+    return db.session.query(ArchivedTerm.id).filter(
+        ArchivedTerm.start_date <= day, ArchivedTerm.end_date >= day
+    ).first() is not None
+
+
+def _manifest(term):
+    # Terms never change once written, so each manifest is parsed once; the
+    # file's mtime tells a term restored and archived again from the old one.
+    path = os.path.join(archive_dir(), term.directory)
+    manifest_path = os.path.join(path, MANIFEST)
+    key = (manifest_path, os.stat(manifest_path).st_mtime_ns)
+    manifest = _manifests.get(key)
+    if manifest is None:
+        with open(manifest_path) as fh:
+            manifest = json.load(fh)
+        manifest['groups'] = {(group['class_id'], group['subject_id']): group for group in manifest['groups']}
+        _manifests[key] = manifest
+    return path, manifest
+
+
+def _live_ids(class_id=None, subject_id=None):
+    """``({(class_id, subject_id)}, {student_id})`` that still exist, to leave deleted ones out of the archive."""
+    subjects = db.session.query(Subject.class_id, Subject.id)
+    students = db.session.query(Student.id)
+    if class_id:
+        subjects = subjects.filter(Subject.class_id == int(class_id))
+        students = students.filter(Student.class_id == int(class_id))
+    if subject_id:
+        subjects = subjects.filter(Subject.id == int(subject_id))
+    return set(subjects), {row[0] for row in students}
+
+
+def archived_slices(class_id=None, subject_id=None, start_date=None, end_date=None):
+    """Yield ``(class_id, subject_id, student_ids, dates, marked, present)`` per archived matrix.
+
+    ``marked`` and ``present`` are boolean students x dates arrays cut down
+    to the requested date range. Files are never rewritten, so students,
+    subjects and classes deleted since the term was archived are left out
+    here, as their live rows were deleted with them, and so are dates on
+    which only deleted students were marked.
+    """
+    live = None
+    for term in archived_terms(start_date, end_date):
+        path, manifest = _manifest(term)
+        for (group_class, group_subject), group in sorted(manifest['groups'].items()):
+            if (class_id and group_class != int(class_id)) or (subject_id and group_subject != int(subject_id)):
+                continue
+            if live is None:
+                live = _live_ids(class_id, subject_id)
+            live_pairs, live_students = live
+            if (group_class, group_subject) not in live_pairs:
+                continue
+            dates = [date.fromisoformat(day) for day in group['dates']]
+            keep = [index for index, day in enumerate(dates)
+                    if (not start_date or day >= start_date) and (not end_date or day <= end_date)]
+            rows = [index for index, student_id in enumerate(group['students']) if student_id in live_students]
+            if not keep or not rows:
+                continue
+            bits = np.load(os.path.join(path, group['file']), mmap_mode='r')
+            unpacked = np.unpackbits(bits, axis=2, count=len(dates)).astype(bool)[:, rows][:, :, keep]
+            if len(rows) < len(group['students']):
+                # Every archived date had a mark; keep those that still do.
+                marked_days = unpacked[0].any(axis=0)
+                if not marked_days.any():
+                    continue
+                unpacked = unpacked[:, :, marked_days]
+                keep = [index for index, marked in zip(keep, marked_days.tolist()) if marked]
+            yield (group_class, group_subject, [group['students'][index] for index in rows],
+                   [dates[index] for index in keep], unpacked[0], unpacked[1])
+
+
+def archived_dates(class_id, subject_id, start_date=None, end_date=None):
+    """Sorted archived lecture dates of one class and subject, read from the manifests alone."""
+    dates = []
+    for term in archived_terms(start_date, end_date):
+        group = _manifest(term)[1]['groups'].get((int(class_id), int(subject_id)))
+        if group:
+            dates.extend(day for day in map(date.fromisoformat, group['dates'])
+                         if (not start_date or day >= start_date) and (not end_date or day <= end_date))
+    return sorted(dates)
+
+
+def archived_marks(class_id, subject_id, start_date=None, end_date=None):
+    """Archived ``(student_id, date, status)`` tuples for one class and subject, ordered by date."""
+    marks = []
+    slices = archived_slices(class_id, subject_id, start_date, end_date)
+    for _, _, student_ids, dates, marked, present in slices:
+        for day_index, student_index in zip(*np.nonzero(marked.T)):
+            marks.append((student_ids[student_index], dates[day_index],
+                          'Present' if present[student_index, day_index] else 'Absent'))
+    return marks
+
+
+def archived_counts(class_id, start_date=None, end_date=None):
+    """``({subject_id: lecture dates}, {student_id: {subject_id: present}})`` from the archive."""
+    totals, present_counts = {}, {}
+    for _, subject_id, student_ids, dates, _, present in archived_slices(class_id, None, start_date, end_date):
+        totals[subject_id] = totals.get(subject_id, 0) + len(dates)
+        for student_id, count in zip(student_ids, present.sum(axis=1).tolist()):
+            if count:
+                counts = present_counts.setdefault(student_id, {})
+                counts[subject_id] = counts.get(subject_id, 0) + count
+    return totals, present_counts
+
+
+def archived_summary(class_id=None):
+    """``({(student_id, subject_id): (present, marked)}, {(class_id, subject_id): lecture dates})``.
+
+    The archived share of the counters in counters.py.
+    """
+    summary, lectures = {}, {}
+    for group_class, subject_id, student_ids, dates, marked, present in archived_slices(class_id):
+        lectures[(group_class, subject_id)] = lectures.get((group_class, subject_id), 0) + len(dates)
+        for student_id, present_count, marked_count in zip(student_ids, present.sum(axis=1).tolist(),
+                                                           marked.sum(axis=1).tolist()):
+            old_present, old_marked = summary.get((student_id, subject_id), (0, 0))
+            summary[(student_id, subject_id)] = (old_present + present_count, old_marked + marked_count)
+    return summary, lectures
+
+
+def archived_export_rows(class_id, subject_id=None, student_id=None, start_date=None, end_date=None):
+    """Archived marks of a class as ``(subject_id, row)`` pairs, rows as in ``exports.attendance_export_rows``.
+
+    Ordered like the live export, by subject, date and roll number.
+    """
+    class_name = db.session.query(Class.name).filter_by(id=class_id).scalar()
+    students = {
+        row.id: row for row in db.session.query(Student.id, Student.roll_number, Student.name)
+        .filter_by(class_id=class_id)
+    }
+    subjects = dict(db.session.query(Subject.id, Subject.name).filter_by(class_id=class_id))
+    slices = sorted(archived_slices(class_id, subject_id, start_date, end_date), key=lambda item: item[1])
+    for _, group_subject, student_ids, dates, marked, present in slices:
+        order = sorted((students[sid].roll_number, index) for index, sid in enumerate(student_ids)
+                       if sid in students and (not student_id or sid == int(student_id)))
+        for day_index, day in enumerate(dates):
+            for roll_number, index in order:
+                if marked[index, day_index]:
+                    student = students[student_ids[index]]
+                    yield group_subject, [roll_number, student.name, class_name, subjects.get(group_subject),
+                                          day.strftime('%Y-%m-%d'), 'Present' if present[index, day_index] else 'Absent']
+
+
+def archived_row_count(class_ids, subject_id=None, start_date=None, end_date=None):
+    total = 0
+    for class_id in class_ids:
+        for _, _, _, _, marked, _ in archived_slices(class_id, subject_id, start_date, end_date):
+            total += int(marked.sum())
+    return total
+
+
+def attendance_table_bytes():
+    """Pages used by the Attendance table and its indexes, in bytes.
+
+    Read from SQLite's ``dbstat`` table; None on databases without it.
+    """
+    try:
+        return db.session.execute(db.text(
+            "SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+            "(SELECT name FROM sqlite_master WHERE tbl_name = :table)"
+        ), {'table': Attendance.__tablename__}).scalar() or 0
+    except Exception:
+        db.session.rollback()
+        return None
+
+
+def _term_directory(name):
+    return re.sub(r'[^A-Za-z0-9_-]+', '_', name).strip('_') or 'term'
+
+
+def _write_groups(path, columns, raw_dates):
+    """Write one packed matrix per (class, subject) from column arrays sorted by class and subject."""
+    class_col, subject_col, student_col, date_col, present_col = columns
+    groups = []
+    if not len(class_col):
+        return groups
+    boundaries = np.flatnonzero((np.diff(class_col) != 0) | (np.diff(subject_col) != 0)) + 1
+    for start, stop in zip(np.r_[0, boundaries], np.r_[boundaries, len(class_col)]):
+        student_ids, rows = np.unique(student_col[start:stop], return_inverse=True)
+        date_indexes, days = np.unique(date_col[start:stop], return_inverse=True)
+        bits = np.zeros((2, len(student_ids), len(date_indexes)), dtype=bool)
+        bits[0, rows, days] = True
+        bits[1, rows, days] = present_col[start:stop]
+        class_id, subject_id = int(class_col[start]), int(subject_col[start])
+        filename = f'c{class_id}_s{subject_id}.npy'
+        np.save(os.path.join(path, filename), np.packbits(bits, axis=2))
+        groups.append({
+            'class_id': class_id,
+            'subject_id': subject_id,
+            'file': filename,
+            'students': student_ids.tolist(),
+            'dates': [str(raw_dates[index])[:10] for index in date_indexes],
+        })
+    return groups
+
+
+def archive_term(name, start_date, end_date):
+    """Move all marks dated ``start_date..end_date`` into a new archived term and commit.
+
+    Raises ``ValueError`` if the range overlaps an archived term or holds a
+    status other than Present/Absent. Returns the new ``ArchivedTerm``.
+    """
+    from report_cache import marks_changed
+
+    if end_date < start_date:
+        raise ValueError('The term ends before it starts.')
+    if archived_terms(start_date, end_date):
+        raise ValueError('The dates overlap a term that is already archived.')
+    in_term = [Attendance.date >= start_date, Attendance.date <= end_date]
+    if db.session.query(Attendance.id).filter(*in_term, Attendance.status.notin_(('Present', 'Absent'))).first():
+        raise ValueError('Only Present and Absent marks can be archived.')
+
+    raw_date = type_coerce(Attendance.date, db.String)
+    raw_dates = [row[0] for row in db.session.query(raw_date).filter(*in_term).distinct().order_by(raw_date)]
+    date_pos = {raw: index for index, raw in enumerate(raw_dates)}
+
+    chunks = []
+    result = db.session.connection().execution_options(yield_per=ARCHIVE_CHUNK_SIZE).execute(
+        db.select(Attendance.class_id, Attendance.subject_id, Attendance.student_id, raw_date,
+                  Attendance.status == 'Present')
+        .where(*in_term)
+        .order_by(Attendance.class_id, Attendance.subject_id)
+    )
+    for partition in result.partitions():
+        class_col, subject_col, student_col, date_col, present_col = zip(*partition)
+        chunks.append((np.array(class_col, dtype=np.int64), np.array(subject_col, dtype=np.int64),
+                       np.array(student_col, dtype=np.int64),
+                       np.array([date_pos[raw] for raw in date_col], dtype=np.int64),
+                       np.array(present_col, dtype=bool)))
+    if chunks:
+        columns = [np.concatenate(column) for column in zip(*chunks)]
+    else:
+        columns = [np.zeros(0, dtype=np.int64)] * 5
+
+    directory = _term_directory(name)
+    path = os.path.join(archive_dir(), directory)
+    if os.path.exists(path):
+        raise ValueError(f'{path} already exists.')
+    partial = path + '.part'
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+    try:
+        groups = _write_groups(partial, columns, raw_dates)
+        with open(os.path.join(partial, MANIFEST), 'w') as fh:
+            json.dump({'name': name, 'start_date': start_date.isoformat(), 'end_date': end_date.isoformat(),
+                       'groups': groups}, fh)
+        size = sum(os.path.getsize(os.path.join(partial, filename)) for filename in os.listdir(partial))
+        os.replace(partial, path)
+    except Exception:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+
+    try:
+        term = ArchivedTerm(name=name, start_date=start_date, end_date=end_date, directory=directory,
+                            rows=len(columns[0]), bytes=size)
+        db.session.add(term)
+        # The summary counters keep counting archived marks, so the rows go
+        # without forget_marks().
+        Attendance.query.filter(*in_term).delete(synchronize_session=False)
+        marks_changed((group['class_id'], group['subject_id']) for group in groups)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        shutil.rmtree(path, ignore_errors=True)
+        raise
+    return term
+
+
+def restore_term(name):
+    """Move an archived term's marks back into Attendance and commit. Returns the number of rows."""
+    from report_cache import marks_changed
+
+    term = ArchivedTerm.query.filter_by(name=name).first()
+    if term is None:
+        raise ValueError(f'No archived term named {name!r}.')
+    path, _ = _manifest(term)
+
+    # Marks of students, subjects and classes deleted since the term was
+    # archived are dropped; archived_slices already leaves them out.
+    rows, pairs = [], set()
+    for class_id, subject_id, student_ids, dates, marked, present in archived_slices(
+            start_date=term.start_date, end_date=term.end_date):
+        pairs.add((class_id, subject_id))
+        for student_index, day_index in zip(*np.nonzero(marked)):
+            rows.append({
+                'student_id': student_ids[student_index],
+                'class_id': class_id,
+                'subject_id': subject_id,
+                'date': dates[day_index],
+                'status': 'Present' if present[student_index, day_index] else 'Absent',
+            })
+
+    db.session.delete(term)
+    if rows:
+        # Counters already include these marks; only the rows move.
+        db.session.execute(Attendance.__table__.insert(), rows)
+    marks_changed(pairs)
+    db.session.commit()
+    shutil.rmtree(path, ignore_errors=True)
+    return len(rows)
@@ -0,0 +1,184 @@
+import csv
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Student, Attendance
+from counters import record_marks, forget_marks, record_status_change
+from report_cache import marks_changed
+from archive import archived_terms, is_archived
+from mark_index import lecture_recorded
+from sync import log_lectures
+
+STATUSES = ('Present', 'Absent')
+IMPORT_COLUMNS = ('class_id', 'subject_id', 'date', 'roll_number', 'status')
+IMPORT_BATCH_SIZE = 5000
+
+
+class AlreadyMarked(Exception):
+    """Marks for this class, subject and date have already been recorded."""
+
+
+class TermClosed(Exception):
+    """The date falls inside an archived term, which can no longer be marked."""
+
+
+def bulk_insert_attendance(rows):
+    """Insert attendance mappings in a single executemany.
+
+    ``rows`` are plain dicts with ``student_id``, ``class_id``, ``subject_id``,
+    ``date`` and ``status`` keys. No ORM objects are built; the insert and the
+    matching counter updates join the caller's transaction and are committed by
+    the caller. Returns the row count.
+    """
+    if rows:
+        db.session.execute(Attendance.__table__.insert(), rows)
+        record_marks(rows)
+        marks_changed((row['class_id'], row['subject_id']) for row in rows)
+        log_lectures((row['class_id'], row['subject_id'], row['date']) for row in rows)
+    return len(rows)
+
+
+def session_rows(class_id, subject_id, date, statuses):
+    """Turn ``{student_id: status}`` for one lecture into insertable mappings."""
+    return [
+        {
+            'student_id': student_id,
+            'class_id': int(class_id),
+            'subject_id': int(subject_id),
+            'date': date,
+            'status': status
+        }
+        for student_id, status in statuses.items()
+        if status
+    ]
+
+
+def mark_session(class_id, subject_id, date, statuses):
+    """Atomically record and commit one lecture's marks for a class.
+
+    Duplicates are rejected by the (student_id, subject_id, date) unique
+    constraint rather than by a read-then-write check, so two concurrent
+    submissions of the same lecture cannot both succeed: the loser's whole
+    insert is rolled back and ``AlreadyMarked`` is raised. Dates inside an
+    archived term raise ``TermClosed``. Returns the number of rows inserted.
+    """
+    if is_archived(date):
+        raise TermClosed(f'{date} belongs to an archived term')
+    try:
+        inserted = bulk_insert_attendance(session_rows(class_id, subject_id, date, statuses))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise AlreadyMarked(f'Attendance already marked for class {class_id}, '
+                            f'subject {subject_id} on {date}') from None
+    lecture_recorded(class_id, subject_id, date, statuses)
+    return inserted
+
+
+def update_mark(attendance, status):
+    """Change the status of one recorded mark and commit."""
+    record_status_change(attendance.student_id, attendance.subject_id, attendance.status, status)
+    attendance.status = status
+    marks_changed([(attendance.class_id, attendance.subject_id)])
+    log_lectures([(attendance.class_id, attendance.subject_id, attendance.date)])
+    db.session.commit()
+
+
+def delete_session(class_id, subject_id, date):
+    """Delete every mark of one lecture and commit. Returns the number of rows deleted."""
+    query = Attendance.query.filter_by(class_id=class_id, subject_id=subject_id, date=date)
+    rows = [
+        {'student_id': student_id, 'class_id': class_id, 'subject_id': subject_id, 'date': date, 'status': status}
+        for student_id, status in query.with_entities(Attendance.student_id, Attendance.status)
+    ]
+    query.delete(synchronize_session=False)
+    forget_marks(rows)
+    marks_changed([(class_id, subject_id)])
+    log_lectures([(class_id, subject_id, date)])
+    db.session.commit()
+    return len(rows)
+
+
+def import_attendance_csv(fileobj, batch_size=IMPORT_BATCH_SIZE):
+    """Import a CSV of marks with ``class_id, subject_id, date, roll_number, status`` columns.
+
+    Roll numbers are resolved with one query for all classes in the file and
+    rows are inserted in batches of ``batch_size``, all within one transaction.
+    Raises ``ValueError`` for missing columns or naming the first bad line
+    (including lines dated inside an archived term and marks that are
+    already recorded), in which case nothing is written. Returns the number
+    of rows inserted.
+    """
+    reader = csv.DictReader(fileobj)
+    missing = [column for column in IMPORT_COLUMNS if column not in (reader.fieldnames or ())]
+    if missing:
+        raise ValueError(f'Missing column(s): {", ".join(missing)}')
+
+    records = []
+    for line_no, record in enumerate(reader, start=2):
+        if record['status'] not in STATUSES:
+            raise ValueError(f'Line {line_no}: unknown status {record["status"]!r}')
+        try:
+            record['date'] = datetime.strptime(record['date'], '%Y-%m-%d').date()
+            record['class_id'] = int(record['class_id'])
+            record['subject_id'] = int(record['subject_id'])
+        except (TypeError, ValueError) as exc:
+            raise ValueError(f'Line {line_no}: {exc}') from None
+        records.append((line_no, record))
+
+    class_ids = {record['class_id'] for _, record in records}
+    student_ids = {
+        (class_id, roll_number): student_id
+        for student_id, class_id, roll_number in db.session.query(
+            Student.id, Student.class_id, Student.roll_number
+        ).filter(Student.class_id.in_(class_ids))
+    }
+
+    terms = [(term.start_date, term.end_date) for term in archived_terms()]
+    rows, lines, seen = [], [], {}
+    for line_no, record in records:
+        if any(start <= record['date'] <= end for start, end in terms):
+            raise ValueError(f'Line {line_no}: {record["date"]} belongs to an archived term')
+        student_id = student_ids.get((record['class_id'], record['roll_number']))
+        if student_id is None:
+            raise ValueError(f'Line {line_no}: no student with roll number {record["roll_number"]!r} '
+                             f'in class {record["class_id"]}')
+        key = (student_id, record['subject_id'], record['date'])
+        if key in seen:
+            raise ValueError(f'Line {line_no}: repeats the mark on line {seen[key]}')
+        seen[key] = line_no
+        rows.append({
+            'student_id': student_id,
+            'class_id': record['class_id'],
+            'subject_id': record['subject_id'],
+            'date': record['date'],
+            'status': record['status']
+        })
+        lines.append(line_no)
+
+    start = 0
+    try:
+        for start in range(0, len(rows), batch_size):
+            bulk_insert_attendance(rows[start:start + batch_size])
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise _already_marked(rows[start:start + batch_size], lines[start:start + batch_size]) from None
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(rows)
+
+
+def _already_marked(rows, lines):
+    """``ValueError`` naming the first of ``rows`` whose mark is already recorded."""
+    recorded = set(db.session.query(Attendance.student_id, Attendance.subject_id, Attendance.date).filter(
+        db.tuple_(Attendance.student_id, Attendance.subject_id, Attendance.date).in_(
+            [(row['student_id'], row['subject_id'], row['date']) for row in rows])
+    ))
+    for row, line_no in zip(rows, lines):
+        if (row['student_id'], row['subject_id'], row['date']) in recorded:
+            return ValueError(f'Line {line_no}: attendance for class {row["class_id"]}, subject '
+                              f'{row["subject_id"]} on {row["date"]} is already marked')
+    return ValueError('Some of these marks are already recorded')
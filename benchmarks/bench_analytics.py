@@ -0,0 +1,69 @@
+"""Load and compute times of analytics.py on millions of marks.
+
+Seeds a file-backed institution, loads it into one students x dates x
+subjects cube, and times each vectorized computation over the whole cube.
+A cold ``cached_cube`` call shows how long a cold /analytics request waits
+before answering 202 while the load runs in the background, and a second
+call the cost of a repeat request.
+
+    python benchmarks/bench_analytics.py [--classes 30 --students 60 --subjects 6 --days 180]
+"""
+import argparse
+import os
+import tempfile
+
+from synthetic import make_app, seed, timed
+
+from models import db
+from analytics import (load_cube, cached_cube, subject_rates, overall_rates, rolling_rates, defaulters,
+                       absence_streaks, daily_turnout, analytics_json, CubeLoading, ANALYTICS_WAIT_SECONDS)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--classes', type=int, default=30)
+    parser.add_argument('--subjects', type=int, default=6)
+    parser.add_argument('--students', type=int, default=60)
+    parser.add_argument('--days', type=int, default=180)
+    args = parser.parse_args()
+
+    app = make_app(f'sqlite:///{os.path.join(tempfile.mkdtemp(), "attendance.db")}')
+    with app.app_context():
+        db.create_all()
+        seed(classes=args.classes, subjects=args.subjects, students=args.students, days=args.days)
+
+        results = {}
+        with timed(results, 'load (institution)'):
+            cube = load_cube()
+        with timed(results, 'load (one class)'):
+            load_cube(1)
+        with timed(results, 'cold request (202)'):
+            try:
+                cached_cube(wait=ANALYTICS_WAIT_SECONDS)
+            except CubeLoading:
+                pass
+        cached_cube()
+        with timed(results, 'load (cached)'):
+            cached_cube()
+        with timed(results, 'subject rates'):
+            subject_rates(cube)
+        with timed(results, 'overall rates'):
+            overall_rates(cube)
+        with timed(results, 'rolling rates'):
+            rolling_rates(cube)
+        with timed(results, 'defaulters'):
+            defaulters(cube)
+        with timed(results, 'absence streaks'):
+            absence_streaks(cube)
+        with timed(results, 'daily turnout'):
+            daily_turnout(cube)
+        with timed(results, 'full /analytics summary'):
+            analytics_json(cube)
+
+        print(f'{cube.marks:,} marks, cube {cube.data.shape} = {cube.data.nbytes / 1024 / 1024:.1f} MiB')
+        for name, seconds in results.items():
+            print(f'{name:<26} {seconds * 1000:9.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
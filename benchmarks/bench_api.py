@@ -0,0 +1,123 @@
+"""Marking throughput of the JSON API (api.py) against the HTML form flow.
+
+Seeds a synthetic institution, then records ``--sessions`` new lectures
+twice into the same database: once the way the browser does it (GET the
+marking form for the class, POST it, follow the redirect to the dashboard)
+and once through ``POST /api/attendance/batch`` in batches of ``--batch``.
+Prints sessions per second and the bytes sent and received per session, and
+the size of a roster and a sync response as JSON, gzipped JSON and msgpack.
+
+    python benchmarks/bench_api.py [--sessions 400 --batch 50 --students 60]
+"""
+import argparse
+import gzip
+import json
+import os
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+
+
+def wire_size(response):
+    return len(response.get_data()) + sum(len(name) + len(value) + 4 for name, value in response.headers.items())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--classes', type=int, default=4)
+    parser.add_argument('--subjects', type=int, default=4)
+    parser.add_argument('--students', type=int, default=60)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--sessions', type=int, default=400)
+    parser.add_argument('--batch', type=int, default=50)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(work_dir, "attendance.db")}'
+    os.environ.setdefault('EXPORT_DIR', os.path.join(work_dir, 'exports'))
+    os.environ.setdefault('ARCHIVE_DIR', os.path.join(work_dir, 'archive'))
+
+    from synthetic import seed, lecture_dates
+    from werkzeug.security import generate_password_hash
+
+    import api
+    from app import app
+    from models import db, Teacher, Student
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Teacher(name='Admin', email='admin@example.com',
+                               password_hash=generate_password_hash('admin'), is_admin=True))
+        seed(classes=args.classes, subjects=args.subjects, students=args.students, days=args.days)
+        student_ids = {}
+        for student_id, class_id in db.session.query(Student.id, Student.class_id):
+            student_ids.setdefault(class_id, []).append(student_id)
+
+    client = app.test_client()
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'admin'})
+    client.post('/api/login', json={'email': 'admin@example.com', 'password': 'admin'})
+    since = client.get('/api/classes').json['version']
+
+    first_day = lecture_dates(args.days)[-1] + timedelta(days=1)
+    lectures = [
+        (class_id, (class_id - 1) * args.subjects + subject + 1, first_day + timedelta(days=day))
+        for day in range(args.sessions)
+        for class_id in range(1, args.classes + 1)
+        for subject in range(args.subjects)
+    ]
+    form_lectures, api_lectures = lectures[:args.sessions], lectures[args.sessions:2 * args.sessions]
+
+    results = {}
+    sent = received = 0
+    started = time.perf_counter()
+    for class_id, subject_id, day in form_lectures:
+        query = f'class_id={class_id}&subject_id={subject_id}&date={day.isoformat()}'
+        form = {'class_id': class_id, 'subject_id': subject_id, 'date': day.isoformat()}
+        form.update({f'status_{sid}': 'Present' if sid % 3 else 'Absent' for sid in student_ids[class_id]})
+        page = client.get(f'/attendance?{query}')
+        posted = client.post('/attendance', data=form)
+        assert posted.status_code == 302, posted.status_code
+        landing = client.get(posted.headers['Location'])
+        sent += len(query) + len(json.dumps(form))
+        received += wire_size(page) + wire_size(posted) + wire_size(landing)
+    results['HTML form (GET + POST + redirect)'] = (time.perf_counter() - started, sent, received)
+
+    sent = received = 0
+    started = time.perf_counter()
+    for start in range(0, len(api_lectures), args.batch):
+        sessions = [
+            {'key': uuid.uuid4().hex, 'class_id': class_id, 'subject_id': subject_id, 'date': day.isoformat(),
+             'marks': [[sid, int(bool(sid % 3))] for sid in student_ids[class_id]]}
+            for class_id, subject_id, day in api_lectures[start:start + args.batch]
+        ]
+        body = gzip.compress(json.dumps({'sessions': sessions}).encode())
+        response = client.post('/api/attendance/batch', data=body, headers={
+            'Content-Type': 'application/json', 'Content-Encoding': 'gzip', 'Accept-Encoding': 'gzip'})
+        assert response.status_code == 200, response.get_data()
+        sent += len(body)
+        received += wire_size(response)
+    results[f'API batch of {args.batch} (gzip)'] = (time.perf_counter() - started, sent, received)
+
+    print(f'{args.sessions} sessions of {args.students} students')
+    print(f'{"flow":<36} {"sessions/s":>11} {"sent B/session":>15} {"received B/session":>19}')
+    for name, (seconds, sent, received) in results.items():
+        print(f'{name:<36} {args.sessions / seconds:>11,.0f} {sent / args.sessions:>15,.0f} '
+              f'{received / args.sessions:>19,.0f}')
+
+    print()
+    formats = {'JSON': {}, 'JSON + gzip': {'Accept-Encoding': 'gzip'}}
+    if api.msgpack is not None:
+        formats['msgpack'] = {'Accept': api.MSGPACK_MIMETYPE}
+        formats['msgpack + gzip'] = {'Accept': api.MSGPACK_MIMETYPE, 'Accept-Encoding': 'gzip'}
+    else:
+        print('(msgpack is not installed; pip install msgpack to compare it)')
+    print(f'{"payload (bytes)":<36}' + ''.join(f'{name:>16}' for name in formats))
+    for label, url in (('roster of one class', '/api/classes/1/roster'),
+                       ('sync, first page', f'/api/sync?since={since}')):
+        sizes = [len(client.get(url, headers=headers).get_data()) for headers in formats.values()]
+        print(f'{label:<36}' + ''.join(f'{size:>16,}' for size in sizes))
+
+
+if __name__ == '__main__':
+    main()
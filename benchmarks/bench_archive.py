@@ -0,0 +1,73 @@
+"""Space and query time of archived terms against live Attendance rows.
+
+Seeds a file-backed institution, times the /reports matrix, a date-range
+class summary and a full class export while the marks are live, archives the
+whole period as one term and times the same calls again. Prints the bytes
+per mark of the Attendance table (from SQLite's dbstat) and of the archive.
+
+    python benchmarks/bench_archive.py [--classes 20 --students 60 --subjects 6 --days 180]
+"""
+import argparse
+import os
+import tempfile
+from datetime import date, timedelta
+
+from synthetic import make_app, seed, timed, lecture_dates
+
+from models import db, Attendance
+from archive import archive_term, attendance_table_bytes
+from reports import build_class_report, class_summary
+from exports import attendance_export_rows
+
+REPEATS = 5
+
+
+def time_queries(label, results, start, end):
+    with timed(results, f'{label} report'):
+        for _ in range(REPEATS):
+            build_class_report(1, 1)
+    with timed(results, f'{label} range summary'):
+        for _ in range(REPEATS):
+            class_summary(1, start, end)
+    with timed(results, f'{label} class export rows'):
+        for _ in range(REPEATS):
+            for _ in attendance_export_rows(1):
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--classes', type=int, default=20)
+    parser.add_argument('--subjects', type=int, default=6)
+    parser.add_argument('--students', type=int, default=60)
+    parser.add_argument('--days', type=int, default=180)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    app = make_app(f'sqlite:///{os.path.join(work_dir, "attendance.db")}')
+    app.config['ARCHIVE_DIR'] = os.path.join(work_dir, 'archive')
+
+    with app.app_context():
+        db.create_all()
+        seed(classes=args.classes, subjects=args.subjects, students=args.students, days=args.days)
+        dates = lecture_dates(args.days)
+        start, end = dates[0] + timedelta(days=10), dates[-1] - timedelta(days=10)
+        marks = db.session.query(db.func.count(Attendance.id)).scalar()
+
+        results = {}
+        time_queries('live', results, start, end)
+        live_bytes = attendance_table_bytes()
+        with timed(results, 'archive term'):
+            term = archive_term('Benchmark', dates[0], date.max)
+        time_queries('archived', results, start, end)
+
+        print(f'{marks:,} marks')
+        print(f'Attendance table {live_bytes / 1024 / 1024:8.1f} MiB  {live_bytes / marks:6.2f} bytes/mark')
+        print(f'archive          {term.bytes / 1024 / 1024:8.1f} MiB  {term.bytes / marks:6.2f} bytes/mark')
+        for name, seconds in results.items():
+            repeats = 1 if name == 'archive term' else REPEATS
+            print(f'{name:<30} {seconds / repeats * 1000:9.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
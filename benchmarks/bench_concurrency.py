@@ -0,0 +1,91 @@
+"""Multi-threaded load test of concurrent attendance submissions.
+
+Every round, all threads submit the same class/subject/date at the same
+moment (the double-click / two-teachers case). Afterwards the database must
+hold exactly one mark per student per lecture.
+
+    python benchmarks/bench_concurrency.py [--threads 16 --rounds 50]
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+
+DB_DIR = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(DB_DIR, "attendance.db")}'
+
+from synthetic import seed, lecture_dates
+
+from sqlalchemy import func
+from werkzeug.security import generate_password_hash
+
+from app import app
+from models import db, Teacher, Student, Attendance
+
+CLASSES = 10
+STUDENTS = 60
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Teacher(name='Load', email='load@example.com',
+                               password_hash=generate_password_hash('load'), is_admin=True))
+        seed(classes=CLASSES, subjects=1, students=STUDENTS, days=0)
+        rosters = {}
+        for student_id, class_id in db.session.query(Student.id, Student.class_id):
+            rosters.setdefault(class_id, []).append(student_id)
+
+    rng = random.Random(7)
+    days = lecture_dates(args.rounds)
+    sessions = [(rng.choice(list(rosters)), day) for day in days]
+    barrier = threading.Barrier(args.threads)
+    outcomes = Counter()
+    lock = threading.Lock()
+
+    def worker():
+        client = app.test_client()
+        client.post('/login', data={'email': 'load@example.com', 'password': 'load'})
+        for class_id, day in sessions:
+            form = {'class_id': class_id, 'subject_id': class_id, 'date': day.isoformat()}
+            form.update({f'status_{student_id}': 'Present' for student_id in rosters[class_id]})
+            barrier.wait()
+            response = client.post('/attendance', data=form)
+            with client.session_transaction() as flask_session:
+                category = flask_session.get('_flashes', [('error', '')])[-1][0]
+            with lock:
+                outcomes[(response.status_code, category)] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        duplicates = db.session.query(Attendance.student_id).group_by(
+            Attendance.student_id, Attendance.subject_id, Attendance.date
+        ).having(func.count() > 1).count()
+        rows = db.session.query(Attendance).count()
+
+    requests = sum(outcomes.values())
+    print(f'{args.threads} threads x {args.rounds} rounds: {requests} submissions in {elapsed:.2f}s '
+          f'({requests / elapsed:.0f} req/s)')
+    for (status, category), count in sorted(outcomes.items()):
+        print(f'  HTTP {status} {category:<8} {count}')
+    print(f'attendance rows: {rows} (expected {args.rounds * STUDENTS}), duplicate marks: {duplicates}')
+    assert duplicates == 0 and rows == args.rounds * STUDENTS
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Peak RSS and time of the attendance Excel export against row count.
+
+Each export runs in a fresh child process so ``ru_maxrss`` reflects only that
+export. ``legacy`` is the previous ORM + in-memory workbook path, ``stream``
+is ``exports.write_xlsx`` fed by ``exports.attendance_export_rows``.
+
+    python benchmarks/bench_export.py
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic import make_app, seed
+
+from models import db, Student, Attendance
+from exports import ATTENDANCE_HEADERS, attendance_export_rows, write_xlsx
+
+STUDENTS = 200
+DAY_COUNTS = [50, 250, 1000]
+
+
+def legacy_export(path):
+    import openpyxl
+    from io import BytesIO
+
+    records = Attendance.query.filter_by(class_id=1, subject_id=1).join(Student) \
+        .order_by(Attendance.date, Student.roll_number).all()
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(ATTENDANCE_HEADERS)
+    for record in records:
+        ws.append([record.student.roll_number, record.student.name, record.class_val.name,
+                   record.subject.name, record.date.strftime('%Y-%m-%d'), record.status])
+    output = BytesIO()
+    wb.save(output)
+    with open(path, 'wb') as fh:
+        fh.write(output.getvalue())
+
+
+def stream_export(path):
+    write_xlsx(path, 'Attendance Report', ATTENDANCE_HEADERS, attendance_export_rows(1, 1))
+
+
+def child(mode, db_path):
+    bench_app = make_app(f'sqlite:///{db_path}')
+    with bench_app.app_context():
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        out = db_path + f'.{mode}.xlsx'
+        start = time.perf_counter()
+        (legacy_export if mode == 'legacy' else stream_export)(out)
+        elapsed = time.perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        os.remove(out)
+    print(f'{elapsed:.3f} {(peak - baseline) / 1024:.1f}')
+
+
+def main():
+    print(f'{"rows":>9} {"mode":>7} {"seconds":>8} {"peak RSS +MiB":>14}')
+    for days in DAY_COUNTS:
+        db_path = os.path.join(tempfile.mkdtemp(), 'attendance.db')
+        with make_app(f'sqlite:///{db_path}').app_context():
+            db.create_all()
+            seed(students=STUDENTS, days=days)
+        for mode in ('legacy', 'stream'):
+            out = subprocess.run([sys.executable, __file__, '--child', mode, db_path],
+                                 capture_output=True, text=True, check=True).stdout.split()
+            print(f'{STUDENTS * days:>9,} {mode:>7} {float(out[0]):>8.2f} {float(out[1]):>14.1f}')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        child(sys.argv[2], sys.argv[3])
+    else:
+        main()
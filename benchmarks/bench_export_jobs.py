@@ -0,0 +1,74 @@
+"""Whole-term export as a background job.
+
+Submits a term export covering every class, then keeps requesting
+/dashboard while the job runs: the submit returns immediately and pages stay
+responsive instead of one worker blocking for the length of the export.
+
+    python benchmarks/bench_export_jobs.py [--classes 20 --students 60 --days 90]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+DB_DIR = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(DB_DIR, "attendance.db")}'
+os.environ['EXPORT_DIR'] = os.path.join(DB_DIR, 'exports')
+
+from synthetic import seed, lecture_dates
+
+from werkzeug.security import generate_password_hash
+
+from app import app
+from models import db, Teacher, ExportJob
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--classes', type=int, default=20)
+    parser.add_argument('--subjects', type=int, default=3)
+    parser.add_argument('--students', type=int, default=60)
+    parser.add_argument('--days', type=int, default=90)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Teacher(name='Bench', email='bench@example.com',
+                               password_hash=generate_password_hash('bench'), is_admin=True))
+        seed(classes=args.classes, subjects=args.subjects, students=args.students, days=args.days)
+
+    client = app.test_client()
+    client.post('/login', data={'email': 'bench@example.com', 'password': 'bench'})
+    dates = lecture_dates(args.days)
+
+    start = time.perf_counter()
+    client.post('/exports', data={'kind': 'term', 'start_date': dates[0].isoformat(),
+                                  'end_date': dates[-1].isoformat()})
+    submit_ms = (time.perf_counter() - start) * 1000
+    with app.app_context():
+        job_id = ExportJob.query.order_by(ExportJob.created_at.desc()).first().id
+
+    latencies = []
+    polls = 0
+    while True:
+        tick = time.perf_counter()
+        client.get('/dashboard')
+        latencies.append((time.perf_counter() - tick) * 1000)
+        job = client.get(f'/exports/{job_id}').get_json()
+        polls += 1
+        if job['status'] in ('done', 'failed'):
+            break
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+
+    size = os.path.getsize(os.path.join(os.environ['EXPORT_DIR'], f'{job_id}.xlsx')) if job['status'] == 'done' else 0
+    print(f"term export of {job['total']} rows: {job['status']} in {elapsed:.2f} s "
+          f"({job['total'] / elapsed:,.0f} rows/s, {size / 1024 / 1024:.1f} MiB)")
+    print(f'submit request: {submit_ms:.1f} ms')
+    print(f'/dashboard while exporting: median {statistics.median(latencies):.1f} ms, '
+          f'max {max(latencies):.1f} ms over {polls} polls')
+
+
+if __name__ == '__main__':
+    main()
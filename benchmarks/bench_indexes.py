@@ -0,0 +1,107 @@
+"""Hot attendance queries before and after the migrations.upgrade() indexes.
+
+Builds a database with the original, index-less attendance table, seeds it
+with a few million marks (plus some double-marked rows), times the hot
+queries, upgrades the schema in place and times them again.
+
+    python benchmarks/bench_indexes.py [--classes 20 --subjects 5 --students 100 --days 200]
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import date
+
+from synthetic import make_app, seed
+
+from sqlalchemy import text
+
+from models import db, Student, Attendance
+from migrations import upgrade
+from reports import build_class_report, student_summary
+
+LEGACY_ATTENDANCE = """
+CREATE TABLE attendance (
+    id INTEGER NOT NULL,
+    student_id INTEGER NOT NULL,
+    class_id INTEGER NOT NULL,
+    subject_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    status VARCHAR(10) NOT NULL,
+    PRIMARY KEY (id),
+    FOREIGN KEY(student_id) REFERENCES student (id),
+    FOREIGN KEY(class_id) REFERENCES class (id),
+    FOREIGN KEY(subject_id) REFERENCES subject (id)
+)
+"""
+
+
+def best_of(fn, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def hot_queries(class_id, subject_id, student):
+    return {
+        'duplicate check': lambda: Attendance.query.filter_by(
+            class_id=class_id, subject_id=subject_id, date=date(2030, 1, 1)).first(),
+        'class report': lambda: build_class_report(class_id, subject_id),
+        'student summary': lambda: student_summary(student),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--classes', type=int, default=20)
+    parser.add_argument('--subjects', type=int, default=5)
+    parser.add_argument('--students', type=int, default=100)
+    parser.add_argument('--days', type=int, default=200)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'attendance.db')
+    bench_app = make_app(f'sqlite:///{path}')
+
+    with bench_app.app_context():
+        tables = [t for t in db.metadata.sorted_tables if t.name != 'attendance']
+        db.metadata.create_all(db.engine, tables=tables)
+        db.session.execute(text(LEGACY_ATTENDANCE))
+        seed(classes=args.classes, subjects=args.subjects, students=args.students, days=args.days)
+        db.session.execute(text(
+            'INSERT INTO attendance (student_id, class_id, subject_id, date, status) '
+            'SELECT student_id, class_id, subject_id, date, status FROM attendance WHERE id % 1000 = 0'
+        ))
+        db.session.commit()
+
+        rows_before = db.session.query(Attendance).count()
+        print(f'{rows_before:,} attendance rows, {os.path.getsize(path) / 2**20:.0f} MiB')
+
+        class_id = args.classes // 2 or 1
+        subject_id = db.session.query(Attendance.subject_id).filter_by(class_id=class_id).first()[0]
+        student = Student.query.filter_by(class_id=class_id).first()
+
+        before = {name: best_of(fn) for name, fn in hot_queries(class_id, subject_id, student).items()}
+
+        start = time.perf_counter()
+        steps = upgrade()
+        migration_s = time.perf_counter() - start
+        for step in steps:
+            print(f'  {step}')
+        print(f'migration took {migration_s:.1f}s')
+
+        rows_after = db.session.query(Attendance).count()
+        archived = db.session.execute(text('SELECT COUNT(*) FROM attendance_duplicates')).scalar()
+        assert rows_after + archived == rows_before
+
+        after = {name: best_of(fn) for name, fn in hot_queries(class_id, subject_id, student).items()}
+
+    print(f'{"query":<16} {"before ms":>10} {"after ms":>10} {"speedup":>8}')
+    for name in before:
+        print(f'{name:<16} {before[name]:>10.2f} {after[name]:>10.2f} {before[name] / after[name]:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
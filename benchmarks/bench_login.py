@@ -0,0 +1,135 @@
+"""Login throughput under a burst, and what the burst does to other requests.
+
+Serves the app on a local threaded WSGI server and has ``--logins``
+teachers (each with their own password hash) sign in at the same moment,
+while one already signed-in client keeps loading the students page. Each
+mode runs in its own process and database:
+
+* ``pbkdf2 inline``: the old setup, PBKDF2 hashes checked on the request threads,
+* ``scrypt inline``: scrypt hashes, still on the request threads,
+* ``scrypt pool``: scrypt on the bounded hashing pool (passwords.py).
+
+Prints logins per second, logins turned away with 503, and the students
+page latency during the burst.
+
+    python benchmarks/bench_login.py [--logins 50]
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+MODES = {
+    'pbkdf2 inline': {'PASSWORD_HASH_METHOD': 'pbkdf2:sha256', 'PASSWORD_HASH_WORKERS': '0'},
+    'scrypt inline': {'PASSWORD_HASH_METHOD': 'scrypt:32768:8:1', 'PASSWORD_HASH_WORKERS': '0'},
+    'scrypt pool': {'PASSWORD_HASH_METHOD': 'scrypt:32768:8:1', 'PASSWORD_HASH_WORKERS': '2',
+                    'PASSWORD_HASH_QUEUE': '32'},
+}
+
+
+def opener():
+    return urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+
+def post(client, url, data):
+    try:
+        with client.open(url, data=urllib.parse.urlencode(data).encode()) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as exc:
+        return exc.code
+
+
+def measure(logins):
+    from synthetic import seed
+    from werkzeug.security import generate_password_hash
+    from werkzeug.serving import make_server
+
+    from app import app
+    from models import db, Teacher
+
+    method = app.config['PASSWORD_HASH_METHOD']
+    with app.app_context():
+        db.create_all()
+        seed(classes=2, subjects=2, students=60, days=30)
+        with ThreadPoolExecutor() as executor:
+            hashes = list(executor.map(lambda i: generate_password_hash(f'password{i}', method=method),
+                                       range(logins + 1)))
+        db.session.add_all(Teacher(name=f'Teacher {i}', email=f'teacher{i}@example.com', password_hash=hashes[i])
+                           for i in range(logins + 1))
+        db.session.commit()
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+
+    probe = opener()
+    post(probe, base + '/login', {'email': f'teacher{logins}@example.com', 'password': f'password{logins}'})
+    probe_timings, done = [], threading.Event()
+
+    def load_students():
+        while not done.is_set():
+            started = time.perf_counter()
+            with probe.open(base + '/students?class_id=1') as response:
+                response.read()
+            probe_timings.append(time.perf_counter() - started)
+
+    probe_thread = threading.Thread(target=load_students)
+    probe_thread.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=logins) as executor:
+        codes = list(executor.map(
+            lambda i: post(opener(), base + '/login', {'email': f'teacher{i}@example.com',
+                                                       'password': f'password{i}'}),
+            range(logins)))
+    seconds = time.perf_counter() - started
+    done.set()
+    probe_thread.join()
+    server.shutdown()
+
+    ordered = sorted(probe_timings)
+    print(json.dumps({
+        'logins_per_second': sum(code == 200 for code in codes) / seconds,
+        'busy': sum(code == 503 for code in codes),
+        'burst_seconds': seconds,
+        'probe_p50_ms': statistics.median(ordered) * 1000,
+        'probe_p95_ms': ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=50)
+    args = parser.parse_args()
+
+    results = {}
+    for mode, env in MODES.items():
+        work_dir = tempfile.mkdtemp()
+        env = dict(os.environ, **env, DATABASE_URL=f'sqlite:///{os.path.join(work_dir, "a.db")}',
+                   EXPORT_DIR=os.path.join(work_dir, 'exports'), ARCHIVE_DIR=os.path.join(work_dir, 'archive'))
+        out = subprocess.run([sys.executable, __file__, '--measure', str(args.logins)], env=env,
+                             capture_output=True, text=True, check=True)
+        results[mode] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    print(f'{args.logins} simultaneous logins')
+    print(f'{"mode":<16} {"logins/s":>9} {"503s":>6} {"burst s":>8} {"page p50 ms":>12} {"page p95 ms":>12}')
+    for mode, row in results.items():
+        print(f'{mode:<16} {row["logins_per_second"]:>9.1f} {row["busy"]:>6} {row["burst_seconds"]:>8.1f} '
+              f'{row["probe_p50_ms"]:>12.1f} {row["probe_p95_ms"]:>12.1f}')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == '--measure':
+        measure(int(sys.argv[2]))
+    else:
+        main()
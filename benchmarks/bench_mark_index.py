@@ -0,0 +1,81 @@
+"""Memory and lookup latency of the in-memory attendance index (mark_index.py).
+
+Seeds an in-memory institution, loads every (class, subject) bit matrix and
+reports their memory per million marks, then times a /reports matrix and a
+student summary from the index against the SQL paths, and the cost of
+applying one new lecture to a loaded matrix.
+
+    python benchmarks/bench_mark_index.py [--classes 20 --students 60 --subjects 6 --days 180]
+"""
+import argparse
+from datetime import timedelta
+
+from synthetic import make_app, seed, timed, lecture_dates
+
+from models import db, Student, Subject, Attendance
+from mark_index import mark_index, bitmap, indexed_report, student_counts
+from report_cache import class_report_snapshot
+from reports import student_summary
+
+REPEATS = 20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--classes', type=int, default=20)
+    parser.add_argument('--subjects', type=int, default=6)
+    parser.add_argument('--students', type=int, default=60)
+    parser.add_argument('--days', type=int, default=180)
+    args = parser.parse_args()
+
+    app = make_app()
+    app.config['ATTENDANCE_INDEX'] = True
+    with app.app_context():
+        db.create_all()
+        seed(classes=args.classes, subjects=args.subjects, students=args.students, days=args.days)
+        marks = db.session.query(db.func.count(Attendance.id)).scalar()
+        pairs = db.session.query(Subject.class_id, Subject.id).all()
+        student = db.session.get(Student, 1)
+        dates = lecture_dates(args.days)
+
+        results = {}
+        with timed(results, 'load every matrix (total)'):
+            for class_id, subject_id in pairs:
+                bitmap(class_id, subject_id)
+        index_bytes = mark_index.stats()['bytes']
+
+        with timed(results, 'report (SQL)'):
+            for _ in range(REPEATS):
+                class_report_snapshot(1, 1)
+        with timed(results, 'report (index)'):
+            for _ in range(REPEATS):
+                indexed_report(1, 1)
+        with timed(results, 'ranged report (index)'):
+            for _ in range(REPEATS):
+                indexed_report(1, 1, dates[10], dates[-10])
+        with timed(results, 'student summary (counters)'):
+            for _ in range(REPEATS):
+                student_summary(student)
+        with timed(results, 'student summary (index)'):
+            for _ in range(REPEATS):
+                student_summary(student, student_counts(student))
+        with timed(results, 'matrix lookup'):
+            for _ in range(REPEATS):
+                bitmap(1, 1)
+        with timed(results, 'popcount of a matrix'):
+            for _ in range(REPEATS):
+                bitmap(1, 1).present_counts()
+        statuses = {sid: 'Present' for sid, in db.session.query(Student.id).filter_by(class_id=1)}
+        with timed(results, 'apply one lecture'):
+            for day in range(REPEATS):
+                bitmap(1, 1).with_lecture(dates[-1] + timedelta(days=day + 1), statuses)
+
+        print(f'{marks:,} marks in {len(pairs)} matrices')
+        print(f'index {index_bytes / 1024:,.1f} KiB = {index_bytes / marks * 1e6 / 1024:,.1f} KiB per million marks')
+        for name, seconds in results.items():
+            repeats = 1 if name.startswith('load') else REPEATS
+            print(f'{name:<30} {seconds / repeats * 1000:9.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
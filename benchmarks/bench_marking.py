@@ -0,0 +1,71 @@
+"""Attendance write throughput: per-object ORM adds against bulk executemany.
+
+Simulates the 9am burst: one submission per section, each one lecture's
+marks for the whole class, committed in its own transaction.
+
+``bulk`` is the real marking path, ``attendance.mark_session``: besides the
+executemany it checks for an archived term and, in the same transaction,
+updates the counters, bumps the report cache version and logs the lecture
+for API sync. ``bulk rows only`` is the executemany and commit alone, so the
+two rows together show what that bookkeeping costs. On SQLite the
+executemany alone is about 10x the per-object path, and the full path only
+about 2-3x.
+
+    python benchmarks/bench_marking.py
+"""
+import time
+
+from synthetic import make_app, seed, lecture_dates
+
+from models import db, Student, Attendance
+from attendance import mark_session, session_rows
+
+SECTIONS = 50
+STUDENTS = 120
+
+
+def per_object(class_id, subject_id, day, student_ids):
+    for student_id in student_ids:
+        db.session.add(Attendance(student_id=student_id, class_id=class_id, subject_id=subject_id,
+                                  date=day, status='Present'))
+    db.session.commit()
+
+
+def bulk(class_id, subject_id, day, student_ids):
+    mark_session(class_id, subject_id, day, dict.fromkeys(student_ids, 'Present'))
+    db.session.commit()
+
+
+def bulk_rows_only(class_id, subject_id, day, student_ids):
+    db.session.execute(Attendance.__table__.insert(),
+                       session_rows(class_id, subject_id, day, dict.fromkeys(student_ids, 'Present')))
+    db.session.commit()
+
+
+def run(writer):
+    bench_app = make_app()
+    with bench_app.app_context():
+        db.create_all()
+        seed(classes=SECTIONS, subjects=1, students=STUDENTS, days=0)
+        sections = {}
+        for student_id, class_id in db.session.query(Student.id, Student.class_id):
+            sections.setdefault(class_id, []).append(student_id)
+
+        start = time.perf_counter()
+        for day in lecture_dates(5):
+            for class_id, student_ids in sections.items():
+                writer(class_id, class_id, day, student_ids)
+        elapsed = time.perf_counter() - start
+        rows = db.session.query(Attendance).count()
+    return rows, elapsed
+
+
+def main():
+    print(f'{"path":<15} {"rows":>8} {"seconds":>8} {"rows/s":>9}')
+    for name, writer in (('per-object', per_object), ('bulk', bulk), ('bulk rows only', bulk_rows_only)):
+        rows, elapsed = run(writer)
+        print(f'{name:<15} {rows:>8,} {elapsed:>8.2f} {rows / elapsed:>9,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""Cost of a student listing page by position: keyset cursor against OFFSET.
+
+    python benchmarks/bench_pagination.py
+"""
+import time
+
+from synthetic import make_app, seed
+
+from models import db, Student
+from queries import paginate_students, encode_cursor, DEFAULT_PAGE_SIZE
+
+CLASSES = 100
+STUDENTS = 1000
+POSITIONS = [0, 10_000, 50_000, 99_000]
+
+
+def best_ms(fn, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main():
+    bench_app = make_app()
+    with bench_app.app_context():
+        db.create_all()
+        seed(classes=CLASSES, students=STUDENTS, days=0)
+        ordered = Student.query.order_by(Student.roll_number, Student.id)
+
+        print(f'{"position":>9} {"offset ms":>10} {"keyset ms":>10}')
+        for position in POSITIONS:
+            cursor = encode_cursor(ordered.offset(position - 1).first()) if position else None
+            offset_ms = best_ms(lambda: ordered.offset(position).limit(DEFAULT_PAGE_SIZE).all())
+            keyset_ms = best_ms(lambda: paginate_students(cursor=cursor))
+            print(f'{position:>9,} {offset_ms:>10.2f} {keyset_ms:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
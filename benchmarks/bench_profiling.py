@@ -0,0 +1,81 @@
+"""Overhead of request profiling (profiling.py).
+
+Renders a few pages many times with profiling off, on, and on with every
+request under cProfile, each mode in its own process and database, and
+prints the median latency per page.
+
+    python benchmarks/bench_profiling.py [--requests 200]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = {
+    'off': {'PROFILING': '0'},
+    'on': {'PROFILING': '1', 'PROFILE_SAMPLE_RATE': '0'},
+    'cProfile': {'PROFILING': '1', 'PROFILE_SAMPLE_RATE': '1', 'PROFILE_SLOW_MS': '1000000'},
+}
+
+PAGES = [
+    '/dashboard',
+    '/students?class_id=1',
+    '/reports?class_id=1&subject_id=1',
+    '/student_report/1',
+]
+
+
+def measure(requests):
+    from synthetic import seed
+    from werkzeug.security import generate_password_hash
+
+    from app import app
+    from models import db, Teacher
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Teacher(name='Admin', email='admin@example.com',
+                               password_hash=generate_password_hash('admin'), is_admin=True))
+        seed(classes=4, subjects=4, students=60, days=60)
+
+    client = app.test_client()
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'admin'})
+
+    medians = {}
+    for page in PAGES:
+        timings = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = client.get(page)
+            timings.append(time.perf_counter() - started)
+            assert response.status_code == 200, (page, response.status_code)
+        medians[page] = statistics.median(timings) * 1000
+    print(json.dumps(medians))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    results = {}
+    for mode, env in MODES.items():
+        env = dict(os.environ, **env, DATABASE_URL=f'sqlite:///{os.path.join(tempfile.mkdtemp(), "a.db")}')
+        out = subprocess.run([sys.executable, __file__, '--measure', str(args.requests)], env=env,
+                             capture_output=True, text=True, check=True)
+        results[mode] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    print(f'{"page (median ms)":<40}' + ''.join(f'{mode:>10}' for mode in MODES))
+    for page in PAGES:
+        print(f'{page:<40}' + ''.join(f'{results[mode][page]:>10.2f}' for mode in MODES))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == '--measure':
+        measure(int(sys.argv[2]))
+    else:
+        main()
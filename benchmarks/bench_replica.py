@@ -0,0 +1,171 @@
+"""Mixed read/write load with and without a read replica (database.py).
+
+Serves the app on a local threaded WSGI server for ``--seconds``: one client
+keeps marking new lectures while ``--readers`` clients load date-range
+reports (a new range each time, so the report cache never answers), student
+reports and searches. Each mode runs in its own process and database:
+
+* ``primary only``: every request on one SQLite file,
+* ``replica``: the report pages on a second SQLite file, refreshed from the
+  primary every ``--sync-every`` seconds as replication would.
+
+    python benchmarks/bench_replica.py [--seconds 10 --readers 4 --sync-every 2]
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from datetime import timedelta
+
+CLASSES, SUBJECTS, STUDENTS, DAYS = 4, 4, 60, 120
+
+
+def opener(base):
+    client = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    data = urllib.parse.urlencode({'email': 'admin@example.com', 'password': 'admin'}).encode()
+    client.open(base + '/login', data=data).read()
+    return client
+
+
+def timed(client, url, data=None, timings=None):
+    started = time.perf_counter()
+    with client.open(url, data=urllib.parse.urlencode(data).encode() if data else None) as response:
+        response.read()
+    timings.append(time.perf_counter() - started)
+
+
+def summary(timings, seconds):
+    ordered = sorted(timings) or [0]
+    return {
+        'per_second': len(timings) / seconds,
+        'p50_ms': statistics.median(ordered) * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000,
+    }
+
+
+def measure(seconds, readers, sync_every):
+    from synthetic import seed, lecture_dates
+    from werkzeug.security import generate_password_hash
+    from werkzeug.serving import make_server
+
+    from app import app
+    from database import REPLICA_BIND, sync_replica
+    from models import db, Teacher, Student
+
+    with app.app_context():
+        db.create_all()
+        password_hash = generate_password_hash('admin', method=app.config['PASSWORD_HASH_METHOD'])
+        db.session.add(Teacher(name='Admin', email='admin@example.com', password_hash=password_hash, is_admin=True))
+        seed(classes=CLASSES, subjects=SUBJECTS, students=STUDENTS, days=DAYS)
+        student_ids = {}
+        for student_id, class_id in db.session.query(Student.id, Student.class_id):
+            student_ids.setdefault(class_id, []).append(student_id)
+
+    replica = app.config['DATABASE_REPLICA_URL']
+    replicate = replica and sync_every and replica.startswith('sqlite')
+    if replicate:
+        with app.app_context():
+            primary, replica = db.engine.url, db.engines[REPLICA_BIND].url
+        sync_replica(primary, replica)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+    dates = lecture_dates(DAYS)
+    done = threading.Event()
+    reads, writes, syncs = [], [], []
+
+    def write():
+        client = opener(base)
+        for i in range(10 ** 9):
+            if done.is_set():
+                return
+            class_id = i % CLASSES + 1
+            form = {'class_id': class_id, 'subject_id': (class_id - 1) * SUBJECTS + 1,
+                    'date': (dates[-1] + timedelta(days=i // CLASSES + 1)).isoformat()}
+            form.update({f'status_{sid}': 'Present' for sid in student_ids[class_id]})
+            timed(client, base + '/attendance', form, writes)
+
+    def read(seed_value):
+        client, rng = opener(base), random.Random(seed_value)
+        while not done.is_set():
+            class_id = rng.randint(1, CLASSES)
+            subject_id = (class_id - 1) * SUBJECTS + rng.randint(1, SUBJECTS)
+            start = dates[rng.randint(0, DAYS - 2)]
+            url = rng.choice((
+                f'/reports?class_id={class_id}&subject_id={subject_id}&start_date={start.isoformat()}'
+                f'&end_date={dates[-1].isoformat()}',
+                f'/student_report/{rng.choice(student_ids[class_id])}',
+                f'/search_student?query=Student+{class_id}-{rng.randint(1, STUDENTS)}',
+            ))
+            timed(client, base + url, timings=reads)
+
+    def replicate_loop():
+        while not done.wait(sync_every):
+            started = time.perf_counter()
+            sync_replica(primary, replica)
+            syncs.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=write)] + [threading.Thread(target=read, args=(i,)) for i in range(readers)]
+    if replicate:
+        threads.append(threading.Thread(target=replicate_loop))
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    done.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    print(json.dumps({'reads': summary(reads, elapsed), 'writes': summary(writes, elapsed),
+                      'syncs': len(syncs), 'sync_ms': statistics.fmean(syncs) * 1000 if syncs else 0}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--sync-every', type=float, default=2)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    modes = {
+        'primary only': {'DATABASE_URL': f'sqlite:///{os.path.join(work_dir, "solo.db")}'},
+        'replica': {'DATABASE_URL': f'sqlite:///{os.path.join(work_dir, "primary.db")}',
+                    'DATABASE_REPLICA_URL': f'sqlite:///{os.path.join(work_dir, "replica.db")}'},
+    }
+
+    results = {}
+    for mode, env in modes.items():
+        env = dict(os.environ, **env, EXPORT_DIR=os.path.join(work_dir, 'exports'),
+                   ARCHIVE_DIR=os.path.join(work_dir, 'archive'))
+        out = subprocess.run([sys.executable, __file__, '--measure', str(args.seconds), str(args.readers),
+                              str(args.sync_every)], env=env, capture_output=True, text=True, check=True)
+        results[mode] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    print(f'{args.readers} readers and 1 writer for {args.seconds:g} s')
+    print(f'{"mode":<14} {"reads/s":>8} {"read p50":>9} {"read p95":>9} {"writes/s":>9} {"write p50":>10} '
+          f'{"write p95":>10} {"syncs":>6}')
+    for mode, row in results.items():
+        reads, writes = row['reads'], row['writes']
+        print(f'{mode:<14} {reads["per_second"]:>8.1f} {reads["p50_ms"]:>9.1f} {reads["p95_ms"]:>9.1f} '
+              f'{writes["per_second"]:>9.1f} {writes["p50_ms"]:>10.1f} {writes["p95_ms"]:>10.1f} '
+              f'{row["syncs"]:>6}')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 5 and sys.argv[1] == '--measure':
+        measure(float(sys.argv[2]), int(sys.argv[3]), float(sys.argv[4]))
+    else:
+        main()
@@ -0,0 +1,86 @@
+"""Latency of repeated /reports requests with the report cache.
+
+Times a cold render, a warm hit (cached HTML), an ETag revalidation (304)
+and the first request after marking another lecture of the same subject,
+then checks that marking a different subject left its cached report alone.
+
+    python benchmarks/bench_report_cache.py [--students 120 --days 180 --repeat 50]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+DB_DIR = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(DB_DIR, "attendance.db")}'
+
+from synthetic import seed, lecture_dates
+
+from werkzeug.security import generate_password_hash
+
+from app import app
+from models import db, Teacher, Student, Subject
+from report_cache import report_cache
+
+
+def median_ms(client, url, repeat, headers=None, expect=200):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        samples.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == expect, (url, response.status_code)
+    return statistics.median(samples), response
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--students', type=int, default=120)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Teacher(name='Bench', email='bench@example.com',
+                               password_hash=generate_password_hash('bench'), is_admin=True))
+        seed(classes=1, subjects=2, students=args.students, days=args.days)
+        subject_ids = [row[0] for row in db.session.query(Subject.id).order_by(Subject.id)]
+        class_id = db.session.query(Subject.class_id).filter_by(id=subject_ids[0]).scalar()
+        student_ids = [row[0] for row in db.session.query(Student.id).filter_by(class_id=class_id)]
+
+    client = app.test_client()
+    client.post('/login', data={'email': 'bench@example.com', 'password': 'bench'})
+    client.get('/dashboard')
+    url = f'/reports?class_id={class_id}&subject_id={subject_ids[0]}'
+    other = f'/reports?class_id={class_id}&subject_id={subject_ids[1]}'
+    next_day = lecture_dates(args.days + 1)[-1]
+
+    def mark(subject_id):
+        form = {'class_id': class_id, 'subject_id': subject_id, 'date': next_day.isoformat()}
+        form.update({f'status_{student_id}': 'Present' for student_id in student_ids})
+        client.post('/attendance', data=form)
+        client.get('/dashboard')
+
+    cold, response = median_ms(client, url, 1)
+    etag = response.headers['ETag']
+    warm, _ = median_ms(client, url, args.repeat)
+    revalidate, _ = median_ms(client, url, args.repeat, headers={'If-None-Match': etag}, expect=304)
+    other_etag = client.get(other).headers['ETag']
+
+    mark(subject_ids[0])
+    invalidated, _ = median_ms(client, url, 1)
+    other_still_cached = client.get(other, headers={'If-None-Match': other_etag}).status_code == 304
+
+    print(f'{args.students} students x {args.days} dates, {len(response.data) / 1024:.0f} KiB page')
+    print(f'cold render        {cold:8.2f} ms')
+    print(f'cached HTML        {warm:8.2f} ms')
+    print(f'304 revalidation   {revalidate:8.2f} ms')
+    print(f'after new marks    {invalidated:8.2f} ms')
+    print(f'other subject kept cached: {other_still_cached}')
+    print(report_cache.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Query count and latency of the /reports matrix against class size.
+
+Compares the old per-student loop in ``view_reports`` with
+``reports.build_class_report``.
+
+    python benchmarks/bench_reports.py
+"""
+from synthetic import make_app, seed, QueryCounter, timed
+
+from models import db, Student, Attendance
+from reports import build_class_report
+
+CLASS_SIZES = [30, 60, 120, 240]
+DAYS = 120
+
+
+def legacy_report(class_id, subject_id):
+    dates = [d[0] for d in db.session.query(Attendance.date).filter_by(
+        class_id=class_id, subject_id=subject_id).distinct().order_by(Attendance.date).all()]
+    total_days = len(dates)
+    students = Student.query.filter_by(class_id=class_id).order_by(Student.roll_number).all()
+    report_data = []
+    for student in students:
+        records = Attendance.query.filter(
+            Attendance.student_id == student.id,
+            Attendance.class_id == class_id,
+            Attendance.subject_id == subject_id,
+            Attendance.date.in_(dates)
+        ).all()
+        status_map = {record.date: record.status for record in records}
+        present_count = sum(1 for status in status_map.values() if status == 'Present')
+        report_data.append({
+            'student': student,
+            'present': present_count,
+            'total': total_days,
+            'percentage': round((present_count / total_days * 100) if total_days else 0, 2),
+            'status_list': [status_map.get(date, '-') for date in dates]
+        })
+    return dates, students, report_data
+
+
+def main():
+    print(f'{"students":>8} {"legacy q":>9} {"legacy ms":>10} {"engine q":>9} {"engine ms":>10}')
+    for size in CLASS_SIZES:
+        bench_app = make_app()
+        with bench_app.app_context():
+            db.create_all()
+            seed(students=size, days=DAYS)
+            results = {}
+
+            with QueryCounter(db.engine) as legacy_q, timed(results, 'legacy'):
+                legacy = legacy_report(1, 1)
+            db.session.expunge_all()
+            with QueryCounter(db.engine) as engine_q, timed(results, 'engine'):
+                new = build_class_report(1, 1)
+
+            assert [r['status_list'] for r in legacy[2]] == [r['status_list'] for r in new[2]]
+            print(f'{size:>8} {legacy_q.count:>9} {results["legacy"] * 1000:>10.1f} '
+                  f'{engine_q.count:>9} {results["engine"] * 1000:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
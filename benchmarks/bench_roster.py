@@ -0,0 +1,82 @@
+"""Bulk roster import and export on a large roster (rosters.py).
+
+Writes a CSV and an XLSX roster of ``--rows`` students spread over
+``--classes`` classes, imports each into a fresh file-backed database and
+exports the result again in both formats. A last run re-imports the CSV into
+the filled database, so every row is rejected as a duplicate.
+
+    python benchmarks/bench_roster.py [--rows 100000 --classes 50]
+"""
+import argparse
+import csv
+import os
+import tempfile
+
+from synthetic import make_app, timed
+
+from database import engine_options
+from models import db, Class, Student
+from exports import write_xlsx
+from rosters import ROSTER_HEADERS, read_roster, import_roster, roster_export_rows
+
+
+def roster(rows, classes):
+    for i in range(rows):
+        yield [f'{i:07d}', f'Student {i}', f'Class {i % classes + 1}']
+
+
+def fresh_database(path, classes):
+    database_uri = f'sqlite:///{path}'
+    app = make_app(database_uri)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(database_uri)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all(Class(name=f'Class {c + 1}') for c in range(classes))
+        db.session.commit()
+    return app
+
+
+def run_import(app, path, results, label):
+    with app.app_context(), timed(results, label), open(path, 'rb') as fh:
+        result = import_roster(read_roster(fh, path))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--classes', type=int, default=50)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    csv_path = os.path.join(work_dir, 'roster.csv')
+    xlsx_path = os.path.join(work_dir, 'roster.xlsx')
+    with open(csv_path, 'w', newline='') as fh:
+        writer = csv.writer(fh)
+        writer.writerow(ROSTER_HEADERS)
+        writer.writerows(roster(args.rows, args.classes))
+    write_xlsx(xlsx_path, 'Roster', ROSTER_HEADERS, roster(args.rows, args.classes))
+
+    results = {}
+    csv_app = fresh_database(os.path.join(work_dir, 'csv.db'), args.classes)
+    imported = run_import(csv_app, csv_path, results, 'import CSV')['imported']
+    xlsx_app = fresh_database(os.path.join(work_dir, 'xlsx.db'), args.classes)
+    run_import(xlsx_app, xlsx_path, results, 'import XLSX')
+    rejected = run_import(csv_app, csv_path, results, 'reimport CSV (all duplicates)')['error_count']
+
+    with csv_app.app_context():
+        assert db.session.query(db.func.count(Student.id)).scalar() == args.rows
+        with timed(results, 'export CSV'), open(os.path.join(work_dir, 'out.csv'), 'w', newline='') as fh:
+            writer = csv.writer(fh)
+            writer.writerow(ROSTER_HEADERS)
+            writer.writerows(roster_export_rows())
+        with timed(results, 'export XLSX'):
+            write_xlsx(os.path.join(work_dir, 'out.xlsx'), 'Roster', ROSTER_HEADERS, roster_export_rows())
+
+    print(f'{args.rows:,} students in {args.classes} classes: {imported:,} imported, {rejected:,} rejected on reimport')
+    for name, seconds in results.items():
+        print(f'{name:<30} {seconds:7.2f} s {args.rows / seconds:>10,.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
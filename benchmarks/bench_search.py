@@ -0,0 +1,61 @@
+"""Student search latency: FTS5 trigram index against the ILIKE '%q%' scan.
+
+    python benchmarks/bench_search.py [--students 500000]
+"""
+import argparse
+import random
+import time
+
+from synthetic import make_app
+
+from models import db, Class, Student
+from search import search_students, _ilike_search
+
+FIRST = ['Aarav', 'Vivaan', 'Aditya', 'Diya', 'Ananya', 'Ishaan', 'Kavya', 'Rohan', 'Saanvi', 'Arjun',
+         'Meera', 'Kabir', 'Nisha', 'Rahul', 'Priya', 'Sahil', 'Tanvi', 'Varun', 'Zoya', 'Neel']
+LAST = ['Sharma', 'Verma', 'Iyer', 'Nair', 'Reddy', 'Gupta', 'Khan', 'Das', 'Menon', 'Joshi',
+        'Patel', 'Bose', 'Rao', 'Pillai', 'Singh', 'Mehta', 'Kapoor', 'Chopra', 'Malhotra', 'Sen']
+TERMS = ['CS0421337', 'CS04213', 'Rahul', 'kapoor', 'rahl', 'Zoya Sen', 'xyzzy']
+CLASS_SIZE = 1000
+
+
+def best_ms(fn, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--students', type=int, default=500_000)
+    args = parser.parse_args()
+    rng = random.Random(3)
+
+    bench_app = make_app()
+    with bench_app.app_context():
+        db.create_all()
+        for c in range(args.students // CLASS_SIZE):
+            class_obj = Class(name=f'Class {c}')
+            db.session.add(class_obj)
+            db.session.flush()
+            db.session.execute(Student.__table__.insert(), [
+                {'name': f'{rng.choice(FIRST)} {rng.choice(LAST)}', 'roll_number': f'CS{c:04d}{i:03d}',
+                 'class_id': class_obj.id}
+                for i in range(CLASS_SIZE)
+            ])
+        db.session.commit()
+
+        print(f'{"term":<12} {"ilike ms":>9} {"index ms":>9} {"hits":>5}')
+        for term in TERMS:
+            ilike_ms = best_ms(lambda: _ilike_search(term, 50))
+            index_ms = best_ms(lambda: search_students(term, 50))
+            hits = search_students(term, 50)
+            print(f'{term:<12} {ilike_ms:>9.2f} {index_ms:>9.2f} {len(hits):>5}  '
+                  f'{hits[0].name + " " + hits[0].roll_number if hits else ""}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Time to first byte and peak memory of streamed /reports pages.
+
+Seeds one class and subject with ``--days`` lecture days (three years by
+default) and fetches the whole-history report in full (``stream=0``) and
+streamed a window of dates at a time (``stream=1``), each under tracemalloc,
+for a growing share of the history. The streamed first byte should not grow
+with the number of dates, and neither should its peak memory.
+
+    python benchmarks/bench_stream_report.py [--days 1095 --students 60]
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+
+def fetch(client, url):
+    """``(seconds to first chunk, seconds in total, peak traced bytes, body bytes)``."""
+    tracemalloc.start()
+    try:
+        started = time.perf_counter()
+        response = client.get(url, buffered=False)
+        chunks = iter(response.response)
+        size = len(next(chunks))
+        first = time.perf_counter() - started
+        size += sum(len(chunk) for chunk in chunks)
+        total = time.perf_counter() - started
+        response.close()
+        return first, total, tracemalloc.get_traced_memory()[1], size
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=1095)
+    parser.add_argument('--students', type=int, default=60)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(work_dir, "attendance.db")}'
+    os.environ.setdefault('EXPORT_DIR', os.path.join(work_dir, 'exports'))
+    os.environ.setdefault('ARCHIVE_DIR', os.path.join(work_dir, 'archive'))
+    os.environ['REPORT_CACHE_HTML'] = '0'
+
+    from synthetic import seed, lecture_dates
+    from werkzeug.security import generate_password_hash
+
+    from app import app
+    from models import db, Teacher
+    from report_cache import report_cache
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Teacher(name='Admin', email='admin@example.com',
+                               password_hash=generate_password_hash('admin'), is_admin=True))
+        seed(classes=1, subjects=1, students=args.students, days=args.days)
+    dates = lecture_dates(args.days)
+
+    client = app.test_client()
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'admin'})
+
+    print(f'{"dates":>6} {"mode":<9} {"first byte ms":>14} {"total ms":>9} {"peak KiB":>9} {"page KiB":>9}')
+    for share in (0.1, 0.25, 0.5, 1.0):
+        end = dates[max(0, int(len(dates) * share) - 1)]
+        url = f'/reports?class_id=1&subject_id=1&end_date={end.isoformat()}'
+        for mode in ('0', '1'):
+            report_cache.clear()
+            first, total, peak, size = fetch(client, f'{url}&stream={mode}')
+            print(f'{int(len(dates) * share):>6} {"streamed" if mode == "1" else "full":<9} {first * 1000:>14.1f} '
+                  f'{total * 1000:>9.1f} {peak / 1024:>9,.0f} {size / 1024:>9,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Throughput of the term report generator against the number of worker processes.
+
+Seeds a file-backed institution, then writes every class's term report with
+1, 2, 4, ... workers up to the core count (or the counts given with
+``--workers``), each into a fresh directory.
+
+    python benchmarks/bench_term_reports.py [--classes 48 --students 60 --subjects 6 --days 90 --workers 1 2 4]
+"""
+import argparse
+import os
+import tempfile
+
+from synthetic import make_app, seed
+
+from database import engine_options
+from models import db
+from term_reports import generate
+
+
+def worker_counts():
+    cores = os.cpu_count() or 1
+    counts, workers = [], 1
+    while workers < cores:
+        counts.append(workers)
+        workers *= 2
+    return counts + [cores]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--classes', type=int, default=48)
+    parser.add_argument('--subjects', type=int, default=6)
+    parser.add_argument('--students', type=int, default=60)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--workers', type=int, nargs='+')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    database_uri = f'sqlite:///{os.path.join(work_dir, "attendance.db")}'
+    app = make_app(database_uri)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(database_uri)
+
+    with app.app_context():
+        db.create_all()
+        seed(classes=args.classes, subjects=args.subjects, students=args.students, days=args.days)
+
+        print(f'{args.classes} classes x {args.students} students x {args.subjects} subjects, '
+              f'{os.cpu_count()} cores')
+        print(f'{"workers":>8} {"seconds":>9} {"students/s":>11} {"speedup":>8}')
+        baseline = None
+        for workers in args.workers or worker_counts():
+            out_dir = os.path.join(work_dir, f'out-{workers}')
+            stats = generate(out_dir, database_uri, workers=workers, log=lambda message: None)
+            baseline = baseline or stats['seconds']
+            print(f"{workers:>8} {stats['seconds']:>9.2f} {stats['students'] / stats['seconds']:>11,.0f} "
+                  f"{baseline / stats['seconds']:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Fail if archived marks keep counting after their student, subject or class is deleted.
+
+Seeds a small institution, archives the first half of the period, deletes a
+student, a subject and a class through the app, and checks that
+``counters.verify`` finds no drift, that ``rebuild`` leaves no counters for
+deleted rows, and that restoring the term brings back only marks whose
+student, subject and class still exist. Exits non-zero on any failure, so it
+can gate CI.
+
+    python benchmarks/check_archive_counters.py
+"""
+import os
+import sys
+import tempfile
+
+CLASSES, SUBJECTS, STUDENTS, DAYS = 3, 3, 8, 20
+
+
+def main():
+    work_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(work_dir, "attendance.db")}'
+    os.environ.setdefault('EXPORT_DIR', os.path.join(work_dir, 'exports'))
+    os.environ.setdefault('ARCHIVE_DIR', os.path.join(work_dir, 'archive'))
+
+    from synthetic import seed, lecture_dates
+    from werkzeug.security import generate_password_hash
+
+    from app import app
+    from archive import archive_term, restore_term
+    from counters import verify, rebuild
+    from models import db, Teacher, Class, Subject, Student, Attendance, AttendanceSummary, LectureCount
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Teacher(name='Admin', email='admin@example.com',
+                               password_hash=generate_password_hash('admin'), is_admin=True))
+        seed(classes=CLASSES, subjects=SUBJECTS, students=STUDENTS, days=DAYS)
+        dates = lecture_dates(DAYS)
+        archive_term('Check', dates[0], dates[DAYS // 2])
+        student_id = db.session.query(Student.id).filter_by(class_id=1).order_by(Student.id).first()[0]
+        subject_id = db.session.query(Subject.id).filter_by(class_id=2).order_by(Subject.id).first()[0]
+
+    client = app.test_client()
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'admin'})
+    for url in (f'/delete_student/{student_id}', f'/delete_subject/{subject_id}', '/delete_class/3'):
+        response = client.get(url)
+        assert response.status_code == 302, (url, response.status_code)
+
+    failures = []
+    with app.app_context():
+        failures += [f'after delete: {line}' for line in verify()]
+        rebuild()
+        failures += [f'after rebuild: {line}' for line in verify()]
+        students = {row[0] for row in db.session.query(Student.id)}
+        subjects = {row[0] for row in db.session.query(Subject.id)}
+        classes = {row[0] for row in db.session.query(Class.id)}
+        failures += [f'rebuild counted deleted student {row.student_id}'
+                     for row in AttendanceSummary.query if row.student_id not in students]
+        failures += [f'rebuild counted deleted subject {row.subject_id}'
+                     for row in LectureCount.query if row.subject_id not in subjects]
+
+        restore_term('Check')
+        failures += [f'after restore: {line}' for line in verify()]
+        for column, live, label in ((Attendance.student_id, students, 'student'),
+                                    (Attendance.subject_id, subjects, 'subject'),
+                                    (Attendance.class_id, classes, 'class')):
+            orphans = db.session.query(Attendance.id).filter(column.notin_(live)).count()
+            if orphans:
+                failures.append(f'restore inserted {orphans} marks of deleted {label}s')
+
+    for line in failures:
+        print(line)
+    print('FAILED' if failures else 'ok')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Fail if any page's SQL statement count grows with the number of rows.
+
+Renders every list page against a small and a large synthetic institution
+(each in its own process and database) and compares statements per request.
+Exits non-zero on any growth, so it can gate CI.
+
+    python benchmarks/check_query_counts.py
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+SCALES = {
+    'small': {'classes': 2, 'subjects': 2, 'students': 5, 'days': 3},
+    'large': {'classes': 8, 'subjects': 4, 'students': 40, 'days': 12},
+}
+
+PAGES = [
+    '/classes',
+    '/subjects',
+    '/students',
+    '/students?class_id=1',
+    '/search_student',
+    '/search_student?query=Student',
+    '/attendance',
+    '/attendance?class_id=1&subject_id=1&date=2030-01-01',
+    '/reports',
+    '/reports?class_id=1&subject_id=1',
+    '/student_report/1',
+    '/teachers',
+]
+
+
+def measure(scale):
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(tempfile.mkdtemp(), "attendance.db")}'
+
+    from synthetic import seed, QueryCounter
+    from werkzeug.security import generate_password_hash
+
+    from app import app
+    from models import db, Teacher
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(Teacher(name='Admin', email='admin@example.com',
+                               password_hash=generate_password_hash('admin'), is_admin=True))
+        seed(**SCALES[scale])
+        engine = db.engine
+
+    client = app.test_client()
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'admin'})
+
+    counts = {}
+    for page in PAGES:
+        with QueryCounter(engine) as counter:
+            response = client.get(page)
+        assert response.status_code == 200, (page, response.status_code)
+        counts[page] = counter.count
+    print(json.dumps(counts))
+
+
+def main():
+    results = {}
+    for scale in SCALES:
+        out = subprocess.run([sys.executable, __file__, scale], capture_output=True, text=True, check=True)
+        results[scale] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    failed = False
+    print(f'{"page":<52} {"small":>6} {"large":>6}')
+    for page in PAGES:
+        small, large = results['small'][page], results['large'][page]
+        flag = '' if large <= small else '  <-- grows with row count'
+        failed = failed or bool(flag)
+        print(f'{page:<52} {small:>6} {large:>6}{flag}')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 2 and sys.argv[1] in SCALES:
+        measure(sys.argv[1])
+    else:
+        main()
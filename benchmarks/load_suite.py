@@ -0,0 +1,284 @@
+"""End-to-end load test of the app against a saved baseline.
+
+Seeds a synthetic institution (``--classes`` x ``--subjects`` per class x
+``--students`` per class x ``--days`` lecture days) into a fresh file-backed
+database, logs in and drives the real app through the Flask test client, or
+through a local WSGI server with ``--server``. Each scenario records latency
+percentiles and SQL statements per request; a second, shorter pass under
+tracemalloc records each scenario's peak Python memory.
+
+Results are written to ``--output`` as JSON. ``--save-baseline`` stores them
+as the baseline; otherwise they are compared with the baseline and the run
+exits non-zero on a regression:
+
+* p50 latency more than ``--tolerance`` (default 25%) and ``--min-delta-ms``
+  (default 5 ms) above the baseline, or p95 latency more than twice both,
+  since the tail is noisier,
+* more SQL statements per request than the baseline,
+* peak memory more than ``--tolerance`` above the baseline.
+
+Timings are only comparable on one machine, so record the baseline where the
+comparison will run.
+
+    python benchmarks/load_suite.py --save-baseline
+    python benchmarks/load_suite.py [--classes 10 --subjects 5 --students 60 --days 90 --requests 50 --server]
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.parse
+import urllib.request
+from datetime import timedelta
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'load_baseline.json')
+MEMORY_REQUESTS = 5
+SCALE_KEYS = ('classes', 'subjects', 'students', 'days')
+
+
+class TestClient:
+    """Requests through ``app.test_client()``."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, url, data=None):
+        response = self.client.open(url, method=method, data=data)
+        response.get_data()
+        return response.status_code
+
+
+class ServerClient:
+    """Requests over HTTP to the app served by a local werkzeug server."""
+
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f'http://127.0.0.1:{self.server.server_port}'
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, method, url, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        with self.opener.open(urllib.request.Request(self.base + url, data=body, method=method)) as response:
+            response.read()
+            return response.status
+
+
+def scenarios(scale, rng, student_ids, lecture_days):
+    """``{name: make_request}``; ``make_request(i)`` returns ``(method, url, data)`` for request ``i``."""
+    classes, subjects, days = scale['classes'], scale['subjects'], scale['days']
+    first_day, last_day = lecture_days[0], lecture_days[-1]
+
+    def subject_of(class_id):
+        return (class_id - 1) * subjects + rng.randint(1, subjects)
+
+    def mark(i):
+        class_id = i % classes + 1
+        day = last_day + timedelta(days=i // classes + 1)
+        data = {'class_id': class_id, 'subject_id': subject_of(class_id), 'date': day.isoformat()}
+        data.update({f'status_{sid}': rng.choice(('Present', 'Absent')) for sid in student_ids[class_id]})
+        return 'POST', '/attendance', data
+
+    def report(i):
+        class_id = rng.randint(1, classes)
+        return 'GET', f'/reports?class_id={class_id}&subject_id={subject_of(class_id)}', None
+
+    def ranged_report(i):
+        # A new range every time, so the report cache never answers
+        class_id = rng.randint(1, classes)
+        start = first_day + timedelta(days=rng.randint(0, days - 1))
+        return ('GET', f'/reports?class_id={class_id}&subject_id={subject_of(class_id)}'
+                       f'&start_date={start.isoformat()}&end_date={last_day.isoformat()}', None)
+
+    def student_report(i):
+        class_id = rng.randint(1, classes)
+        return 'GET', f'/student_report/{rng.choice(student_ids[class_id])}', None
+
+    def search(i):
+        return 'GET', f'/search_student?query=Student+{rng.randint(1, classes)}-{rng.randint(1, 99)}', None
+
+    def student_list(i):
+        return 'GET', f'/students?class_id={rng.randint(1, classes)}', None
+
+    def export(i):
+        class_id = rng.randint(1, classes)
+        return 'GET', f'/export?class_id={class_id}&subject_id={subject_of(class_id)}', None
+
+    return {
+        'mark attendance': mark,
+        'class report': report,
+        'class report (date range)': ranged_report,
+        'student report': student_report,
+        'search': search,
+        'student list': student_list,
+        'export': export,
+    }
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_scenario(client, engine, make_request, requests, counter_cls):
+    timings, queries = [], []
+    for i in range(requests):
+        method, url, data = make_request(i)
+        with counter_cls(engine) as counter:
+            started = time.perf_counter()
+            status = client.request(method, url, data)
+            timings.append((time.perf_counter() - started) * 1000)
+        assert status < 400, (url, status)
+        queries.append(counter.count)
+    ordered = sorted(timings)
+    return {
+        'requests': requests,
+        'p50_ms': round(percentile(ordered, 0.50), 2),
+        'p90_ms': round(percentile(ordered, 0.90), 2),
+        'p95_ms': round(percentile(ordered, 0.95), 2),
+        'p99_ms': round(percentile(ordered, 0.99), 2),
+        'max_ms': round(ordered[-1], 2),
+        'mean_ms': round(statistics.fmean(timings), 2),
+        'queries_per_request': round(statistics.fmean(queries), 2),
+        'max_queries': max(queries),
+    }
+
+
+def peak_memory(client, make_request, offset):
+    tracemalloc.start()
+    try:
+        for i in range(MEMORY_REQUESTS):
+            client.request(*make_request(offset + i))
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(args):
+    work_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(work_dir, "attendance.db")}'
+    os.environ.setdefault('EXPORT_DIR', os.path.join(work_dir, 'exports'))
+    os.environ.setdefault('ARCHIVE_DIR', os.path.join(work_dir, 'archive'))
+
+    from synthetic import seed, lecture_dates, QueryCounter
+    from werkzeug.security import generate_password_hash
+
+    from app import app
+    from models import db, Teacher, Student
+
+    scale = {key: getattr(args, key) for key in SCALE_KEYS}
+    with app.app_context():
+        db.create_all()
+        db.session.add(Teacher(name='Admin', email='admin@example.com',
+                               password_hash=generate_password_hash('admin'), is_admin=True))
+        seed(**scale)
+        student_ids = {}
+        for student_id, class_id in db.session.query(Student.id, Student.class_id):
+            student_ids.setdefault(class_id, []).append(student_id)
+        engine = db.engine
+
+    client = (ServerClient if args.server else TestClient)(app)
+    client.request('POST', '/login', {'email': 'admin@example.com', 'password': 'admin'})
+
+    rng = random.Random(args.seed)
+    results = {}
+    for name, make_request in scenarios(scale, rng, student_ids, lecture_dates(args.days)).items():
+        requests = max(3, args.requests // 10) if name == 'export' else args.requests
+        results[name] = run_scenario(client, engine, make_request, requests, QueryCounter)
+        results[name]['peak_memory_kib'] = round(peak_memory(client, make_request, requests) / 1024)
+        print(f'  {name}: p95 {results[name]["p95_ms"]} ms', file=sys.stderr)
+
+    return {
+        'scale': scale,
+        'requests': args.requests,
+        'client': 'server' if args.server else 'test_client',
+        'max_rss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'scenarios': results,
+    }
+
+
+def compare(current, baseline, tolerance, min_delta_ms):
+    """Return a list of regressions of ``current`` against ``baseline``."""
+    if {key: baseline['scale'][key] for key in SCALE_KEYS} != current['scale'] or \
+            baseline.get('client') != current['client']:
+        raise SystemExit('The baseline was recorded with a different scale or client; record a new one.')
+    failures = []
+    for name, now in current['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            continue
+        for key, allowed, delta in (('p50_ms', tolerance, min_delta_ms), ('p95_ms', 2 * tolerance, 2 * min_delta_ms)):
+            if now[key] > before[key] * (1 + allowed) and now[key] - before[key] > delta:
+                failures.append(f'{name}: {key[:3]} {before[key]} -> {now[key]} ms')
+        if now['queries_per_request'] > before['queries_per_request']:
+            failures.append(f'{name}: queries/request {before["queries_per_request"]} -> '
+                            f'{now["queries_per_request"]}')
+        if now['peak_memory_kib'] > before['peak_memory_kib'] * (1 + tolerance):
+            failures.append(f'{name}: peak memory {before["peak_memory_kib"]} -> {now["peak_memory_kib"]} KiB')
+    return failures
+
+
+def print_table(current, baseline):
+    print(f'{"scenario":<28} {"p50":>8} {"base p50":>9} {"p95":>8} {"base p95":>9} {"p99":>8} {"queries":>8} '
+          f'{"peak KiB":>9}')
+    for name, row in current['scenarios'].items():
+        before = (baseline or {}).get('scenarios', {}).get(name)
+        base50, base95 = (f'{before[key]:>9.2f}' if before else f'{"-":>9}' for key in ('p50_ms', 'p95_ms'))
+        print(f'{name:<28} {row["p50_ms"]:>8.2f} {base50} {row["p95_ms"]:>8.2f} {base95} {row["p99_ms"]:>8.2f} '
+              f'{row["queries_per_request"]:>8.1f} {row["peak_memory_kib"]:>9,}')
+    print(f'max RSS {current["max_rss_kib"] / 1024:.0f} MiB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--classes', type=int, default=10)
+    parser.add_argument('--subjects', type=int, default=5)
+    parser.add_argument('--students', type=int, default=60)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--requests', type=int, default=50, help='Requests per scenario (exports run a tenth).')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--server', action='store_true', help='Drive a local WSGI server over HTTP.')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--output', help='Also write the results to this JSON file.')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--min-delta-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    current = run(args)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(current, fh, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as fh:
+            json.dump(current, fh, indent=2)
+        print_table(current, None)
+        print(f'Baseline saved to {args.baseline}.')
+        return
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+    print_table(current, baseline)
+    if baseline is None:
+        print(f'No baseline at {args.baseline}; run with --save-baseline to record one.')
+        return
+    failures = compare(current, baseline, args.tolerance, args.min_delta_ms)
+    for failure in failures:
+        print(f'REGRESSION {failure}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
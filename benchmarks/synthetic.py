@@ -0,0 +1,98 @@
+"""Synthetic institution data shared by the benchmark scripts."""
+import os
+import random
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import event
+
+from models import db, Class, Subject, Student, Attendance
+from counters import rebuild as rebuild_counters
+
+
+def make_app(database_uri='sqlite://'):
+    """Return a bare Flask app bound to ``db`` for engine-level benchmarks."""
+    bench_app = Flask(__name__)
+    bench_app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    bench_app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(bench_app)
+    return bench_app
+
+
+def lecture_dates(days, start=date(2024, 1, 1)):
+    return [start + timedelta(days=i) for i in range(days)]
+
+
+def seed(classes=1, subjects=1, students=30, days=30, present_rate=0.8, seed_value=42):
+    """Create ``classes`` classes with their subjects, students and marks.
+
+    Must run inside an app context with the tables already created. Marks are
+    inserted with Core executemany so large datasets seed quickly; the
+    attendance counters are rebuilt afterwards.
+    """
+    rng = random.Random(seed_value)
+    dates = lecture_dates(days)
+
+    for c in range(classes):
+        class_obj = Class(name=f'Class {c + 1}')
+        db.session.add(class_obj)
+        db.session.flush()
+
+        subject_ids = []
+        for s in range(subjects):
+            subject = Subject(name=f'Subject {s + 1}', class_id=class_obj.id)
+            db.session.add(subject)
+            db.session.flush()
+            subject_ids.append(subject.id)
+
+        db.session.execute(Student.__table__.insert(), [
+            {'name': f'Student {c + 1}-{i + 1}', 'roll_number': f'{c + 1:03d}{i + 1:04d}', 'class_id': class_obj.id}
+            for i in range(students)
+        ])
+        student_ids = [row[0] for row in db.session.query(Student.id).filter_by(class_id=class_obj.id)]
+
+        for subject_id in subject_ids if dates else ():
+            db.session.execute(Attendance.__table__.insert(), [
+                {
+                    'student_id': student_id,
+                    'class_id': class_obj.id,
+                    'subject_id': subject_id,
+                    'date': day,
+                    'status': 'Present' if rng.random() < present_rate else 'Absent'
+                }
+                for day in dates
+                for student_id in student_ids
+            ])
+    db.session.commit()
+    rebuild_counters()
+
+
+class QueryCounter:
+    """Count statements and SQL time on an engine while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, 'before_cursor_execute', self._before)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._before)
+
+
+@contextmanager
+def timed(results, key):
+    start = time.perf_counter()
+    yield
+    results[key] = time.perf_counter() - start
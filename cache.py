@@ -0,0 +1,182 @@
+"""Versioned read-through cache for reference data.
+
+Classes, subjects and teachers change a few times per term but are read on
+almost every request. Cached values are tagged with the version of the data
+they came from; the versions live in the ``cache_version`` table and are
+bumped in the same transaction as every write, so all worker processes see a
+change on their next request. Versions are read once per request.
+
+Cached values are immutable snapshots rather than ORM instances, so they can
+be shared between threads and outlive the session that loaded them.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import g, has_app_context
+from flask_login import UserMixin
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, Teacher, Class, Subject, CacheVersion
+
+CACHE_MAX_ENTRIES = 1024
+CACHE_TTL_SECONDS = 300
+REFERENCE_DATA = ('classes', 'subjects', 'teachers')
+
+ClassRef = namedtuple('ClassRef', 'id name')
+SubjectRef = namedtuple('SubjectRef', 'id name class_id class_val')
+
+
+class CachedUser(UserMixin):
+    """Snapshot of a Teacher for Flask-Login's ``current_user``."""
+
+    def __init__(self, teacher):
+        self.id = teacher.id
+        self.name = teacher.name
+        self.email = teacher.email
+        self.is_admin = teacher.is_admin
+
+
+class VersionedCache:
+    """Thread-safe LRU cache whose entries carry a version and an expiry time.
+
+    Entries are evicted least recently used first once there are more than
+    ``max_entries`` of them or, when ``max_bytes`` is set, once the sizes
+    passed to ``store`` add up to more than ``max_bytes``.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, max_bytes=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, key, version):
+        """Return the value cached for ``key`` at ``version``, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            return None
+
+    def store(self, key, version, value, size=0):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[3]
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._entries[key] = (version, time.monotonic() + self.ttl, value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                self._bytes -= self._entries.popitem(last=False)[1][3]
+                self.evictions += 1
+
+    def get(self, key, version, loader):
+        """Return the value cached for ``key`` at ``version``, loading it on a miss."""
+        value = self.lookup(key, version)
+        if value is None:
+            value = loader()
+            self.store(key, version, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+reference_cache = VersionedCache()
+
+
+def versions():
+    """``{name: version}`` of the reference data, read at most once per request."""
+    if has_app_context() and 'cache_versions' in g:
+        return g.cache_versions
+    current = dict(
+        db.session.query(CacheVersion.name, CacheVersion.version).filter(CacheVersion.name.in_(REFERENCE_DATA))
+    )
+    if has_app_context():
+        g.cache_versions = current
+    return current
+
+
+_bump_statements = {}
+
+
+def _bump_statement(dialect):
+    stmt = _bump_statements.get(dialect)
+    if stmt is None:
+        table = CacheVersion.__table__
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=['name'], set_={'version': table.c.version + 1})
+        _bump_statements[dialect] = stmt
+    return stmt
+
+
+def bump_version(*names):
+    """Invalidate cached data for ``names``; commits with the caller's transaction.
+
+    An upsert, so two transactions bumping a name for the first time cannot
+    both insert it; names are bumped in sorted order so they lock in one order.
+    """
+    if names:
+        dialect = db.session.get_bind().dialect.name
+        db.session.execute(_bump_statement(dialect), [{'name': name, 'version': 1} for name in sorted(set(names))])
+    if has_app_context():
+        g.pop('cache_versions', None)
+
+
+def all_classes():
+    current = versions()
+    return reference_cache.get(('classes',), current.get('classes', 0), lambda: [
+        ClassRef(class_obj.id, class_obj.name) for class_obj in Class.query.all()
+    ])
+
+
+def subjects_with_class():
+    current = versions()
+    version = (current.get('classes', 0), current.get('subjects', 0))
+
+    def load():
+        return [
+            SubjectRef(subject_id, name, class_id, ClassRef(class_id, class_name))
+            for subject_id, name, class_id, class_name in db.session.query(
+                Subject.id, Subject.name, Subject.class_id, Class.name
+            ).join(Class, Subject.class_id == Class.id)
+        ]
+
+    return reference_cache.get(('subjects',), version, load)
+
+
+def load_teacher(teacher_id):
+    """Cached ``CachedUser`` for a teacher id, or None if there is no such teacher."""
+    def load():
+        teacher = db.session.get(Teacher, teacher_id)
+        return CachedUser(teacher) if teacher else None
+
+    return reference_cache.get(('teacher', teacher_id), versions().get('teachers', 0), load)
@@ -0,0 +1,198 @@
+"""Incrementally maintained attendance counters.
+
+``AttendanceSummary`` holds present/marked counts per (student, subject) and
+``LectureCount`` the number of distinct lecture dates per (class, subject), so
+report percentages are O(subjects) lookups instead of scans over Attendance.
+Every write path in attendance.py updates them in the same transaction as the
+marks; ``rebuild`` recomputes them from scratch and reports any drift.
+Marks moved to the archive (archive.py) stay counted.
+"""
+from collections import Counter
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, Student, Attendance, AttendanceSummary, LectureCount
+from archive import archived_summary
+
+
+_upsert_statements = {}
+
+
+def _upsert_statement(model, dialect, key_columns, value_columns):
+    cache_key = (model, dialect, tuple(key_columns), tuple(value_columns))
+    stmt = _upsert_statements.get(cache_key)
+    if stmt is None:
+        table = model.__table__
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={column: table.c[column] + stmt.excluded[column] for column in value_columns}
+        )
+        _upsert_statements[cache_key] = stmt
+    return stmt
+
+
+def _upsert_add(model, key_columns, deltas):
+    """Add ``deltas`` ({key tuple: {column: delta}}) to ``model`` rows, creating missing ones."""
+    if not deltas:
+        return
+    rows = [dict(zip(key_columns, key), **values) for key, values in deltas.items()]
+    value_columns = [column for column in rows[0] if column not in key_columns]
+    dialect = db.session.get_bind().dialect.name
+    db.session.execute(_upsert_statement(model, dialect, key_columns, value_columns), rows)
+
+
+def _lecture_rows(class_id, subject_id, date):
+    return db.session.query(Attendance.id).filter_by(
+        class_id=class_id, subject_id=subject_id, date=date
+    ).count()
+
+
+def _apply(rows, sign):
+    summary = {}
+    lectures = Counter()
+    for row in rows:
+        key = (int(row['student_id']), int(row['subject_id']))
+        deltas = summary.setdefault(key, {'present': 0, 'marked': 0})
+        deltas['marked'] += sign
+        if row['status'] == 'Present':
+            deltas['present'] += sign
+        lectures[(int(row['class_id']), int(row['subject_id']), row['date'])] += 1
+
+    _upsert_add(AttendanceSummary, ['student_id', 'subject_id'], summary)
+
+    # After an insert a lecture is new when every row it has came from this
+    # write; after a delete it is gone when none are left.
+    lecture_deltas = Counter()
+    for (class_id, subject_id, date), count in lectures.items():
+        remaining = _lecture_rows(class_id, subject_id, date)
+        if (sign > 0 and remaining == count) or (sign < 0 and remaining == 0):
+            lecture_deltas[(class_id, subject_id)] += sign
+    _upsert_add(LectureCount, ['class_id', 'subject_id'],
+                {key: {'total': delta} for key, delta in lecture_deltas.items() if delta})
+
+
+def record_marks(rows):
+    """Count attendance mappings that were just inserted."""
+    _apply(rows, 1)
+
+
+def forget_marks(rows):
+    """Uncount attendance mappings that were just deleted."""
+    _apply(rows, -1)
+
+
+def record_status_change(student_id, subject_id, old_status, new_status):
+    """Adjust the present count after a mark's status was edited."""
+    delta = (new_status == 'Present') - (old_status == 'Present')
+    if delta:
+        _upsert_add(AttendanceSummary, ['student_id', 'subject_id'],
+                    {(student_id, subject_id): {'present': delta, 'marked': 0}})
+
+
+def refresh_lecture_counts(class_id):
+    """Recount lecture dates for every subject of a class, e.g. after deleting a student."""
+    LectureCount.query.filter_by(class_id=class_id).delete()
+    totals = {subject_id: total for (_, subject_id), total in archived_summary(class_id)[1].items()}
+    for subject_id, total in (
+        db.session.query(Attendance.subject_id, db.func.count(db.distinct(Attendance.date)))
+        .filter(Attendance.class_id == class_id)
+        .group_by(Attendance.subject_id)
+    ):
+        totals[subject_id] = totals.get(subject_id, 0) + total
+    for subject_id, total in totals.items():
+        db.session.add(LectureCount(class_id=class_id, subject_id=subject_id, total=total))
+
+
+def lecture_totals(class_id):
+    """``{subject_id: total lectures}`` for a class."""
+    return dict(db.session.query(LectureCount.subject_id, LectureCount.total).filter_by(class_id=class_id))
+
+
+def present_counts(student_id):
+    """``{subject_id: present count}`` for one student."""
+    return dict(
+        db.session.query(AttendanceSummary.subject_id, AttendanceSummary.present).filter_by(student_id=student_id)
+    )
+
+
+def class_present_counts(class_id):
+    """``{student_id: {subject_id: present count}}`` for every student of a class."""
+    present = {}
+    for student_id, subject_id, count in (
+        db.session.query(AttendanceSummary.student_id, AttendanceSummary.subject_id, AttendanceSummary.present)
+        .join(Student, AttendanceSummary.student_id == Student.id)
+        .filter(Student.class_id == class_id)
+    ):
+        present.setdefault(student_id, {})[subject_id] = count
+    return present
+
+
+def _computed():
+    summary = {
+        (student_id, subject_id): (present or 0, marked)
+        for student_id, subject_id, present, marked in db.session.query(
+            Attendance.student_id,
+            Attendance.subject_id,
+            db.func.sum(db.case((Attendance.status == 'Present', 1), else_=0)),
+            db.func.count(Attendance.id)
+        ).group_by(Attendance.student_id, Attendance.subject_id)
+    }
+    lectures = dict(
+        ((class_id, subject_id), total)
+        for class_id, subject_id, total in db.session.query(
+            Attendance.class_id, Attendance.subject_id, db.func.count(db.distinct(Attendance.date))
+        ).group_by(Attendance.class_id, Attendance.subject_id)
+    )
+
+    archived, archived_lectures = archived_summary()
+    for key, (present, marked) in archived.items():
+        live_present, live_marked = summary.get(key, (0, 0))
+        summary[key] = (live_present + present, live_marked + marked)
+    for key, total in archived_lectures.items():
+        lectures[key] = lectures.get(key, 0) + total
+    return summary, lectures
+
+
+def _drift(expected, stored, label):
+    drift = []
+    for key in sorted(expected.keys() | stored.keys()):
+        want, have = expected.get(key), stored.get(key)
+        if want != have:
+            drift.append(f'{label} {key}: stored {have}, expected {want}')
+    return drift
+
+
+def verify():
+    """Compare the stored counters with a full recount. Returns drift descriptions."""
+    summary, lectures = _computed()
+    stored_summary = {
+        (row.student_id, row.subject_id): (row.present, row.marked)
+        for row in AttendanceSummary.query
+        if row.present or row.marked
+    }
+    stored_lectures = {(row.class_id, row.subject_id): row.total for row in LectureCount.query if row.total}
+    return (_drift(summary, stored_summary, 'summary (student, subject)')
+            + _drift(lectures, stored_lectures, 'lectures (class, subject)'))
+
+
+def rebuild():
+    """Recompute every counter from Attendance and commit. Returns the drift that was fixed."""
+    drift = verify()
+    summary, lectures = _computed()
+
+    AttendanceSummary.query.delete()
+    LectureCount.query.delete()
+    if summary:
+        db.session.execute(AttendanceSummary.__table__.insert(), [
+            {'student_id': student_id, 'subject_id': subject_id, 'present': present, 'marked': marked}
+            for (student_id, subject_id), (present, marked) in summary.items()
+        ])
+    if lectures:
+        db.session.execute(LectureCount.__table__.insert(), [
+            {'class_id': class_id, 'subject_id': subject_id, 'total': total}
+            for (class_id, subject_id), total in lectures.items()
+        ])
+    db.session.commit()
+    return drift
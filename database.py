@@ -0,0 +1,116 @@
+"""Engine options, SQLite connection tuning and read-replica routing.
+
+``DATABASE_URL`` selects the primary database. When ``DATABASE_REPLICA_URL``
+is set as well it becomes the ``replica`` bind, and views wrapped in
+``use_replica`` run their reads there through ``RoutingSession``; anything
+that writes still goes to the primary. A replica is kept up to date by the
+database's own replication; for a local SQLite setup ``sync_replica`` copies
+the primary file over it (``flask --app app sync-replica``).
+"""
+import os
+import sqlite3
+from functools import wraps
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+SQLITE_BUSY_TIMEOUT_MS = 30000
+REPLICA_BIND = 'replica'
+POOL_SIZE = 10
+MAX_OVERFLOW = 20
+
+# Engine options for a file-backed SQLite database shared by several web
+# workers/threads. Writers still serialize, but WAL lets readers run alongside
+# the writer and the busy timeout makes a second writer wait instead of failing
+# with "database is locked".
+SQLITE_ENGINE_OPTIONS = {
+    'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000, 'check_same_thread': False},
+    'pool_size': POOL_SIZE,
+    'max_overflow': MAX_OVERFLOW,
+    'pool_timeout': 30,
+    'pool_recycle': 3600,
+}
+
+
+def engine_options(database_uri, pool_size=None, max_overflow=None, pre_ping=False, statement_timeout_ms=None):
+    """SQLALCHEMY_ENGINE_OPTIONS suited to ``database_uri``.
+
+    ``pre_ping`` tests each pooled connection before use, for servers that
+    drop idle connections. ``statement_timeout_ms`` is set on PostgreSQL and
+    MySQL connections; SQLite has no statement timeout, only the busy timeout.
+    """
+    if database_uri.startswith('sqlite'):
+        if database_uri in ('sqlite://', 'sqlite:///:memory:'):
+            return {}
+        options = dict(SQLITE_ENGINE_OPTIONS)
+    else:
+        options = {'pool_size': POOL_SIZE, 'max_overflow': MAX_OVERFLOW, 'pool_timeout': 30, 'pool_recycle': 1800}
+        backend = make_url(database_uri).get_backend_name()
+        if statement_timeout_ms and backend == 'postgresql':
+            options['connect_args'] = {'options': f'-c statement_timeout={int(statement_timeout_ms)}'}
+        elif statement_timeout_ms and backend in ('mysql', 'mariadb'):
+            options['connect_args'] = {'init_command': f'SET SESSION max_execution_time={int(statement_timeout_ms)}'}
+    if pool_size:
+        options['pool_size'] = pool_size
+    if max_overflow is not None:
+        options['max_overflow'] = max_overflow
+    if pre_ping:
+        options['pool_pre_ping'] = True
+    return options
+
+
+@event.listens_for(Engine, 'connect')
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+    cursor.close()
+
+
+class RoutingSession(Session):
+    """``db.session`` that sends the reads of ``use_replica`` views to the replica bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and not getattr(clause, 'is_dml', False)
+                and has_app_context() and g.get('use_replica')):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def use_replica(view):
+    """Read from the replica bind, if one is configured, for the rest of the request."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        g.use_replica = True
+        return view(*args, **kwargs)
+    return wrapped
+
+
+def sync_replica(primary_uri, replica_uri):
+    """Copy a SQLite primary over a SQLite replica with the online backup API. Returns the pages copied.
+
+    Pass the engines' URLs (``db.engine.url``), which Flask-SQLAlchemy has
+    already resolved into the instance folder; a relative path here would be
+    taken from the working directory. Raises ``ValueError`` if the primary
+    file does not exist, rather than backing up a new empty one.
+    """
+    primary, replica = make_url(primary_uri), make_url(replica_uri)
+    if primary.get_backend_name() != 'sqlite' or replica.get_backend_name() != 'sqlite':
+        raise ValueError('Only SQLite files can be synced here; other databases replicate on their own.')
+    if not primary.database or primary.database == ':memory:' or not os.path.isfile(primary.database):
+        raise ValueError(f'The primary database file {primary.database or ":memory:"} does not exist.')
+    source = sqlite3.connect(primary.database)
+    target = sqlite3.connect(replica.database, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+    try:
+        source.backup(target)
+        return target.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        target.close()
+        source.close()
@@ -0,0 +1,166 @@
+import csv
+import heapq
+import io
+import os
+import tempfile
+
+import openpyxl
+from flask import Response, stream_with_context
+from werkzeug.wsgi import ClosingIterator
+
+from models import db, Class, Subject, Student, Attendance
+from archive import archived_terms, archived_export_rows, archived_row_count
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+ATTENDANCE_HEADERS = ['Roll No', 'Student Name', 'Class', 'Subject', 'Date', 'Status']
+EXPORT_CHUNK_SIZE = 2000
+STREAM_BLOCK_SIZE = 64 * 1024
+CSV_BLOCK_ROWS = 1000
+
+
+def attendance_export_rows(class_id, subject_id=None, student_id=None, start_date=None, end_date=None,
+                           chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield spreadsheet rows for the attendance export, ``chunk_size`` at a time.
+
+    Selects the joined student, class and subject columns directly so no ORM
+    objects (and no lazy loads) are created per record. Without a
+    ``subject_id`` every subject of the class is exported, one after another.
+    Marks from archived terms are merged in date order.
+    """
+    rows = _live_export_rows(class_id, subject_id, student_id, start_date, end_date, chunk_size)
+    if archived_terms(start_date, end_date):
+        archived = archived_export_rows(class_id, subject_id, student_id, start_date, end_date)
+        rows = heapq.merge(archived, rows, key=lambda item: (item[0], item[1][4], item[1][0]))
+    for _, row in rows:
+        yield row
+
+
+def _live_export_rows(class_id, subject_id, student_id, start_date, end_date, chunk_size):
+    stmt = (
+        db.select(Attendance.subject_id, Student.roll_number, Student.name, Class.name, Subject.name,
+                  Attendance.date, Attendance.status)
+        .select_from(Attendance)
+        .join(Student, Attendance.student_id == Student.id)
+        .join(Class, Attendance.class_id == Class.id)
+        .join(Subject, Attendance.subject_id == Subject.id)
+        .where(*_export_filters(class_id, subject_id, student_id, start_date, end_date))
+        .order_by(Attendance.subject_id, Attendance.date, Student.roll_number)
+    )
+
+    result = db.session.execute(stmt.execution_options(yield_per=chunk_size))
+    for partition in result.partitions():
+        for row_subject, roll_number, name, class_name, subject_name, date, status in partition:
+            yield row_subject, [roll_number, name, class_name, subject_name, date.strftime('%Y-%m-%d'), status]
+
+
+def attendance_export_count(class_ids, subject_id=None, start_date=None, end_date=None):
+    """Number of rows ``attendance_export_rows`` yields for all of ``class_ids``."""
+    live = db.session.query(db.func.count(Attendance.id)).filter(
+        Attendance.class_id.in_(class_ids),
+        *_export_filters(None, subject_id, None, start_date, end_date)
+    ).scalar()
+    return live + archived_row_count(class_ids, subject_id, start_date, end_date)
+
+
+def _export_filters(class_id, subject_id, student_id, start_date, end_date):
+    filters = []
+    if class_id:
+        filters.append(Attendance.class_id == class_id)
+    if subject_id:
+        filters.append(Attendance.subject_id == subject_id)
+    if student_id:
+        filters.append(Attendance.student_id == student_id)
+    if start_date:
+        filters.append(Attendance.date >= start_date)
+    if end_date:
+        filters.append(Attendance.date <= end_date)
+    return filters
+
+
+def sheet_title(name, used=()):
+    """A valid, unused worksheet title for ``name`` (at most 31 characters, no ``[]:*?/\\``)."""
+    base = ''.join('_' if char in '[]:*?/\\' else char for char in name)[:31] or 'Sheet'
+    title, suffix = base, 1
+    while title in used:
+        suffix += 1
+        title = f'{base[:31 - len(str(suffix)) - 1]}~{suffix}'
+    return title
+
+
+def write_xlsx_sheets(path, sheets):
+    """Write ``(title, headers, rows)`` triples to ``path``, one write-only worksheet each.
+
+    openpyxl flushes write-only rows to disk as they are appended, so memory
+    stays flat however many rows there are.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    for title, headers, rows in sheets:
+        ws = wb.create_sheet(title)
+        ws.append(headers)
+        for row in rows:
+            ws.append(row)
+    wb.save(path)
+
+
+def write_xlsx(path, title, headers, rows):
+    """Write ``rows`` to ``path`` as a single-sheet workbook."""
+    write_xlsx_sheets(path, [(title, headers, rows)])
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _stream_file(path):
+    with open(path, 'rb') as fh:
+        while True:
+            block = fh.read(STREAM_BLOCK_SIZE)
+            if not block:
+                break
+            yield block
+
+
+def xlsx_response(title, headers, rows, download_name):
+    """Build a workbook in a temporary file and stream it back in blocks.
+
+    The file is removed when the body is closed, which the WSGI server does
+    whether it was sent in full, cut short by the client or never sent at
+    all (HEAD).
+    """
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        write_xlsx(path, title, headers, rows)
+        # direct_passthrough hands the body to the server as is, so the
+        # cleanup rides on the body's close(); Response.close() calls it too.
+        body = ClosingIterator(_stream_file(path), lambda: _remove(path))
+        response = Response(body, mimetype=XLSX_MIMETYPE, direct_passthrough=True)
+        response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+        response.headers['Content-Length'] = os.path.getsize(path)
+    except Exception:
+        _remove(path)
+        raise
+    return response
+
+
+def _csv_blocks(headers, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % CSV_BLOCK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def csv_response(headers, rows, download_name):
+    """Stream ``rows`` as CSV while they are read, ``CSV_BLOCK_ROWS`` at a time."""
+    response = Response(stream_with_context(_csv_blocks(headers, rows)), mimetype='text/csv')
+    response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+    return response
@@ -0,0 +1,214 @@
+"""Background Excel export jobs.
+
+Jobs are rows in the ``export_job`` table, so any web worker can report a
+job's progress or serve its file. Each process runs the jobs it accepted on a
+small thread pool (``EXPORT_WORKERS`` threads); the workbook is written
+through the streaming helpers in exports.py, so a term-wide export needs no
+more memory than a single-subject one. Submissions are refused once a teacher
+has ``MAX_ACTIVE_JOBS_PER_TEACHER`` or the institution ``MAX_ACTIVE_JOBS``
+jobs waiting or running. Finished files are removed after
+``EXPORT_TTL_SECONDS`` by ``cleanup_expired``, which runs on every submission
+and via ``flask --app app cleanup-exports``.
+"""
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from models import db, Class, ExportJob
+from exports import ATTENDANCE_HEADERS, attendance_export_rows, attendance_export_count, sheet_title, \
+    write_xlsx_sheets
+
+JOB_KINDS = {
+    'class_subject': 'Class and subject',
+    'classes': 'Several classes',
+    'term': 'Whole term',
+}
+ACTIVE_STATUSES = ('queued', 'running')
+EXPORT_WORKERS = 2
+MAX_ACTIVE_JOBS = 20
+MAX_ACTIVE_JOBS_PER_TEACHER = 3
+EXPORT_TTL_SECONDS = 24 * 3600
+# A job whose progress has not moved for this long belongs to a process that
+# went away; it is marked failed so it no longer counts against the limits.
+EXPORT_STALE_SECONDS = 3600
+PROGRESS_EVERY = 2000
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class JobRejected(Exception):
+    """The export queue or the teacher's share of it is full."""
+
+
+def export_dir():
+    return current_app.config.get('EXPORT_DIR') or os.path.join(current_app.instance_path, 'exports')
+
+
+def export_path(job_id):
+    return os.path.join(export_dir(), f'{job_id}.xlsx')
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=current_app.config.get('EXPORT_WORKERS', EXPORT_WORKERS),
+                                           thread_name_prefix='export')
+        return _executor
+
+
+def _update(job_id, **values):
+    # Own connection and transaction, so progress is visible to other workers
+    # while the job's export query is still streaming rows.
+    values['updated_at'] = datetime.utcnow()
+    with db.engine.begin() as conn:
+        conn.execute(db.update(ExportJob).where(ExportJob.id == job_id).values(**values))
+
+
+def _date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+
+def _class_ids(kind, params):
+    if kind == 'term':
+        return [row[0] for row in db.session.query(Class.id).order_by(Class.name)]
+    return [int(class_id) for class_id in params['class_ids']]
+
+
+def _sheets(kind, params, class_ids, on_row):
+    start_date, end_date = _date(params.get('start_date')), _date(params.get('end_date'))
+
+    def counted(rows):
+        for row in rows:
+            on_row()
+            yield row
+
+    if kind == 'class_subject':
+        rows = attendance_export_rows(class_ids[0], params['subject_id'], start_date=start_date, end_date=end_date)
+        yield 'Attendance Report', ATTENDANCE_HEADERS, counted(rows)
+        return
+
+    names = dict(db.session.query(Class.id, Class.name).filter(Class.id.in_(class_ids)))
+    used = set()
+    for class_id in class_ids:
+        if class_id not in names:
+            continue
+        title = sheet_title(names[class_id], used)
+        used.add(title)
+        rows = attendance_export_rows(class_id, start_date=start_date, end_date=end_date)
+        yield title, ATTENDANCE_HEADERS, counted(rows)
+
+
+def run_job(app, job_id):
+    """Build the workbook for one job; runs on a pool thread."""
+    with app.app_context():
+        job = db.session.get(ExportJob, job_id)
+        if job is None:
+            return
+        params = json.loads(job.params)
+        path = export_path(job_id)
+        partial = path + '.part'
+        try:
+            class_ids = _class_ids(job.kind, params)
+            total = attendance_export_count(class_ids, params.get('subject_id'),
+                                            _date(params.get('start_date')), _date(params.get('end_date')))
+            _update(job_id, status='running', total=total)
+
+            done = [0]
+
+            def on_row():
+                done[0] += 1
+                if done[0] % PROGRESS_EVERY == 0:
+                    _update(job_id, progress=done[0])
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_xlsx_sheets(partial, _sheets(job.kind, params, class_ids, on_row))
+            os.replace(partial, path)
+            _update(job_id, status='done', progress=done[0], finished_at=datetime.utcnow())
+        except Exception as exc:
+            app.logger.exception('Export job %s failed', job_id)
+            if os.path.exists(partial):
+                os.remove(partial)
+            _update(job_id, status='failed', error=str(exc) or exc.__class__.__name__,
+                    finished_at=datetime.utcnow())
+
+
+def submit(teacher_id, kind, params, filename):
+    """Queue an export and return its ``ExportJob``.
+
+    ``params`` holds ``class_ids`` (not needed for ``term``), an optional
+    ``subject_id`` for ``class_subject`` and optional ISO ``start_date`` /
+    ``end_date``. Raises ``JobRejected`` when the queue limits are reached.
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f'Unknown export type {kind!r}')
+    cleanup_expired()
+
+    active = ExportJob.query.filter(ExportJob.status.in_(ACTIVE_STATUSES))
+    if active.count() >= current_app.config.get('MAX_ACTIVE_EXPORT_JOBS', MAX_ACTIVE_JOBS):
+        raise JobRejected('The export queue is full. Please try again in a few minutes.')
+    if active.filter(ExportJob.teacher_id == teacher_id).count() >= MAX_ACTIVE_JOBS_PER_TEACHER:
+        raise JobRejected(f'You already have {MAX_ACTIVE_JOBS_PER_TEACHER} exports in progress.')
+
+    job = ExportJob(id=uuid.uuid4().hex, teacher_id=teacher_id, kind=kind, params=json.dumps(params),
+                    filename=filename)
+    db.session.add(job)
+    db.session.commit()
+    _pool().submit(run_job, current_app._get_current_object(), job.id)
+    return job
+
+
+def cleanup_expired(now=None):
+    """Fail stale jobs and delete expired jobs with their files. Returns the number of jobs deleted."""
+    now = now or datetime.utcnow()
+    ExportJob.query.filter(
+        ExportJob.status.in_(ACTIVE_STATUSES),
+        ExportJob.updated_at < now - timedelta(seconds=EXPORT_STALE_SECONDS)
+    ).update({ExportJob.status: 'failed', ExportJob.error: 'Interrupted', ExportJob.finished_at: now},
+             synchronize_session=False)
+
+    expired = [row[0] for row in db.session.query(ExportJob.id).filter(
+        ExportJob.finished_at < now - timedelta(seconds=EXPORT_TTL_SECONDS)
+    )]
+    if expired:
+        ExportJob.query.filter(ExportJob.id.in_(expired)).delete(synchronize_session=False)
+    db.session.commit()
+
+    # Besides the expired jobs' files, sweep files whose job row is gone
+    # (e.g. the teacher was deleted). Listing before reading the ids means a
+    # job submitted meanwhile always has its row counted.
+    directory = export_dir()
+    if os.path.isdir(directory):
+        names = os.listdir(directory)
+        live = {row[0] for row in db.session.query(ExportJob.id)}
+        for name in names:
+            job_id = name.split('.', 1)[0]
+            if job_id not in live:
+                os.remove(os.path.join(directory, name))
+    return len(expired)
+
+
+def job_json(job):
+    params = json.loads(job.params)
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'kind_label': JOB_KINDS.get(job.kind, job.kind),
+        'status': job.status,
+        'progress': job.progress,
+        'total': job.total,
+        'percent': 100 if job.status == 'done' else (job.progress * 100 // job.total if job.total else 0),
+        'start_date': params.get('start_date'),
+        'end_date': params.get('end_date'),
+        'class_count': len(params.get('class_ids', [])),
+        'subject_id': params.get('subject_id'),
+        'filename': job.filename,
+        'error': job.error,
+        'created_at': job.created_at.strftime('%Y-%m-%d %H:%M'),
+    }
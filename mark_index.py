@@ -0,0 +1,222 @@
+"""In-memory attendance index of packed bit matrices.
+
+With ``ATTENDANCE_INDEX`` enabled, each (class, subject) is held as two bit
+matrices of students x lecture dates, "marked" and "present", packed eight
+dates to a byte: two bits per mark instead of an Attendance row. A matrix is
+loaded the first time it is needed (live and archived marks alike) and
+/reports and /student_report then count attendance with a popcount over
+the bits (``np.bitwise_count``, hence NumPy 2.0 or later) rather than with
+SQL.
+
+Matrices are stored in ``mark_index`` under the ``report:`` and ``roster:``
+cache versions of their class and subject (see report_cache.py), so a write
+from any process makes the next lookup reload. Lectures recorded through
+``attendance.mark_session`` are applied to this process's copy in place of
+a reload. Matrices are never modified once stored; a write stores a new one.
+"""
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import type_coerce
+
+from models import db, Student, Subject, Attendance, CacheVersion
+from cache import VersionedCache
+from report_cache import StudentRef
+from archive import archived_marks
+
+INDEX_MAX_ENTRIES = 4096
+INDEX_MAX_BYTES = 256 * 1024 * 1024
+INDEX_TTL_SECONDS = 24 * 3600
+
+
+class MarkBitmap:
+    """Marks of one class and subject as packed ``students x dates`` bit rows."""
+
+    def __init__(self, students, dates, marked, present):
+        self.students = students
+        self.dates = dates
+        self.marked = marked
+        self.present = present
+        self.rows = {student.id: index for index, student in enumerate(students)}
+
+    @property
+    def marks(self):
+        return int(np.bitwise_count(self.marked).sum())
+
+    @property
+    def nbytes(self):
+        return self.marked.nbytes + self.present.nbytes
+
+    def columns(self, start_date=None, end_date=None):
+        """``(first, stop)`` column range of the dates within ``start_date..end_date``."""
+        first = bisect_left(self.dates, start_date) if start_date else 0
+        stop = bisect_right(self.dates, end_date) if end_date else len(self.dates)
+        return first, max(first, stop)
+
+    def _mask(self, first, stop):
+        bits = np.zeros(self.marked.shape[1] * 8, dtype=bool)
+        bits[first:stop] = True
+        return np.packbits(bits)
+
+    def present_counts(self, first=0, stop=None):
+        """Present marks per student within columns ``first..stop``."""
+        stop = len(self.dates) if stop is None else stop
+        if first == 0 and stop == len(self.dates):
+            return np.bitwise_count(self.present).sum(axis=1, dtype=np.int64)
+        return np.bitwise_count(self.present & self._mask(first, stop)).sum(axis=1, dtype=np.int64)
+
+    def with_lecture(self, day, statuses):
+        """A copy with the ``{student_id: status}`` marks of one lecture on ``day`` added."""
+        column = bisect_left(self.dates, day)
+        marked, present = self.marked, self.present
+        if column < len(self.dates) and self.dates[column] == day:
+            marked, present = marked.copy(), present.copy()
+            dates = self.dates
+        elif column == len(self.dates) and column // 8 < marked.shape[1]:
+            marked, present = marked.copy(), present.copy()
+            dates = self.dates + [day]
+        elif column == len(self.dates):
+            padding = np.zeros((len(self.students), 1), dtype=np.uint8)
+            marked, present = np.hstack([marked, padding]), np.hstack([present, padding])
+            dates = self.dates + [day]
+        else:
+            # A lecture dated before the last one shifts every later column.
+            count = len(self.dates)
+            marked = np.packbits(np.insert(np.unpackbits(marked, axis=1, count=count), column, 0, axis=1), axis=1)
+            present = np.packbits(np.insert(np.unpackbits(present, axis=1, count=count), column, 0, axis=1), axis=1)
+            dates = self.dates[:column] + [day] + self.dates[column:]
+
+        bit = np.uint8(0x80 >> (column % 8))
+        for student_id, status in statuses.items():
+            row = self.rows.get(int(student_id))
+            if row is None or not status:
+                continue
+            marked[row, column // 8] |= bit
+            if status == 'Present':
+                present[row, column // 8] |= bit
+            else:
+                present[row, column // 8] &= ~bit
+        return MarkBitmap(self.students, dates, marked, present)
+
+
+mark_index = VersionedCache(max_entries=INDEX_MAX_ENTRIES, ttl=INDEX_TTL_SECONDS, max_bytes=INDEX_MAX_BYTES)
+
+
+def index_enabled():
+    return bool(current_app.config.get('ATTENDANCE_INDEX'))
+
+
+def load_bitmap(class_id, subject_id):
+    """Read every mark of one class and subject into a ``MarkBitmap``."""
+    students = [
+        StudentRef(*row) for row in db.session.query(Student.id, Student.name, Student.roll_number, Student.class_id)
+        .filter(Student.class_id == class_id).order_by(Student.roll_number)
+    ]
+    rows = {student.id: index for index, student in enumerate(students)}
+
+    # Dates stay as their stored text until the distinct set is known.
+    raw_date = type_coerce(Attendance.date, db.String)
+    marks = db.session.connection().execute(
+        db.select(Attendance.student_id, raw_date, Attendance.status == 'Present')
+        .where(Attendance.class_id == class_id, Attendance.subject_id == subject_id)
+    ).all()
+    live = {raw: date.fromisoformat(str(raw)[:10]) for raw in {mark[1] for mark in marks}}
+    archived = archived_marks(class_id, subject_id)
+    dates = sorted(set(live.values()) | {day for _, day, _ in archived})
+    columns = {day: index for index, day in enumerate(dates)}
+
+    marked = np.zeros((len(students), len(dates)), dtype=bool)
+    present = np.zeros_like(marked)
+    for student_id, day, is_present in marks:
+        row = rows.get(student_id)
+        if row is not None:
+            marked[row, columns[live[day]]] = True
+            present[row, columns[live[day]]] = is_present
+    for student_id, day, status in archived:
+        row = rows.get(student_id)
+        if row is not None:
+            marked[row, columns[day]] = True
+            present[row, columns[day]] = status == 'Present'
+    return MarkBitmap(students, dates, np.packbits(marked, axis=1), np.packbits(present, axis=1))
+
+
+def _versions(class_id, subject_ids):
+    """``{subject_id: (report version, roster version)}`` for subjects of one class, in one query."""
+    names = {f'report:{class_id}:{subject_id}': subject_id for subject_id in subject_ids}
+    roster = f'roster:{class_id}'
+    current = dict(db.session.query(CacheVersion.name, CacheVersion.version).filter(
+        CacheVersion.name.in_(list(names) + [roster])
+    ))
+    return {subject_id: (current.get(name, 0), current.get(roster, 0)) for name, subject_id in names.items()}
+
+
+def bitmap(class_id, subject_id, version=None):
+    """The ``MarkBitmap`` of a class and subject, loading it on first use.
+
+    ``version`` is the ``(report, roster)`` version pair when the caller
+    already has it (``report_cache.report_version`` starts with it).
+    """
+    if version is None:
+        version = _versions(class_id, [subject_id])[subject_id]
+    key = (int(class_id), int(subject_id))
+    value = mark_index.lookup(key, version)
+    if value is None:
+        value = load_bitmap(*key)
+        mark_index.store(key, version, value, value.nbytes)
+    return value
+
+
+def indexed_report(class_id, subject_id, start_date=None, end_date=None, version=None):
+    """``report_cache.class_report_snapshot`` computed from the index."""
+    index = bitmap(class_id, subject_id, version)
+    first, stop = index.columns(start_date, end_date)
+    dates = index.dates[first:stop]
+    present_counts = index.present_counts(first, stop).tolist()
+    marked = np.unpackbits(index.marked, axis=1, count=len(index.dates))[:, first:stop].astype(bool)
+    present = np.unpackbits(index.present, axis=1, count=len(index.dates))[:, first:stop].astype(bool)
+    statuses = np.where(marked, np.where(present, 'Present', 'Absent'), '-')
+
+    total_days = len(dates)
+    report_data = []
+    for student, present_count, status_list in zip(index.students, present_counts, statuses.tolist()):
+        percentage = (present_count / total_days * 100) if total_days > 0 else 0
+        report_data.append({
+            'student': student,
+            'present': present_count,
+            'total': total_days,
+            'percentage': round(percentage, 2),
+            'status_list': status_list
+        })
+    return dates, report_data
+
+
+def student_counts(student):
+    """``(totals, present)`` per subject for one student, as ``reports.student_summary`` takes them."""
+    subject_ids = [row[0] for row in db.session.query(Subject.id).filter_by(class_id=student.class_id)]
+    totals, present = {}, {}
+    for subject_id, version in _versions(student.class_id, subject_ids).items():
+        index = bitmap(student.class_id, subject_id, version)
+        totals[subject_id] = len(index.dates)
+        row = index.rows.get(student.id)
+        if row is not None:
+            present[subject_id] = int(np.bitwise_count(index.present[row]).sum())
+    return totals, present
+
+
+def lecture_recorded(class_id, subject_id, day, statuses):
+    """Apply a just-committed lecture to the index instead of reloading it.
+
+    The commit bumped the report version by one, so the matrix is only
+    updated if it was current just before; otherwise the next lookup
+    reloads it.
+    """
+    if not index_enabled():
+        return
+    key = (int(class_id), int(subject_id))
+    report, roster = _versions(key[0], [key[1]])[key[1]]
+    value = mark_index.lookup(key, (report - 1, roster))
+    if value is not None:
+        value = value.with_lecture(day, statuses)
+        mark_index.store(key, (report, roster), value, value.nbytes)
@@ -0,0 +1,104 @@
+"""In-place schema upgrades for existing ``attendance.db`` files.
+
+``db.create_all()`` only creates missing tables, so a database created before an
+index or constraint was declared in models.py never receives it. Every step here
+is idempotent; it runs on startup and via ``flask --app app upgrade-db``.
+"""
+from sqlalchemy import inspect, text
+
+from models import db, Student, Attendance, LectureCount, SyncChange
+from counters import rebuild as rebuild_counters
+from sync import SYNC_CLOCK
+import search
+
+ATTENDANCE_UNIQUE = '_student_subject_date_uc'
+
+
+def _existing_indexes(inspector, table):
+    names = {index['name'] for index in inspector.get_indexes(table)}
+    names.update(uc['name'] for uc in inspector.get_unique_constraints(table) if uc['name'])
+    return names
+
+
+def archive_duplicate_attendance(conn):
+    """Move duplicate (student, subject, date) marks into ``attendance_duplicates``.
+
+    The newest row of each group (highest id) stays in ``attendance``; that is
+    the mark the reports already displayed. Nothing is deleted outright, so the
+    archived rows can be inspected or restored by hand. Returns the number of
+    rows moved.
+    """
+    duplicates = (
+        'id NOT IN (SELECT MAX(id) FROM attendance GROUP BY student_id, subject_id, date)'
+    )
+    conn.execute(text('CREATE TABLE IF NOT EXISTS attendance_duplicates AS SELECT * FROM attendance WHERE 1 = 0'))
+    conn.execute(text(f'INSERT INTO attendance_duplicates SELECT * FROM attendance WHERE {duplicates}'))
+    return conn.execute(text(f'DELETE FROM attendance WHERE {duplicates}')).rowcount
+
+
+def upgrade():
+    """Apply the indexes and the Attendance unique constraint to an existing database.
+
+    Returns a list of human readable descriptions of the steps that ran.
+    """
+    inspector = inspect(db.engine)
+    if not inspector.has_table(Attendance.__tablename__):
+        return []
+
+    existing = _existing_indexes(inspector, Attendance.__tablename__)
+    applied = []
+
+    with db.engine.begin() as conn:
+        if ATTENDANCE_UNIQUE not in existing:
+            moved = archive_duplicate_attendance(conn)
+            if moved:
+                applied.append(f'moved {moved} duplicate attendance rows to attendance_duplicates')
+            # SQLite cannot add a table constraint in place; a unique index
+            # enforces the same rule under the same name.
+            conn.execute(text(
+                f'CREATE UNIQUE INDEX {ATTENDANCE_UNIQUE} ON attendance (student_id, subject_id, date)'
+            ))
+            applied.append(f'created unique index {ATTENDANCE_UNIQUE}')
+
+        for index in Attendance.__table__.indexes:
+            if index.name not in existing:
+                index.create(conn)
+                applied.append(f'created index {index.name}')
+
+        existing_student = _existing_indexes(inspector, Student.__tablename__)
+        for index in Student.__table__.indexes:
+            if index.name not in existing_student:
+                index.create(conn)
+                applied.append(f'created index {index.name}')
+
+        if (db.engine.dialect.name == 'sqlite' and not inspector.has_table(search.SEARCH_TABLE)
+                and search.trigram_supported(conn)):
+            search.install(conn)
+            applied.append(f'built student search index {search.SEARCH_TABLE}')
+
+        if inspector.has_table(SyncChange.__tablename__):
+            columns = {column['name'] for column in inspector.get_columns(SyncChange.__tablename__)}
+            if 'version' not in columns:
+                # Versions used to be the row ids; clients keep their cursors.
+                conn.execute(text('ALTER TABLE sync_change ADD COLUMN version INTEGER NOT NULL DEFAULT 0'))
+                conn.execute(text('UPDATE sync_change SET version = id'))
+                conn.execute(text('DELETE FROM cache_version WHERE name = :name'), {'name': SYNC_CLOCK})
+                conn.execute(text(
+                    'INSERT INTO cache_version (name, version) SELECT :name, COALESCE(MAX(version), 0) FROM sync_change'
+                ), {'name': SYNC_CLOCK})
+                applied.append('numbered sync changes in commit order')
+            existing_sync = _existing_indexes(inspector, SyncChange.__tablename__)
+            for index in SyncChange.__table__.indexes:
+                if index.name not in existing_sync:
+                    index.create(conn)
+                    applied.append(f'created index {index.name}')
+
+        if applied:
+            conn.execute(text('ANALYZE'))
+
+    # Databases that predate the counter tables get them filled once.
+    if db.session.query(LectureCount).first() is None and db.session.query(Attendance.id).first() is not None:
+        rebuild_counters()
+        applied.append('built attendance counters')
+
+    return applied
@@ -2,7 +2,9 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime
 
-db = SQLAlchemy()
+from database import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class Teacher(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -27,7 +29,11 @@ class Student(db.Model):
     name = db.Column(db.String(100), nullable=False)
     roll_number = db.Column(db.String(20), nullable=False)
     class_id = db.Column(db.Integer, db.ForeignKey('class.id'), nullable=False)
-    __table_args__ = (db.UniqueConstraint('roll_number', 'class_id', name='_roll_class_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('roll_number', 'class_id', name='_roll_class_uc'),
+        db.Index('ix_student_roll_number_id', 'roll_number', 'id'),
+        db.Index('ix_student_class_roll_number_id', 'class_id', 'roll_number', 'id'),
+    )
 
 class Attendance(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -36,7 +42,83 @@ class Attendance(db.Model):
     subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=False)
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
     status = db.Column(db.String(10), nullable=False, default='Present') 
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'subject_id', 'date', name='_student_subject_date_uc'),
+        db.Index('ix_attendance_class_subject_date', 'class_id', 'subject_id', 'date'),
+        db.Index('ix_attendance_student_subject_status', 'student_id', 'subject_id', 'status'),
+    )
     
     student = db.relationship('Student', backref=db.backref('attendance_records', cascade='all, delete-orphan'))
     subject = db.relationship('Subject', backref=db.backref('attendance_records', cascade='all, delete-orphan'))
     class_val = db.relationship('Class', backref=db.backref('attendance_records', cascade='all, delete-orphan'))
+
+class AttendanceSummary(db.Model):
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), primary_key=True)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), primary_key=True)
+    present = db.Column(db.Integer, nullable=False, default=0)
+    marked = db.Column(db.Integer, nullable=False, default=0)
+
+    student = db.relationship('Student', backref=db.backref('attendance_summaries', cascade='all, delete-orphan'))
+    subject = db.relationship('Subject', backref=db.backref('attendance_summaries', cascade='all, delete-orphan'))
+
+class LectureCount(db.Model):
+    class_id = db.Column(db.Integer, db.ForeignKey('class.id'), primary_key=True)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+    subject = db.relationship('Subject', backref=db.backref('lecture_counts', cascade='all, delete-orphan'))
+
+class CacheVersion(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class ExportJob(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('teacher.id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    params = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='queued')
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    filename = db.Column(db.String(200))
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    __table_args__ = (
+        db.Index('ix_export_job_teacher_created', 'teacher_id', 'created_at'),
+        db.Index('ix_export_job_status', 'status'),
+    )
+
+    teacher = db.relationship('Teacher', backref=db.backref('export_jobs', cascade='all, delete-orphan'))
+
+class ArchivedTerm(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False, unique=True)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    directory = db.Column(db.String(200), nullable=False)
+    rows = db.Column(db.Integer, nullable=False, default=0)
+    bytes = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class SyncChange(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    # The sync version handed to API clients, assigned in commit order (see sync.py)
+    version = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(10), nullable=False)
+    class_id = db.Column(db.Integer, nullable=False)
+    subject_id = db.Column(db.Integer)
+    date = db.Column(db.Date)
+    __table_args__ = (
+        db.Index('ix_sync_change_version', 'version'),
+    )
+
+class IdempotencyKey(db.Model):
+    teacher_id = db.Column(db.Integer, db.ForeignKey('teacher.id'), primary_key=True)
+    key = db.Column(db.String(64), primary_key=True)
+    result = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_idempotency_key_created', 'created_at'),
+    )
@@ -0,0 +1,116 @@
+"""Password hashing on a small bounded pool.
+
+Password hashes are slow on purpose, and a burst of logins at the start of
+the day would otherwise keep every web thread busy hashing. ``verify`` and
+``hash_password`` run the work on ``PASSWORD_HASH_WORKERS`` threads per
+process (hashlib's scrypt and PBKDF2 release the GIL, so the rest of the
+process keeps serving requests); at most ``PASSWORD_HASH_QUEUE`` more calls
+may wait for a thread, and beyond that ``HashingBusy`` is raised at once so
+the caller can ask the user to retry. With ``PASSWORD_HASH_WORKERS=0`` the
+hash runs on the calling thread.
+
+New hashes use ``PASSWORD_HASH_METHOD`` in werkzeug's notation, e.g.
+``scrypt:32768:8:1`` or ``pbkdf2:sha256:600000``. A stored hash made with
+other parameters still verifies, and ``verify`` returns a replacement made
+with the current ones, computed in the same pool job.
+
+Successful checks are remembered for ``VERIFY_CACHE_TTL_SECONDS`` as an HMAC
+of the password under the app's secret key, tagged with the stored hash, so
+signing in again on another device costs no hashing; a wrong password never
+hits this cache and a password change invalidates it.
+"""
+import hashlib
+import hmac
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+from cache import VersionedCache
+
+PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+PASSWORD_HASH_WORKERS = 2
+PASSWORD_HASH_QUEUE = 32
+VERIFY_CACHE_MAX_ENTRIES = 1024
+VERIFY_CACHE_TTL_SECONDS = 900
+
+_executor = None
+_slots = None
+_executor_lock = threading.Lock()
+
+verify_cache = VersionedCache(max_entries=VERIFY_CACHE_MAX_ENTRIES, ttl=VERIFY_CACHE_TTL_SECONDS)
+
+
+class HashingBusy(Exception):
+    """Every hashing thread is busy and the queue is full."""
+
+
+def hash_method():
+    """The configured method with werkzeug's defaults filled in, as it appears in a stored hash."""
+    method = current_app.config.get('PASSWORD_HASH_METHOD') or PASSWORD_HASH_METHOD
+    parts = method.split(':')
+    if parts[0] == 'scrypt' and len(parts) == 1:
+        return 'scrypt:32768:8:1'
+    if parts[0] == 'pbkdf2' and len(parts) < 3:
+        return f'pbkdf2:{parts[1] if len(parts) > 1 else "sha256"}:{DEFAULT_PBKDF2_ITERATIONS}'
+    return method
+
+
+def needs_rehash(stored_hash, method=None):
+    return stored_hash.split('$', 1)[0] != (method or hash_method())
+
+
+def _pool():
+    global _executor, _slots
+    with _executor_lock:
+        if _executor is None:
+            workers = current_app.config.get('PASSWORD_HASH_WORKERS', PASSWORD_HASH_WORKERS)
+            queue = current_app.config.get('PASSWORD_HASH_QUEUE', PASSWORD_HASH_QUEUE)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password')
+            _slots = threading.BoundedSemaphore(workers + queue)
+        return _executor, _slots
+
+
+def _run(fn, *args):
+    if not current_app.config.get('PASSWORD_HASH_WORKERS', PASSWORD_HASH_WORKERS):
+        return fn(*args)
+    executor, slots = _pool()
+    if not slots.acquire(blocking=False):
+        raise HashingBusy('Too many sign-ins at once; try again in a moment.')
+    future = executor.submit(fn, *args)
+    future.add_done_callback(lambda _: slots.release())
+    return future.result()
+
+
+def _check(stored_hash, password, method):
+    if not check_password_hash(stored_hash, password):
+        return False, None
+    return True, generate_password_hash(password, method=method) if needs_rehash(stored_hash, method) else None
+
+
+def _fingerprint(password):
+    return hmac.new(current_app.secret_key.encode(), password.encode(), hashlib.sha256).digest()
+
+
+def verify(stored_hash, password):
+    """``(ok, new_hash)``: whether ``password`` matches, and a rehash to store if the parameters changed.
+
+    Raises ``HashingBusy`` when the pool is saturated.
+    """
+    if not stored_hash or not isinstance(password, str):
+        return False, None
+    method = hash_method()
+    fingerprint = _fingerprint(password)
+    remembered = verify_cache.lookup(stored_hash, method)
+    if remembered is not None and hmac.compare_digest(remembered, fingerprint):
+        return True, None
+    ok, new_hash = _run(_check, stored_hash, password, method)
+    if ok:
+        verify_cache.store(new_hash or stored_hash, method, fingerprint)
+    return ok, new_hash
+
+
+def hash_password(password):
+    """A new hash of ``password`` with the configured method; raises ``HashingBusy``."""
+    return _run(generate_password_hash, password, hash_method())
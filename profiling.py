@@ -0,0 +1,185 @@
+"""Request profiling, off unless ``PROFILING`` is set.
+
+``init_app`` times every request and, through SQLAlchemy engine events and
+Flask's template signals, the SQL statements and template rendering inside
+it. Each response gets a ``Server-Timing`` header (``db``, ``tpl``, ``app``
+and ``total``) that browser dev tools show next to the request.
+
+The last ``PROFILE_WINDOW`` requests of every endpoint are kept in memory for
+the admin page at ``/profiling``: latency percentiles, a histogram, and the
+average SQL and template cost. The numbers are per worker process.
+
+With ``PROFILE_SAMPLE_RATE`` above zero that fraction of requests also runs
+under cProfile; the profile of any sampled request slower than
+``PROFILE_SLOW_MS`` is written to ``PROFILE_DIR`` for ``python -m pstats``.
+Streamed responses are timed up to the start of the body.
+"""
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+from flask import current_app, g, has_app_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+
+from models import db
+
+PROFILE_WINDOW = 1000
+PROFILE_MAX_DUMPS = 100
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_samples = {}
+_lock = threading.Lock()
+
+
+def init_app(app):
+    """Install the profiling hooks if ``app.config['PROFILING']`` is set."""
+    if not app.config.get('PROFILING'):
+        return
+    app.config.setdefault('PROFILE_SAMPLE_RATE', 0.0)
+    app.config.setdefault('PROFILE_SLOW_MS', 500)
+    app.config.setdefault('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+
+def _current():
+    # Only requests carry a profile; background jobs and CLI commands run
+    # in plain app contexts without one.
+    return g.get('request_profile') if has_app_context() else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current()
+    if profile is not None:
+        profile['sql_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current()
+    if profile is not None and 'sql_started' in profile:
+        profile['sql_count'] += 1
+        profile['sql_seconds'] += time.perf_counter() - profile.pop('sql_started')
+
+
+def _before_render(sender, template, context, **extra):
+    profile = _current()
+    if profile is not None:
+        profile['render_stack'].append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    profile = _current()
+    if profile is not None and profile['render_stack']:
+        started = profile['render_stack'].pop()
+        # Nested renders are already inside the outer one.
+        if not profile['render_stack']:
+            profile['template_seconds'] += time.perf_counter() - started
+
+
+def _start_request():
+    profiler = None
+    if random.random() < current_app.config['PROFILE_SAMPLE_RATE']:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active in this interpreter
+            profiler = None
+    g.request_profile = {
+        'started': time.perf_counter(),
+        'sql_count': 0,
+        'sql_seconds': 0.0,
+        'template_seconds': 0.0,
+        'render_stack': [],
+        'profiler': profiler,
+    }
+
+
+def _finish_request(response):
+    profile = g.pop('request_profile', None)
+    if profile is None:
+        return response
+    total = time.perf_counter() - profile['started']
+    profiler = profile['profiler']
+    if profiler is not None:
+        profiler.disable()
+
+    sql, template = profile['sql_seconds'], profile['template_seconds']
+    response.headers['Server-Timing'] = ', '.join([
+        f'db;dur={sql * 1000:.1f};desc="{profile["sql_count"]} queries"',
+        f'tpl;dur={template * 1000:.1f}',
+        f'app;dur={max(total - sql - template, 0) * 1000:.1f}',
+        f'total;dur={total * 1000:.1f}',
+    ])
+
+    endpoint = request.endpoint or 'unmatched'
+    record(endpoint, total, profile['sql_count'], sql, template)
+    if profiler is not None and total * 1000 >= current_app.config['PROFILE_SLOW_MS']:
+        _dump(profiler, current_app.config['PROFILE_DIR'], endpoint, total)
+    return response
+
+
+def record(endpoint, seconds, sql_count, sql_seconds, template_seconds):
+    with _lock:
+        window = _samples.get(endpoint)
+        if window is None:
+            window = _samples[endpoint] = deque(maxlen=PROFILE_WINDOW)
+        window.append((seconds, sql_count, sql_seconds, template_seconds))
+
+
+def _dump(profiler, directory, endpoint, seconds):
+    os.makedirs(directory, exist_ok=True)
+    name = f'{time.strftime("%Y%m%d-%H%M%S")}-{re.sub(r"[^A-Za-z0-9_-]+", "_", endpoint)}-{seconds * 1000:.0f}ms'
+    profiler.dump_stats(os.path.join(directory, name + '.prof'))
+    dumps = sorted(entry.path for entry in os.scandir(directory) if entry.name.endswith('.prof'))
+    for path in dumps[:-PROFILE_MAX_DUMPS]:
+        os.remove(path)
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summary():
+    """Per-endpoint statistics over the rolling window, slowest p95 first. Times are in milliseconds."""
+    with _lock:
+        windows = {endpoint: list(window) for endpoint, window in _samples.items()}
+
+    rows = []
+    for endpoint, samples in windows.items():
+        walls = sorted(sample[0] * 1000 for sample in samples)
+        histogram = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+        for wall in walls:
+            histogram[bisect_left(HISTOGRAM_BUCKETS_MS, wall)] += 1
+        count = len(samples)
+        rows.append({
+            'endpoint': endpoint,
+            'requests': count,
+            'p50': round(_percentile(walls, 0.50), 1),
+            'p95': round(_percentile(walls, 0.95), 1),
+            'p99': round(_percentile(walls, 0.99), 1),
+            'max': round(walls[-1], 1),
+            'sql_count': round(sum(sample[1] for sample in samples) / count, 1),
+            'sql_ms': round(sum(sample[2] for sample in samples) / count * 1000, 1),
+            'template_ms': round(sum(sample[3] for sample in samples) / count * 1000, 1),
+            'histogram': histogram,
+        })
+    rows.sort(key=lambda row: -row['p95'])
+    return rows
+
+
+def reset():
+    with _lock:
+        _samples.clear()
@@ -0,0 +1,71 @@
+"""Eager-loaded, paginated student queries for the list pages.
+
+The templates read ``student.class_val`` on every row; loading it from the
+same JOIN keeps each page at a fixed number of statements however many rows
+it lists. Class and subject dropdowns come from cache.py.
+"""
+import base64
+import json
+
+from sqlalchemy.orm import contains_eager
+
+from models import db, Student
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def _students_query(class_id=None):
+    query = Student.query.join(Student.class_val).options(contains_eager(Student.class_val))
+    if class_id:
+        query = query.filter(Student.class_id == class_id)
+    return query
+
+
+def page_size(value):
+    """Clamp a requested page size to ``1..MAX_PAGE_SIZE``."""
+    if not value or value < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(value, MAX_PAGE_SIZE)
+
+
+def encode_cursor(student):
+    raw = json.dumps([student.roll_number, student.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the ``(roll_number, id)`` a cursor points after, or None if it is invalid."""
+    try:
+        roll_number, student_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return str(roll_number), int(student_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def paginate_students(class_id=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """One keyset page of students ordered by roll number, then id.
+
+    Seeks past ``cursor`` with a row-value comparison instead of OFFSET, so
+    every page costs the same wherever it is in the list. Returns
+    ``(students, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    query = _students_query(class_id)
+
+    after = decode_cursor(cursor) if cursor else None
+    if after:
+        query = query.filter(db.tuple_(Student.roll_number, Student.id) > after)
+
+    students = query.order_by(Student.roll_number, Student.id).limit(limit + 1).all()
+    next_cursor = encode_cursor(students[limit - 1]) if len(students) > limit else None
+    return students[:limit], next_cursor
+
+
+def student_json(student):
+    return {
+        'id': student.id,
+        'name': student.name,
+        'roll_number': student.roll_number,
+        'class_id': student.class_id,
+        'class_name': student.class_val.name
+    }
@@ -0,0 +1,91 @@
+"""Cached /reports results.
+
+A class report only changes when marks for that class and subject are
+written, when the class roster changes, or when classes/subjects are renamed
+or deleted. Each of those bumps a ``cache_version`` row in the same
+transaction as the write:
+
+* ``report:<class_id>:<subject_id>`` by every write path in attendance.py,
+* ``roster:<class_id>`` when a student of the class is added, edited or removed,
+* ``classes`` / ``subjects`` by the reference data routes (see cache.py).
+
+A report is cached under ``(class_id, subject_id, start_date, end_date)``
+together with the tuple of those versions, so marking one subject never
+invalidates another subject's reports. The same tuple makes up the ETag,
+letting a browser revalidate a report with a single indexed lookup.
+"""
+import hashlib
+from collections import namedtuple
+
+from models import db, CacheVersion
+from cache import VersionedCache, bump_version
+from reports import build_class_report
+from sync import log_roster
+
+REPORT_CACHE_MAX_ENTRIES = 512
+REPORT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+REPORT_CACHE_TTL_SECONDS = 3600
+
+StudentRef = namedtuple('StudentRef', 'id name roll_number class_id')
+CachedReport = namedtuple('CachedReport', 'dates report_data html')
+
+report_cache = VersionedCache(max_entries=REPORT_CACHE_MAX_ENTRIES, ttl=REPORT_CACHE_TTL_SECONDS,
+                              max_bytes=REPORT_CACHE_MAX_BYTES)
+
+
+def _report_name(class_id, subject_id):
+    return f'report:{class_id}:{subject_id}'
+
+
+def _roster_name(class_id):
+    return f'roster:{class_id}'
+
+
+def report_version(class_id, subject_id):
+    """Version tuple of everything a (class, subject) report is built from, in one query."""
+    names = [_report_name(class_id, subject_id), _roster_name(class_id), 'classes', 'subjects']
+    current = dict(
+        db.session.query(CacheVersion.name, CacheVersion.version).filter(CacheVersion.name.in_(names))
+    )
+    return tuple(current.get(name, 0) for name in names)
+
+
+def report_etag(key, version):
+    raw = repr((key, version)).encode()
+    return hashlib.sha1(raw).hexdigest()
+
+
+def marks_changed(pairs):
+    """Invalidate reports for the given ``(class_id, subject_id)`` pairs; commits with the caller."""
+    bump_version(*sorted({_report_name(int(class_id), int(subject_id)) for class_id, subject_id in pairs}))
+
+
+def roster_changed(class_id):
+    """Invalidate every report of a class after its students changed; commits with the caller.
+
+    Also logs the roster change for API clients (sync.py).
+    """
+    bump_version(_roster_name(int(class_id)))
+    log_roster(class_id)
+
+
+def class_report_snapshot(class_id, subject_id, start_date=None, end_date=None):
+    """``build_class_report`` with students copied out of the session, safe to share between requests."""
+    dates, _, report_data = build_class_report(class_id, subject_id, start_date, end_date)
+    for row in report_data:
+        student = row['student']
+        row['student'] = StudentRef(student.id, student.name, student.roll_number, student.class_id)
+    return dates, report_data
+
+
+def _approximate_size(dates, report_data, html):
+    # Rough but cheap: a pointer per status cell plus a fixed cost per row,
+    # and the rendered page itself.
+    per_row = 400 + 8 * len(dates)
+    return 64 * len(dates) + per_row * len(report_data) + (len(html) if html else 0)
+
+
+def remember_report(key, version, dates, report_data, html=None):
+    report = CachedReport(dates, report_data, html)
+    report_cache.store(key, version, report, _approximate_size(dates, report_data, html))
+    return report
@@ -0,0 +1,199 @@
+from models import db, Subject, Student, Attendance
+from counters import lecture_totals, present_counts, class_present_counts
+from archive import archived_marks, archived_counts, archived_dates
+
+REPORT_WINDOW_DATES = 31
+
+
+def build_class_report(class_id, subject_id, start_date=None, end_date=None):
+    """Build the class x date attendance matrix shown on /reports.
+
+    All live marks for the class and subject are read in a single scan and
+    joined by any archived ones (see archive.py); the same marks yield the
+    distinct lecture dates, so the report costs a fixed number of queries no
+    matter how large the class is.
+
+    Returns ``(dates, students, report_data)`` where every ``report_data`` row
+    has the ``student``, ``present``, ``total``, ``percentage`` and
+    ``status_list`` keys used by ``reports.html``.
+    """
+    marks_query = db.session.query(
+        Attendance.student_id, Attendance.date, Attendance.status
+    ).filter(
+        Attendance.class_id == class_id,
+        Attendance.subject_id == subject_id
+    )
+
+    if start_date:
+        marks_query = marks_query.filter(Attendance.date >= start_date)
+    if end_date:
+        marks_query = marks_query.filter(Attendance.date <= end_date)
+
+    marks = archived_marks(class_id, subject_id, start_date, end_date) + marks_query.all()
+
+    dates = sorted({date for _, date, _ in marks})
+    date_index = {date: index for index, date in enumerate(dates)}
+    total_days = len(dates)
+
+    students = Student.query.filter_by(class_id=class_id).order_by(Student.roll_number).all()
+
+    status_lists = {student.id: ['-'] * total_days for student in students}
+    for student_id, date, status in marks:
+        status_list = status_lists.get(student_id)
+        if status_list is not None:
+            status_list[date_index[date]] = status
+
+    report_data = []
+    for student in students:
+        status_list = status_lists[student.id]
+        report_data.append(report_row(student, status_list.count('Present'), total_days, status_list))
+
+    return dates, students, report_data
+
+
+def report_row(student, present_count, total_days, status_list):
+    percentage = (present_count / total_days * 100) if total_days > 0 else 0
+    return {
+        'student': student,
+        'present': present_count,
+        'total': total_days,
+        'percentage': round(percentage, 2),
+        'status_list': status_list
+    }
+
+
+def class_report_windows(class_id, subject_id, start_date=None, end_date=None, window=REPORT_WINDOW_DATES):
+    """``build_class_report`` a window of ``window`` lecture dates at a time, for streamed pages.
+
+    Yields ``(students, dates, status_lists)`` per window, oldest first, with
+    one status list per student. Each window reads the next ``window``
+    distinct dates off the (class_id, subject_id, date) index and then only
+    the marks between them, so memory stays at one window of the matrix
+    however long the range is. Nothing is read until the first window is
+    requested.
+    """
+    students = Student.query.filter_by(class_id=class_id).order_by(Student.roll_number).all()
+    rows = {student.id: index for index, student in enumerate(students)}
+    archived = archived_dates(class_id, subject_id, start_date, end_date)
+    after = None
+    while True:
+        dates_query = db.session.query(Attendance.date).filter(
+            Attendance.class_id == class_id,
+            Attendance.subject_id == subject_id
+        )
+        if after:
+            dates_query = dates_query.filter(Attendance.date > after)
+        elif start_date:
+            dates_query = dates_query.filter(Attendance.date >= start_date)
+        if end_date:
+            dates_query = dates_query.filter(Attendance.date <= end_date)
+        live = {day for day, in dates_query.distinct().order_by(Attendance.date).limit(window)}
+        dates = sorted(live.union(day for day in archived if after is None or day > after))[:window]
+        if not dates:
+            return
+
+        marks = db.session.query(Attendance.student_id, Attendance.date, Attendance.status).filter(
+            Attendance.class_id == class_id,
+            Attendance.subject_id == subject_id,
+            Attendance.date >= dates[0],
+            Attendance.date <= dates[-1]
+        ).all()
+        if not live.issuperset(dates):
+            marks += archived_marks(class_id, subject_id, dates[0], dates[-1])
+
+        date_index = {day: index for index, day in enumerate(dates)}
+        status_lists = [['-'] * len(dates) for _ in students]
+        for student_id, day, status in marks:
+            row = rows.get(student_id)
+            if row is not None:
+                status_lists[row][date_index[day]] = status
+        yield students, dates, status_lists
+        after = dates[-1]
+
+
+def attendance_status(percentage):
+    """Good/Average/Low label used on student reports and their exports."""
+    if percentage >= 75:
+        return 'Good'
+    if percentage >= 50:
+        return 'Average'
+    return 'Low'
+
+
+def _summary_rows(subjects, totals, present_by_subject):
+    rows = []
+    for subject in subjects:
+        total_lectures = totals.get(subject.id, 0)
+        present_count = present_by_subject.get(subject.id, 0)
+        percentage = (present_count / total_lectures * 100) if total_lectures > 0 else 0
+
+        rows.append({
+            'subject': subject,
+            'total': total_lectures,
+            'present': present_count,
+            'percentage': round(percentage, 2),
+            'status': attendance_status(percentage)
+        })
+    return rows
+
+
+def student_summary(student, counts=None):
+    """Per-subject totals, present counts and percentages for one student.
+
+    Reads the materialized counters from counters.py, so the cost depends on
+    the number of subjects, not on how many marks exist. ``counts`` may
+    supply the ``(totals, present)`` dicts instead, e.g. from mark_index.py.
+    """
+    subjects = Subject.query.filter_by(class_id=student.class_id).all()
+    if counts is None:
+        counts = lecture_totals(student.class_id), present_counts(student.id)
+    return _summary_rows(subjects, *counts)
+
+
+def class_summary(class_id, start_date=None, end_date=None):
+    """Bulk variant of ``student_summary`` for every student in a class.
+
+    Without a date range the materialized counters are used; with one, the
+    totals and present counts for the whole class come from two grouped
+    queries over Attendance plus any archived terms in the range. Returns ``[(student, rows), ...]`` ordered by
+    roll number.
+    """
+    subjects = Subject.query.filter_by(class_id=class_id).all()
+    students = Student.query.filter_by(class_id=class_id).order_by(Student.roll_number).all()
+    if start_date or end_date:
+        totals, present = _range_counts(class_id, start_date, end_date)
+    else:
+        totals = lecture_totals(class_id)
+        present = class_present_counts(class_id)
+
+    return [(student, _summary_rows(subjects, totals, present.get(student.id, {}))) for student in students]
+
+
+def _range_counts(class_id, start_date, end_date):
+    filters = [Attendance.class_id == class_id]
+    if start_date:
+        filters.append(Attendance.date >= start_date)
+    if end_date:
+        filters.append(Attendance.date <= end_date)
+
+    totals = dict(
+        db.session.query(Attendance.subject_id, db.func.count(db.distinct(Attendance.date)))
+        .filter(*filters)
+        .group_by(Attendance.subject_id)
+    )
+    present = {}
+    for student_id, subject_id, count in (
+        db.session.query(Attendance.student_id, Attendance.subject_id, db.func.count(Attendance.id))
+        .filter(*filters, Attendance.status == 'Present')
+        .group_by(Attendance.student_id, Attendance.subject_id)
+    ):
+        present.setdefault(student_id, {})[subject_id] = count
+
+    archived_totals, archived_present = archived_counts(class_id, start_date, end_date)
+    for subject_id, total in archived_totals.items():
+        totals[subject_id] = totals.get(subject_id, 0) + total
+    for student_id, counts in archived_present.items():
+        student_counts = present.setdefault(student_id, {})
+        for subject_id, count in counts.items():
+            student_counts[subject_id] = student_counts.get(subject_id, 0) + count
+    return totals, present
@@ -0,0 +1,209 @@
+"""Bulk student roster import and export.
+
+``read_roster`` streams the rows of a CSV file or of the first sheet of an
+XLSX workbook (openpyxl read-only mode), so the whole file is never held in
+memory. ``import_roster`` checks every row against the existing
+``(class_id, roll_number)`` pairs of ``_roll_class_uc``, read with one query
+up front, and against the rows before it in the file, then inserts the valid
+rows with Core executemany in batches of ``batch_size``, one transaction per
+batch. Invalid rows are skipped and reported line by line.
+
+Files use the export headers (``Roll No``, ``Student Name``, ``Class``);
+``roll_number``, ``name`` and ``class_id`` are accepted as well, and the
+class column may be left out when a default class is given.
+"""
+import csv
+import io
+import time
+import zipfile
+
+import openpyxl
+from openpyxl.utils.exceptions import InvalidFileException
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Class, Student
+from report_cache import roster_changed
+
+ROSTER_HEADERS = ['Roll No', 'Student Name', 'Class']
+ROSTER_BATCH_SIZE = 5000
+ROSTER_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+HEADER_ALIASES = {
+    'roll no': 'roll_number',
+    'roll_number': 'roll_number',
+    'roll number': 'roll_number',
+    'student name': 'name',
+    'name': 'name',
+    'class': 'class',
+    'class_id': 'class_id',
+}
+
+_roll_number_length = Student.__table__.c.roll_number.type.length
+_name_length = Student.__table__.c.name.type.length
+
+
+def read_roster(fileobj, filename):
+    """Yield the rows of a binary CSV or XLSX file, header row first.
+
+    Raises ``ValueError`` for a file named ``.xlsx`` that is not a workbook.
+    """
+    if filename.lower().endswith('.xlsx'):
+        try:
+            workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+        except (zipfile.BadZipFile, InvalidFileException, KeyError) as exc:
+            raise ValueError('Not a valid .xlsx file') from exc
+        try:
+            yield from workbook.worksheets[0].iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    else:
+        yield from csv.reader(io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline=''))
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        # XLSX stores numeric roll numbers as floats
+        value = int(value)
+    return str(value).strip()
+
+
+def _columns(header, default_class_id):
+    columns = {}
+    for index, cell in enumerate(header):
+        field = HEADER_ALIASES.get(_text(cell).lower())
+        if field and field not in columns:
+            columns[field] = index
+    if 'roll_number' not in columns or 'name' not in columns:
+        raise ValueError('The file needs "Roll No" and "Student Name" columns.')
+    if 'class' not in columns and 'class_id' not in columns and not default_class_id:
+        raise ValueError('The file has no "Class" column; choose a class to import into.')
+    return columns
+
+
+def _existing_pairs(pairs):
+    """The ``(class_id, roll_number)`` pairs among ``pairs`` that are already taken."""
+    return set(db.session.query(Student.class_id, Student.roll_number).filter(
+        db.tuple_(Student.class_id, Student.roll_number).in_(list(pairs))
+    ))
+
+
+def _insert_batch(batch, lines, errors):
+    """Insert and commit one batch; returns the number of rows inserted.
+
+    A row taken by another writer since the up-front lookup fails the whole
+    batch on ``_roll_class_uc``; those rows are then reported and the rest
+    inserted again.
+    """
+    try:
+        db.session.execute(Student.__table__.insert(), batch)
+        for class_id in {row['class_id'] for row in batch}:
+            roster_changed(class_id)
+        db.session.commit()
+        return len(batch)
+    except IntegrityError:
+        db.session.rollback()
+    taken = _existing_pairs((row['class_id'], row['roll_number']) for row in batch)
+    remaining = []
+    for row, line in zip(batch, lines):
+        if (row['class_id'], row['roll_number']) in taken:
+            errors.append((line, row['roll_number'], 'Roll number already exists in this class.'))
+        else:
+            remaining.append(row)
+    if not remaining:
+        return 0
+    db.session.execute(Student.__table__.insert(), remaining)
+    for class_id in {row['class_id'] for row in remaining}:
+        roster_changed(class_id)
+    db.session.commit()
+    return len(remaining)
+
+
+def import_roster(rows, default_class_id=None, batch_size=ROSTER_BATCH_SIZE, dry_run=False):
+    """Validate and insert students from ``rows`` (header first, as from ``read_roster``).
+
+    Each batch is committed on its own, so an interrupted import keeps the
+    batches already written. With ``dry_run`` nothing is written. Returns a
+    dict with the ``rows`` read, the number ``imported``, ``error_count``
+    and the first ``MAX_REPORTED_ERRORS`` errors as ``{line, roll_number,
+    error}`` dicts. Raises ``ValueError`` if the header is unusable.
+    """
+    started = time.perf_counter()
+    rows = iter(rows)
+    columns = _columns(next(rows, ()), default_class_id)
+
+    class_ids = dict(db.session.query(Class.name, Class.id))
+    known_ids = set(class_ids.values())
+    if default_class_id and int(default_class_id) not in known_ids:
+        raise ValueError('The selected class does not exist.')
+    taken = {pair: None for pair in db.session.query(Student.class_id, Student.roll_number)}
+
+    errors, batch, lines = [], [], []
+    read = imported = 0
+    for line, row in enumerate(rows, start=2):
+        values = {field: _text(row[index]) if index < len(row) else '' for field, index in columns.items()}
+        if not any(values.values()):
+            continue
+        read += 1
+        roll_number, name = values['roll_number'], values['name']
+
+        if values.get('class'):
+            class_id = class_ids.get(values['class'])
+        elif values.get('class_id'):
+            class_id = int(values['class_id']) if values['class_id'].isdigit() else None
+            class_id = class_id if class_id in known_ids else None
+        else:
+            class_id = int(default_class_id) if default_class_id else None
+
+        if not roll_number or not name:
+            error = 'Roll number and name are required.'
+        elif len(roll_number) > _roll_number_length or len(name) > _name_length:
+            error = f'Roll numbers are limited to {_roll_number_length} and names to {_name_length} characters.'
+        elif class_id is None:
+            error = f'Unknown class {values.get("class") or values.get("class_id")!r}.'
+        elif (class_id, roll_number) in taken:
+            first = taken[(class_id, roll_number)]
+            error = (f'Roll number repeats line {first}.' if first
+                     else 'Roll number already exists in this class.')
+        else:
+            error = None
+        if error:
+            errors.append((line, roll_number, error))
+            continue
+
+        taken[(class_id, roll_number)] = line
+        batch.append({'name': name, 'roll_number': roll_number, 'class_id': class_id})
+        lines.append(line)
+        if len(batch) >= batch_size:
+            imported += len(batch) if dry_run else _insert_batch(batch, lines, errors)
+            batch, lines = [], []
+    if batch:
+        imported += len(batch) if dry_run else _insert_batch(batch, lines, errors)
+
+    errors.sort()
+    return {
+        'rows': read,
+        'imported': imported,
+        'dry_run': dry_run,
+        'error_count': len(errors),
+        'errors': [{'line': line, 'roll_number': roll_number, 'error': error}
+                   for line, roll_number, error in errors[:MAX_REPORTED_ERRORS]],
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def roster_export_rows(class_id=None, chunk_size=ROSTER_CHUNK_SIZE):
+    """Yield ``[roll_number, name, class]`` rows ordered by class and roll number."""
+    stmt = (
+        db.select(Student.roll_number, Student.name, Class.name)
+        .join(Class, Student.class_id == Class.id)
+        .order_by(Class.name, Student.roll_number)
+    )
+    if class_id:
+        stmt = stmt.where(Student.class_id == class_id)
+    result = db.session.execute(stmt.execution_options(yield_per=chunk_size))
+    for partition in result.partitions():
+        for row in partition:
+            yield list(row)
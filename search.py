@@ -0,0 +1,163 @@
+"""Indexed student search.
+
+On SQLite, student names and roll numbers are mirrored into an FTS5 table with
+the trigram tokenizer, kept in sync by triggers on ``student``. Trigram
+matching finds any substring of three or more characters through the index,
+so a search no longer scans the whole student table the way ``ILIKE '%q%'``
+did. Other databases, and SQLite builds without FTS5 or its trigram
+tokenizer (added in SQLite 3.34), fall back to the ILIKE query.
+"""
+from sqlalchemy import DDL, event, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import contains_eager
+
+from models import db, Student
+
+SEARCH_TABLE = 'student_search'
+CANDIDATE_POOL = 200
+MAX_FUZZY_TRIGRAMS = 32
+
+SEARCH_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    f"name, roll_number, content='student', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ai AFTER INSERT ON student BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}(rowid, name, roll_number) VALUES (new.id, new.name, new.roll_number); END",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ad AFTER DELETE ON student BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, name, roll_number) "
+    f"VALUES ('delete', old.id, old.name, old.roll_number); END",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_au AFTER UPDATE ON student BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, name, roll_number) "
+    f"VALUES ('delete', old.id, old.name, old.roll_number); "
+    f"INSERT INTO {SEARCH_TABLE}(rowid, name, roll_number) VALUES (new.id, new.name, new.roll_number); END",
+]
+
+_trigram_support = None
+
+
+def trigram_supported(conn):
+    """Whether this SQLite library has FTS5 with the trigram tokenizer; probed once per process."""
+    global _trigram_support
+    if _trigram_support is None:
+        try:
+            conn.exec_driver_sql(
+                f"CREATE VIRTUAL TABLE temp.{SEARCH_TABLE}_probe USING fts5(probe, tokenize='trigram')")
+            conn.exec_driver_sql(f"DROP TABLE temp.{SEARCH_TABLE}_probe")
+            _trigram_support = True
+        except DBAPIError:
+            _trigram_support = False
+    return _trigram_support
+
+
+def _create_index(ddl, target, bind, **kw):
+    return bind is not None and trigram_supported(bind)
+
+
+for statement in SEARCH_DDL:
+    event.listen(Student.__table__, 'after_create',
+                 DDL(statement).execute_if(dialect='sqlite', callable_=_create_index))
+
+
+def install(conn):
+    """Create and fill the search index on an existing SQLite database."""
+    for statement in SEARCH_DDL:
+        conn.execute(text(statement))
+    conn.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"))
+
+
+def _quote(fragment):
+    return '"' + fragment.replace('"', '""') + '"'
+
+
+def _match_ids(expression, limit, exclude=(), ranked=False):
+    order = ' ORDER BY rank' if ranked else ''
+    rows = db.session.execute(
+        text(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :expression{order} LIMIT :limit'),
+        {'expression': expression, 'limit': limit + len(exclude)}
+    )
+    return [row[0] for row in rows if row[0] not in exclude][:limit]
+
+
+def _tier(student, term):
+    """0: exact roll number, 1: roll number or a name word starts with the term,
+    2: contains the term, 3: fuzzy (shares some trigrams)."""
+    needle = term.lower()
+    roll_number = student.roll_number.lower()
+    if roll_number == needle:
+        return 0
+    if roll_number.startswith(needle) or any(word.startswith(needle) for word in student.name.lower().split()):
+        return 1
+    if needle in roll_number or needle in student.name.lower():
+        return 2
+    return 3
+
+
+def _ilike_search(term, limit):
+    return (
+        Student.query.join(Student.class_val).options(contains_eager(Student.class_val))
+        .filter((Student.name.ilike(f'%{term}%')) | (Student.roll_number.ilike(f'%{term}%')))
+        .order_by(Student.roll_number, Student.id)
+        .limit(limit)
+        .all()
+    )
+
+
+def search_students(term, limit):
+    """Up to ``limit`` students matching ``term``, best matches first.
+
+    Exact roll-number hits rank first, then prefix matches on the roll number
+    or a word of the name, then other substring matches, each by roll number.
+    Candidates are the first ``CANDIDATE_POOL`` index hits, so a broad term
+    costs no more than a narrow one. When nothing contains the term, students
+    sharing any of its trigrams are returned by bm25 instead, which tolerates
+    a typo or a missing letter. Terms shorter than three characters have no
+    trigrams: they match roll-number prefixes through the roll number index,
+    then names and roll numbers containing them by a scan, as ILIKE did.
+    """
+    term = term.strip()
+    if not term:
+        return []
+    if db.session.get_bind().dialect.name != 'sqlite' or not trigram_supported(db.session.connection()):
+        return _ilike_search(term, limit)
+
+    pool = max(limit, CANDIDATE_POOL)
+    exact = [row[0] for row in db.session.query(Student.id).filter(Student.roll_number == term).limit(pool)]
+
+    if len(term) >= 3:
+        ids = exact + _match_ids(_quote(term), pool, exclude=set(exact))
+        if not ids:
+            lowered = term.lower()
+            trigrams = list(dict.fromkeys(lowered[i:i + 3] for i in range(len(lowered) - 2)))
+            fuzzy = ' OR '.join(_quote(trigram) for trigram in trigrams[:MAX_FUZZY_TRIGRAMS])
+            ids = _match_ids(fuzzy, pool, ranked=True)
+    else:
+        # Range scans on the roll number index, tried in each case since roll
+        # numbers are compared case-sensitively.
+        prefix = db.session.query(Student.id).filter(db.or_(*(
+            db.and_(Student.roll_number >= variant, Student.roll_number < variant + '\uffff')
+            for variant in {term, term.upper(), term.lower()}
+        ))).order_by(Student.roll_number, Student.id).limit(pool)
+        ids = exact + [row[0] for row in prefix if row[0] not in exact]
+        if len(ids) < pool:
+            seen = set(ids)
+            contains = db.session.query(Student.id).filter(
+                Student.name.ilike(f'%{term}%') | Student.roll_number.ilike(f'%{term}%')
+            ).order_by(Student.roll_number, Student.id).limit(pool)
+            ids += [row[0] for row in contains if row[0] not in seen][:pool - len(ids)]
+
+    if not ids:
+        return []
+
+    position = {student_id: index for index, student_id in enumerate(ids)}
+    students = (
+        Student.query.join(Student.class_val).options(contains_eager(Student.class_val))
+        .filter(Student.id.in_(ids))
+        .all()
+    )
+
+    def sort_key(student):
+        tier = _tier(student, term)
+        # Fuzzy hits keep their bm25 order; the others sort by roll number.
+        return (tier, position[student.id] if tier == 3 else 0, student.roll_number, student.id)
+
+    students.sort(key=sort_key)
+    return students[:limit]
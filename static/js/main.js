@@ -45,6 +45,51 @@ document.addEventListener('DOMContentLoaded', function () {
         classSelect.addEventListener('change', filterSubjects);
     }
 
+    // --- Export Job Form ---
+    const kindSelect = document.getElementById('kind');
+    const kindFields = document.querySelectorAll('[data-export-kinds]');
+
+    if (kindSelect && kindFields.length) {
+        function showKindFields() {
+            kindFields.forEach(field => {
+                const visible = field.getAttribute('data-export-kinds').split(' ').includes(kindSelect.value);
+                field.style.display = visible ? "" : "none";
+            });
+        }
+
+        showKindFields();
+        kindSelect.addEventListener('change', showKindFields);
+    }
+
+    // --- Export Job Progress ---
+    // Poll unfinished jobs and reload once one of them is done or failed
+    const pendingJobs = document.querySelectorAll('[data-export-job="queued"], [data-export-job="running"]');
+
+    if (pendingJobs.length) {
+        const poll = setInterval(() => {
+            pendingJobs.forEach(row => {
+                fetch(row.getAttribute('data-status-url'))
+                    .then(response => response.json())
+                    .then(job => {
+                        if (job.status === 'done' || job.status === 'failed') {
+                            clearInterval(poll);
+                            window.location.reload();
+                            return;
+                        }
+                        const bar = row.querySelector('.progress-bar');
+                        if (bar) {
+                            bar.style.width = job.percent + '%';
+                            bar.textContent = job.percent + '%';
+                        }
+                    });
+            });
+        }, 2000);
+    }
+
+    // --- Streamed Reports ---
+    // The page has finished streaming by the time this runs
+    document.querySelectorAll('[data-report-loading]').forEach(element => element.remove());
+
     // --- Dark Mode Logic ---
     const toggleButton = document.getElementById('theme-toggle');
     const htmlElement = document.documentElement;
@@ -0,0 +1,100 @@
+"""Change log behind the API's delta sync (see api.py).
+
+Every write that changes data an offline client keeps appends a
+``SyncChange`` row in the same transaction as the write:
+
+* ``roster`` for a class whose students were added, edited or removed
+  (``report_cache.roster_changed`` logs it),
+* ``attendance`` for a lecture (class, subject, date) whose marks were
+  recorded, edited or deleted (attendance.py logs it).
+
+A client remembers the highest sync version it has seen and asks for the
+changes after it; rows only record *what* changed, so the current data is
+read when the changes are served and a lecture logged several times is sent
+once.
+
+Versions come from the ``sync`` row of ``cache_version``, bumped by every
+logging transaction. The bump holds that row's lock until commit, so the
+next writer gets the next version only after this one has committed: once a
+version is visible, no lower one can still appear. An autoincrement id does
+not promise that on databases where transactions commit out of id order,
+and a client whose cursor moved past an id still in flight would never see
+that change.
+
+The price is deliberate: on PostgreSQL every transaction that logs a
+change (each marked, edited or deleted lecture and each roster change)
+waits for the previous one to commit, institution-wide. The write paths log
+their changes just before committing, so the lock is mostly held for the
+commit itself (a whole file for the CSV imports); SQLite already allows one
+writer at a time, so there it costs nothing.
+"""
+from models import db, SyncChange, CacheVersion
+from cache import bump_version
+
+SYNC_PAGE_SIZE = 500
+SYNC_CLOCK = 'sync'
+
+
+def _next_version():
+    bump_version(SYNC_CLOCK)
+    return db.session.query(CacheVersion.version).filter_by(name=SYNC_CLOCK).scalar()
+
+
+def log_roster(class_id):
+    """Record that a class roster changed; commits with the caller."""
+    db.session.execute(SyncChange.__table__.insert(),
+                       [{'version': _next_version(), 'kind': 'roster', 'class_id': int(class_id)}])
+
+
+def log_lectures(lectures):
+    """Record changed ``(class_id, subject_id, date)`` lectures; commits with the caller."""
+    rows = [
+        {'kind': 'attendance', 'class_id': int(class_id), 'subject_id': int(subject_id), 'date': date}
+        for class_id, subject_id, date in sorted(set(lectures))
+    ]
+    if rows:
+        version = _next_version()
+        for row in rows:
+            row['version'] = version
+        db.session.execute(SyncChange.__table__.insert(), rows)
+
+
+def current_version():
+    return db.session.query(db.func.max(SyncChange.version)).scalar() or 0
+
+
+def changes_since(version, class_ids=None, limit=SYNC_PAGE_SIZE):
+    """Changes after ``version``, oldest first, about ``limit`` rows.
+
+    Returns ``(rosters, lectures, version, has_more)``: the set of changed
+    class ids, the set of changed ``(class_id, subject_id, date)`` lectures,
+    the version to ask from next time and whether more changes are waiting.
+    A page holds whole versions, so one transaction's changes are never split.
+    """
+    # Read the newest version first: everything up to it has committed, so
+    # the cursor can move there once this page holds the rest.
+    newest = current_version()
+    query = SyncChange.query.filter(SyncChange.version > version, SyncChange.version <= newest)
+    if class_ids:
+        query = query.filter(SyncChange.class_id.in_(class_ids))
+    columns = (SyncChange.version, SyncChange.kind, SyncChange.class_id, SyncChange.subject_id, SyncChange.date)
+    changes = query.order_by(SyncChange.version, SyncChange.id).limit(limit + 1).with_entities(*columns).all()
+    has_more = len(changes) > limit
+    if has_more:
+        cut = changes[limit][0]
+        changes = [change for change in changes[:limit] if change[0] != cut]
+        if not changes:
+            changes = query.filter(SyncChange.version == cut).order_by(SyncChange.id).with_entities(*columns).all()
+
+    rosters, lectures = set(), set()
+    for _, kind, class_id, subject_id, date in changes:
+        if kind == 'roster':
+            rosters.add(class_id)
+        else:
+            lectures.add((class_id, subject_id, date))
+    if has_more:
+        version = changes[-1][0]
+    else:
+        # Everything up to newest was sent or belongs to other classes
+        version = max(version, newest)
+    return rosters, lectures, version, has_more
@@ -0,0 +1,141 @@
+"""End-of-term report workbooks for every class.
+
+``generate`` writes one workbook per class with every student's per-subject
+totals, percentage and Good/Average/Low status (the same numbers as
+``export_student_report``), optionally zipped together. Classes are spread
+over a process pool; each worker reads its class in bulk through
+``reports.class_summary`` and streams its workbook to disk.
+
+Finished classes are appended to ``checkpoint.jsonl`` in the output
+directory as they complete, so an interrupted run picks up where it stopped
+when started again with the same arguments.
+"""
+import json
+import multiprocessing
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from flask import Flask
+
+from models import db, Class, Student
+from database import engine_options
+from exports import write_xlsx
+from reports import class_summary
+from archive import archive_dir
+
+TERM_REPORT_HEADERS = ['Roll No', 'Student Name', 'Subject', 'Total Lectures', 'Present', 'Percentage', 'Status']
+CHECKPOINT_FILE = 'checkpoint.jsonl'
+ZIP_NAME = 'term_reports.zip'
+
+_worker_app = None
+
+
+def report_filename(class_id, class_name):
+    return f"{class_id:04d}_{re.sub(r'[^A-Za-z0-9_-]+', '_', class_name).strip('_')}.xlsx"
+
+
+def term_report_rows(summary):
+    """Spreadsheet rows for a ``reports.class_summary`` result."""
+    for student, rows in summary:
+        for row in rows:
+            yield [student.roll_number, student.name, row['subject'].name, row['total'], row['present'],
+                   f"{row['percentage']}%", row['status']]
+
+
+def _init_worker(database_uri, archive_directory):
+    global _worker_app
+    _worker_app = Flask(__name__)
+    _worker_app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    _worker_app.config['ARCHIVE_DIR'] = archive_directory
+    _worker_app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(database_uri)
+    _worker_app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(_worker_app)
+
+
+def _write_class_report(class_id, class_name, out_dir, start_date, end_date):
+    started = time.perf_counter()
+    path = os.path.join(out_dir, report_filename(class_id, class_name))
+    with _worker_app.app_context():
+        summary = class_summary(class_id, start_date, end_date)
+        write_xlsx(path + '.part', 'Term Report', TERM_REPORT_HEADERS, term_report_rows(summary))
+    os.replace(path + '.part', path)
+    return class_id, os.path.basename(path), len(summary), time.perf_counter() - started
+
+
+def _read_checkpoint(out_dir, run):
+    path = os.path.join(out_dir, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as fh:
+        lines = [json.loads(line) for line in fh if line.strip()]
+    if not lines or lines[0] != run:
+        raise ValueError(f'{path} belongs to a run with different options; use another output directory '
+                         f'or delete the checkpoint to start over')
+    return {
+        entry['class_id']: entry['file'] for entry in lines[1:]
+        if os.path.exists(os.path.join(out_dir, entry['file']))
+    }
+
+
+def generate(out_dir, database_uri, workers=None, start_date=None, end_date=None, make_zip=False, log=print):
+    """Write term reports for every class into ``out_dir`` and return run statistics.
+
+    Must run inside an app context (the class list is read from ``db``);
+    ``database_uri`` is what the worker processes connect to. Classes already
+    recorded in the checkpoint are skipped.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    run = {'start_date': start_date.isoformat() if start_date else None,
+           'end_date': end_date.isoformat() if end_date else None}
+    done = _read_checkpoint(out_dir, run)
+
+    # Largest classes first so one big class does not finish the run alone.
+    sizes = dict(db.session.query(Student.class_id, db.func.count(Student.id)).group_by(Student.class_id))
+    classes = sorted(db.session.query(Class.id, Class.name), key=lambda item: -sizes.get(item[0], 0))
+    pending = [(class_id, name) for class_id, name in classes if class_id not in done]
+    if done:
+        log(f'Resuming: {len(done)} of {len(classes)} classes already written.')
+
+    checkpoint_path = os.path.join(out_dir, CHECKPOINT_FILE)
+    if not os.path.exists(checkpoint_path):
+        with open(checkpoint_path, 'w') as fh:
+            fh.write(json.dumps(run) + '\n')
+
+    started = time.perf_counter()
+    students = 0
+    if pending:
+        # Workers start fresh (spawn) rather than inheriting the parent's
+        # open database connections.
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)), mp_context=context,
+                                 initializer=_init_worker, initargs=(database_uri, archive_dir())) as pool, \
+                open(checkpoint_path, 'a') as checkpoint:
+            futures = [
+                pool.submit(_write_class_report, class_id, name, out_dir, start_date, end_date)
+                for class_id, name in pending
+            ]
+            for future in as_completed(futures):
+                class_id, filename, class_students, seconds = future.result()
+                checkpoint.write(json.dumps({'class_id': class_id, 'file': filename}) + '\n')
+                checkpoint.flush()
+                done[class_id] = filename
+                students += class_students
+                log(f'{filename}: {class_students} students in {seconds:.2f} s')
+    elapsed = time.perf_counter() - started
+
+    if make_zip:
+        with zipfile.ZipFile(os.path.join(out_dir, ZIP_NAME), 'w', zipfile.ZIP_STORED) as archive:
+            for filename in sorted(done.values()):
+                archive.write(os.path.join(out_dir, filename), filename)
+
+    return {
+        'classes': len(pending),
+        'skipped': len(classes) - len(pending),
+        'students': students,
+        'workers': workers,
+        'seconds': elapsed,
+    }